@@ -301,6 +301,30 @@ def save_profile(user_id: int, profile: dict, username: str = "") -> None:
     except Exception as e:
         logging.warning("Sync Sheets falló: %s", e)
 
+# -----------------------------
+# Picks del día (registros tipados de serving/pick_records)
+# -----------------------------
+try:
+    from serving.pick_records import read_records  # type: ignore
+    from serving.pick_ranker import personalized_topk  # type: ignore
+except Exception:  # sin pandas/pyarrow: el botón queda informativo
+    read_records = personalized_topk = None
+
+PICKS_POOL_PATH = Path(os.getenv("PICKS_POOL_PATH", "reports/all_picks.csv"))
+
+def render_top_picks(profile: Optional[dict] = None, n: int = 5) -> str:
+    """Top picks del día según el perfil (deportes activos, ligas/mercados priorizados, topes de diversidad)."""
+    recs = read_records(PICKS_POOL_PATH) if read_records else None
+    if recs is None or recs.empty:
+        return "Top PICS del día: aún no hay picks generados. Usa ‘Avísame’ para alertas."
+    recs = personalized_topk(recs, {"me": profile}, n)
+    if recs.empty:
+        return "Top PICS del día: no hay picks para tus deportes activos."
+    lines = ["<b>Top PICS del día</b>"]
+    for r in recs.itertuples(index=False):
+        lines.append(f"• {r.DEPORTE} · {r.PARTIDO}\n  {r.MERCADO}: <b>{r.PICK}</b> @ {r.dec_odds:.2f} ({r.prob:.0%})")
+    return "\n".join(lines)
+
 # -----------------------------
 # Helpers UI
 # -----------------------------
@@ -509,7 +533,7 @@ if not OFFLINE_MODE:
 
     @dp.message(F.text == BTN_TOP_PICKS)
     async def handle_top_picks(message: Message):
-        await message.answer("Top PICS del día (placeholder). Usa ‘Avísame’ para alertas.", reply_markup=alerts_inline_kb())
+        await message.answer(render_top_picks(load_profile(message.from_user.id)), reply_markup=alerts_inline_kb())
 
     @dp.message(F.text == BTN_AVISAME)
     async def handle_avisame(message: Message):
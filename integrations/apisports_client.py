@@ -1,4 +1,21 @@
-import os, requests
+# integrations/apisports_client.py
+"""
+Conector único de API-Sports (todos los consumidores de pipelines/ pasan por aquí).
+- Pool de conexiones keep-alive por host base (HTTP/1.1; HTTP/2 opcional si hay `h2`)
+- Tamaño de pool configurable (APISPORTS_POOL_SIZE)
+- Entradas sync (`get`) y async (`aget`) con la misma política de reintentos/backoff
+- Rate limiting por host (integrations.ratelimit.RateLimiter)
+- Caché de respuestas en disco con revalidación condicional (integrations.http_cache)
+"""
+
+from __future__ import annotations
+import os, time, asyncio, threading
+from typing import Dict, Any, Optional
+
+import httpx
+
+from integrations.ratelimit import RateLimiter
+from integrations.http_cache import ResponseCache, ttl_for
 
 APISPORTS_KEY = os.getenv("APISPORTS_KEY", "")
 
@@ -10,15 +27,208 @@ BASES = {
     "american_football": "https://v1.american-football.api-sports.io",
 }
 
-def get(session=None, sport="football", path="/status", params=None, timeout=30):
-    if not APISPORTS_KEY:
-        raise RuntimeError("APISPORTS_KEY faltante")
-    base = BASES.get(sport)
-    if not base:
-        raise ValueError(f"Sport no soportado: {sport}")
-    url = f"{base}{path}"
-    s = session or requests.Session()
-    r = s.get(url, headers={"x-apisports-key": APISPORTS_KEY}, params=params or {}, timeout=timeout)
-    r.raise_for_status()
-    return r.json()
+DEFAULT_POOL_SIZE = int(os.getenv("APISPORTS_POOL_SIZE", "10"))
+DEFAULT_HTTP2     = os.getenv("APISPORTS_HTTP2", "0") not in ("", "0", "false", "False")
+DEFAULT_RATE      = float(os.getenv("APISPORTS_RATE", "4") or 4)
+DEFAULT_BURST     = int(os.getenv("APISPORTS_BURST", "10"))
+DEFAULT_CACHE     = os.getenv("APISPORTS_CACHE", "1") not in ("", "0", "false", "False")
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+# ---------- política de reintentos ----------
+class RetryPolicy:
+    """Reintentos con backoff exponencial, compartidos por las rutas sync y async."""
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, retries: int = 3, backoff: float = 0.75):
+        self.retries = max(1, int(retries))
+        self.backoff = float(backoff)
+
+    def should_retry(self, attempt: int, status: Optional[int] = None) -> bool:
+        if attempt >= self.retries - 1:
+            return False
+        return status is None or status in self.RETRY_STATUSES
+
+    def delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt)
+
+# ---------- pools por host (nivel módulo) ----------
+_SYNC_POOLS: Dict[tuple, httpx.Client] = {}
+_SYNC_POOLS_LOCK = threading.Lock()
+
+def _limits(pool_size: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                        keepalive_expiry=30.0)
+
+def sync_pool(base: str, pool_size: int = DEFAULT_POOL_SIZE, http2: bool = DEFAULT_HTTP2) -> httpx.Client:
+    """Un httpx.Client keep-alive por (host base, tamaño, http2), reutilizado entre llamadas."""
+    key = (base, pool_size, http2)
+    with _SYNC_POOLS_LOCK:
+        c = _SYNC_POOLS.get(key)
+        if c is None or c.is_closed:
+            c = _SYNC_POOLS[key] = httpx.Client(base_url=base, limits=_limits(pool_size),
+                                                http2=http2 and _http2_available())
+        return c
+
+def close_pools():
+    with _SYNC_POOLS_LOCK:
+        for c in _SYNC_POOLS.values():
+            c.close()
+        _SYNC_POOLS.clear()
+
+# ---------- cliente ----------
+class ApiSportsClient:
+    """
+    Cliente API-Sports. `sport` puede ser una clave de BASES ("football") o una base URL.
+    Los pools sync son de módulo; los async viven en la instancia (atados al event loop)
+    y se cierran con `aclose()` o usando el cliente como `async with`.
+    """
+    def __init__(self, api_key: Optional[str] = None, pool_size: int = DEFAULT_POOL_SIZE,
+                 http2: bool = DEFAULT_HTTP2, timeout: float = 30.0,
+                 retry: Optional[RetryPolicy] = None, limiter: Optional[RateLimiter] = None,
+                 cache: Optional[ResponseCache] | bool = None):
+        self.api_key = api_key if api_key is not None else APISPORTS_KEY
+        self.pool_size = max(1, int(pool_size))
+        self.http2 = bool(http2)
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.limiter = limiter or RateLimiter(DEFAULT_RATE, DEFAULT_BURST)
+        if cache is None:
+            cache = DEFAULT_CACHE
+        self.cache = (ResponseCache() if cache is True else cache) or None
+        self._async_pools: Dict[str, httpx.AsyncClient] = {}
 
+    def base_for(self, sport: str) -> str:
+        if sport.startswith("http"):
+            return sport.rstrip("/")
+        base = BASES.get(sport)
+        if not base:
+            raise ValueError(f"Sport no soportado: {sport}")
+        return base
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.api_key:
+            raise RuntimeError("APISPORTS_KEY faltante")
+        return {"x-apisports-key": self.api_key}
+
+    # --- caché ---
+    def _cache_begin(self, base: str, path: str, params):
+        """-> (key, entry, ttl, body_si_vigente)"""
+        if self.cache is None:
+            return None, None, 0.0, None
+        ttl = ttl_for(path, params)
+        if ttl == 0:
+            return None, None, ttl, None
+        key = self.cache.key(base, path, params)
+        entry = self.cache.lookup(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            return key, entry, ttl, entry["body"]
+        return key, entry, ttl, None
+
+    def _cache_end(self, key, entry, ttl, r) -> Optional[Dict[str, Any]]:
+        """304 -> cuerpo cacheado; 200 -> guarda y devuelve el JSON."""
+        if r.status_code == 304 and entry is not None:
+            self.cache.refresh(key, entry, r.headers, ttl)
+            return entry["body"]
+        r.raise_for_status()
+        body = r.json()
+        if key is not None:
+            self.cache.store(key, body, r.headers, ttl)
+        return body
+
+    def _async_pool(self, base: str) -> httpx.AsyncClient:
+        c = self._async_pools.get(base)
+        if c is None or c.is_closed:
+            c = self._async_pools[base] = httpx.AsyncClient(
+                base_url=base, limits=_limits(self.pool_size),
+                http2=self.http2 and _http2_available())
+        return c
+
+    # --- sync ---
+    def get(self, sport: str = "football", path: str = "/status",
+            params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+            session=None) -> Dict[str, Any]:
+        headers = self._headers()
+        base = self.base_for(sport)
+        key, entry, ttl, cached = self._cache_begin(base, path, params)
+        if cached is not None:
+            return cached
+        headers.update(ResponseCache.conditional_headers(entry))
+        for attempt in range(self.retry.retries):
+            if self.limiter.exhausted(base):
+                raise RuntimeError(f"cupo diario agotado ({base})")
+            self.limiter.wait_sync(base)
+            try:
+                if session is not None:  # compat: requests.Session del llamador
+                    r = session.get(f"{base}{path}", headers=headers, params=params or {},
+                                    timeout=timeout or self.timeout)
+                else:
+                    r = sync_pool(base, self.pool_size, self.http2).get(
+                        path, headers=headers, params=params or {}, timeout=timeout or self.timeout)
+            except Exception:
+                if not self.retry.should_retry(attempt):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                continue
+            self.limiter.observe(base, r.status_code, r.headers)
+            if r.status_code >= 400 and self.retry.should_retry(attempt, r.status_code):
+                time.sleep(self.retry.delay(attempt))
+                continue
+            return self._cache_end(key, entry, ttl, r)
+
+    # --- async ---
+    async def aget(self, sport: str = "football", path: str = "/status",
+                   params: Optional[Dict[str, Any]] = None,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+        headers = self._headers()
+        base = self.base_for(sport)
+        key, entry, ttl, cached = self._cache_begin(base, path, params)
+        if cached is not None:
+            return cached
+        headers.update(ResponseCache.conditional_headers(entry))
+        client = self._async_pool(base)
+        for attempt in range(self.retry.retries):
+            if self.limiter.exhausted(base):
+                raise RuntimeError(f"cupo diario agotado ({base})")
+            await self.limiter.wait(base)
+            try:
+                r = await client.get(path, headers=headers, params=params or {},
+                                     timeout=timeout or self.timeout)
+            except Exception:
+                if not self.retry.should_retry(attempt):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                continue
+            self.limiter.observe(base, r.status_code, r.headers)
+            if r.status_code >= 400 and self.retry.should_retry(attempt, r.status_code):
+                await asyncio.sleep(self.retry.delay(attempt))
+                continue
+            return self._cache_end(key, entry, ttl, r)
+
+    async def aclose(self):
+        for c in self._async_pools.values():
+            await c.aclose()
+        self._async_pools.clear()
+
+    async def __aenter__(self) -> "ApiSportsClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+# ---------- API de módulo (compat) ----------
+_DEFAULT: Optional[ApiSportsClient] = None
+
+def default_client() -> ApiSportsClient:
+    global _DEFAULT
+    if _DEFAULT is None:
+        _DEFAULT = ApiSportsClient()
+    return _DEFAULT
+
+def get(session=None, sport="football", path="/status", params=None, timeout=30):
+    return default_client().get(sport=sport, path=path, params=params, timeout=timeout, session=session)
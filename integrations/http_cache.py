@@ -0,0 +1,157 @@
+# integrations/http_cache.py
+"""
+Caché en disco de respuestas API-Sports.
+- Clave: (host, path, params) -> sha1
+- TTL por endpoint: días cerrados no expiran, fixtures próximos expiran en minutos
+- Revalidación condicional (ETag / Last-Modified) cuando la entrada está vencida
+- Evicción LRU por tamaño total (mtime = último acceso)
+"""
+
+from __future__ import annotations
+import os, json, gzip, time, hashlib, threading
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+from urllib.parse import urlsplit
+
+CACHE_DIR          = Path(os.getenv("APISPORTS_CACHE_DIR", "data/cache/apisports"))
+DEFAULT_MAX_BYTES  = int(float(os.getenv("APISPORTS_CACHE_MAX_MB", "512")) * 1024 * 1024)
+TTL_UPCOMING       = float(os.getenv("APISPORTS_CACHE_TTL_UPCOMING", "600"))    # hoy/futuro: 10 min
+TTL_RECENT         = float(os.getenv("APISPORTS_CACHE_TTL_RECENT", "21600"))    # ayer: 6 h
+TTL_DEFAULT        = float(os.getenv("APISPORTS_CACHE_TTL_DEFAULT", "3600"))
+NO_CACHE_PATHS     = {"/status"}
+
+def _as_date(v) -> Optional[date]:
+    try:
+        return datetime.strptime(str(v)[:10], "%Y-%m-%d").date()
+    except Exception:
+        return None
+
+def ttl_for(path: str, params: Optional[Dict[str, Any]]) -> Optional[float]:
+    """
+    Segundos de vigencia para un endpoint. None = nunca expira; 0 = no cachear.
+    Se decide por la fecha pedida (`date` o el extremo `to` de una ventana).
+    """
+    if path in NO_CACHE_PATHS:
+        return 0.0
+    params = params or {}
+    day = _as_date(params.get("date") or params.get("to"))
+    if day is None:
+        return TTL_DEFAULT
+    today = datetime.now(timezone.utc).date()
+    if day < today - timedelta(days=1):
+        return None          # día cerrado: resultados finales
+    if day < today:
+        return TTL_RECENT    # ayer: pueden llegar correcciones/partidos tardíos
+    return TTL_UPCOMING
+
+class ResponseCache:
+    def __init__(self, root: Path = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    # --- claves / rutas ---
+    @staticmethod
+    def key(base: str, path: str, params: Optional[Dict[str, Any]]) -> str:
+        host = urlsplit(base).netloc or base
+        raw = json.dumps([host, path, sorted((str(k), str(v)) for k, v in (params or {}).items())])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    # --- lectura ---
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        f = self._file(key)
+        try:
+            with gzip.open(f, "rt", encoding="utf-8") as fh:
+                entry = json.load(fh)
+        except Exception:
+            return None
+        try:
+            os.utime(f, None)  # LRU: marca de último acceso
+        except OSError:
+            pass
+        return entry
+
+    @staticmethod
+    def is_fresh(entry: Dict[str, Any]) -> bool:
+        ttl = entry.get("ttl")
+        return ttl is None or (time.time() - float(entry.get("stored_at", 0))) < float(ttl)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        if not entry:
+            return {}
+        h = {}
+        if entry.get("etag"):
+            h["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            h["If-Modified-Since"] = entry["last_modified"]
+        return h
+
+    # --- escritura ---
+    def store(self, key: str, body: Dict[str, Any], headers=None, ttl: Optional[float] = None):
+        if ttl == 0 or not isinstance(body, dict) or body.get("errors"):
+            return  # no cachear errores ni endpoints volátiles
+        headers = headers or {}
+        entry = {
+            "stored_at": time.time(),
+            "ttl": ttl,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "body": body,
+        }
+        f = self._file(key)
+        f.parent.mkdir(parents=True, exist_ok=True)
+        tmp = f.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            json.dump(entry, fh, ensure_ascii=False)
+        old = f.stat().st_size if f.exists() else 0
+        os.replace(tmp, f)
+        self._account(f.stat().st_size - old)
+
+    def refresh(self, key: str, entry: Dict[str, Any], headers=None, ttl: Optional[float] = None):
+        """304 Not Modified: reinicia la vigencia (con el TTL vigente) conservando el cuerpo."""
+        headers = headers or {}
+        entry = dict(entry)
+        entry["etag"] = headers.get("etag") or entry.get("etag")
+        entry["last_modified"] = headers.get("last-modified") or entry.get("last_modified")
+        self.store(key, entry["body"], {"etag": entry["etag"], "last-modified": entry["last_modified"]},
+                   ttl)
+
+    # --- evicción LRU por tamaño ---
+    def _files(self):
+        return self.root.glob("*/*.json.gz") if self.root.exists() else []
+
+    def _account(self, delta: int):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self._files())
+            else:
+                self._size += delta
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self._files():
+            try:
+                st = p.stat()
+                entries.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                continue
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        for _, sz, p in entries:
+            if size <= target:
+                break
+            try:
+                p.unlink()
+                size -= sz
+            except OSError:
+                pass
+        self._size = size
@@ -0,0 +1,123 @@
+# integrations/ratelimit.py
+"""
+Rate limiting para API-Sports: token bucket por host base.
+- `rate` req/s sostenidas con ráfagas de hasta `burst`
+- Se adapta a Retry-After / 429 y a los headers de cupo por minuto y por día
+- Entradas async (`wait`) y sync (`wait_sync`)
+"""
+
+from __future__ import annotations
+import time, asyncio, threading
+from typing import Dict, Tuple
+
+class TokenBucket:
+    """
+    Cubeta de tokens: `rate` req/s sostenidas con ráfagas de hasta `burst`.
+    Se ajusta con los headers de API-Sports (cupo por minuto / por día) y Retry-After.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(float(rate), 1e-3)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.exhausted = False            # cupo diario agotado (x-ratelimit-requests-remaining=0)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self._sync_lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                delay = self._next_delay()
+                if delay <= 0:
+                    return
+                await asyncio.sleep(delay)
+
+    def _next_delay(self) -> float:
+        """0 si hay token (y lo consume); si no, segundos a esperar."""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def acquire_sync(self):
+        with self._sync_lock:
+            while True:
+                delay = self._next_delay()
+                if delay <= 0:
+                    return
+                time.sleep(delay)
+
+    def block_for(self, seconds: float):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + max(0.0, seconds))
+
+    def observe(self, status: int, headers) -> None:
+        """Adapta la cubeta a la respuesta: Retry-After, cupo por minuto y cupo diario."""
+        retry_after = _header_float(headers, "retry-after")
+        if retry_after is not None:
+            self.block_for(retry_after)
+        elif status == 429:
+            self.block_for(1.0 + 1.0 / self.rate)
+        per_minute = _header_float(headers, "x-ratelimit-remaining")
+        if per_minute is not None:
+            if per_minute <= 0:
+                self.block_for(60.0)
+            else:
+                self._refill(time.monotonic())
+                self.tokens = min(self.tokens, per_minute)
+        per_day = _header_float(headers, "x-ratelimit-requests-remaining")
+        if per_day is not None and per_day <= 0:
+            self.exhausted = True
+
+def _header_float(headers, name: str):
+    try:
+        v = headers.get(name) if headers is not None else None
+        return float(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """
+    Limitador con una cubeta independiente por base URL (football/baseball/hockey... tienen
+    cupos separados). `per_host` permite sobreescribir (rate, burst) para una base concreta.
+    """
+    def __init__(self, rate: float, burst: int = 1,
+                 per_host: Dict[str, Tuple[float, int]] | None = None):
+        self.rate = float(rate)
+        self.burst = int(burst)
+        self.per_host = dict(per_host or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_throttle_ms(cls, throttle_ms: int, burst: int = 1, **kw) -> "RateLimiter":
+        return cls(1000.0 / max(1, throttle_ms), burst, **kw)
+
+    def bucket(self, host: str = "") -> TokenBucket:
+        b = self._buckets.get(host)
+        if b is None:
+            rate, burst = self.per_host.get(host, (self.rate, self.burst))
+            b = self._buckets[host] = TokenBucket(rate, burst)
+        return b
+
+    async def wait(self, host: str = ""):
+        await self.bucket(host).acquire()
+
+    def wait_sync(self, host: str = ""):
+        self.bucket(host).acquire_sync()
+
+    def observe(self, host: str, status: int, headers) -> None:
+        self.bucket(host).observe(status, headers)
+
+    def exhausted(self, host: str = "") -> bool:
+        return self.bucket(host).exhausted
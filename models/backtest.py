@@ -1,29 +1,219 @@
 # models/backtest.py
-import argparse
+"""
+Backtest walk-forward sobre storage.historical.load_games:
+- Recorre cada deporte día a día con Elo y forma en memoria: las features de cada juego usan
+  sólo el estado previo a su día, que se actualiza incrementalmente tras liquidarlo
+- Todas las pizarras pasan en lote por el mismo camino de models/predict.py (home_probability)
+- Métricas por deporte: Brier, log-loss, acierto, curva de calibración
+- ROI simulado de singles (Top-M diario como select_picks) y de las estrategias de
+  serving/parlay_builder (Segurito / Soñadora) a la cuota de cierre guardada en storage.odds
+  (sólo partidos con cuota); sin cuota, cobrar a MARGIN / prob da ROI ≈ MARGIN - 1 por
+  construcción, así que esa versión se reporta aparte como *_calib_proxy (proxy de calibración)
+- Closing-line value de los picks publicados: lado publicado y cuota al publicar
+  (data/processed/predictions_log de models/predict.py) contra la cuota de cierre guardada
+"""
+
+import sys, argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage.historical import load_games, canonical_sport, team_key  # type: ignore
+from storage.odds import closing_history, closing_lines, clv  # type: ignore
+from storage import write_table  # type: ignore
+from models.ratings import SPORTS  # type: ignore
+from models.learn import replay  # type: ignore
+from models.predict import prepare, home_probability  # type: ignore
+from pipelines.recalibrate import load_log  # type: ignore
+from serving.parlay_builder import (plan_parlays, MARGIN,  # type: ignore
+                                    MAX_LEGS_SEG, MAX_LEGS_DRM, TARGET_DEC_ODDS_SEG, TARGET_DEC_ODDS_DRM)
+
 OUT = Path("reports"); OUT.mkdir(parents=True, exist_ok=True)
-HIST = Path("data/historical")
+MAX_PICKS = 5
+CAL_BINS = 10
+EPS = 1e-6
+CLOSE_COLS = ["close_home", "close_away", "close_draw"]
+CLOSE_MATCH_DAYS = 1  # fecha local del histórico vs inicio UTC de la cuota
+
+# ---------- replay ----------
+def replay_sport(sport: str, games: pd.DataFrame) -> pd.DataFrame:
+    """
+    P(local) pre-partido de cada juego. Un solo pase cronológico (models.learn.replay)
+    precalcula, por día, Elo y forma con el estado previo a ese día; después toda la tabla
+    pasa en lote por home_probability.
+    """
+    pit = replay(sport, games)
+    ev = prepare(pit[["date", "league", "home", "away", "home_form", "away_form"]].assign(sport=sport))
+    # sin cuotas históricas, ni baselines/calibración/modelos ajustados con datos futuros
+    tables = {k: pd.Series(dtype=float) for k in ("surface", "league", "sport")}
+    raw, _, source = home_probability(ev, tables=tables, calib={}, learned={},
+                                      elo=(pit["p_elo"].to_numpy(), pit["known"].to_numpy()))
+    return ev[["date", "sport", "league", "home", "away"]].assign(p_home=raw, source=source, y=pit["y"].to_numpy())
+
+# ---------- métricas ----------
+def sport_metrics(d: pd.DataFrame) -> dict:
+    p = np.clip(d["p_home"].to_numpy(float), EPS, 1 - EPS)
+    y = (d["y"].to_numpy(float) == 1.0).astype(float)  # victoria local (empate = 0)
+    return {
+        "n": len(d),
+        "brier": float(np.mean((p - y) ** 2)),
+        "logloss": float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))),
+        "accuracy": float(np.mean((p >= 0.5) == (y == 1.0))),
+        "home_win_rate": float(y.mean()),
+    }
+
+def calibration_curve(d: pd.DataFrame) -> pd.DataFrame:
+    b = np.minimum((d["p_home"].to_numpy(float) * CAL_BINS).astype(int), CAL_BINS - 1)
+    g = pd.DataFrame({"bin": b, "p": d["p_home"].to_numpy(float),
+                      "y": (d["y"].to_numpy(float) == 1.0).astype(float)}).groupby("bin")
+    return pd.DataFrame({"p_mean": g["p"].mean(), "y_rate": g["y"].mean(), "n": g.size()}).reset_index()
+
+def attach_closing(pred: pd.DataFrame) -> pd.DataFrame:
+    """Cuotas de cierre h2h (mediana entre casas) por partido; NaN donde el store de cuotas no lo tiene."""
+    out = pred.assign(**{c: np.nan for c in CLOSE_COLS})
+    if pred.empty:
+        return out
+    day = pd.to_datetime(pred["date"], errors="coerce")
+    pad = pd.Timedelta(days=CLOSE_MATCH_DAYS)
+    lines = closing_lines(closing_history(day.min() - pad, day.max() + pad))
+    if lines.empty:
+        return out
+    ev = pd.DataFrame({"_row": np.arange(len(pred)), "sport": pred["sport"].map(canonical_sport).to_numpy(),
+                       "hk": pred["home"].map(team_key).to_numpy(), "ak": pred["away"].map(team_key).to_numpy(),
+                       "day": day.to_numpy()})
+    ln = lines.assign(sport=lines["sport"].map(canonical_sport), hk=lines["home"].map(team_key),
+                      ak=lines["away"].map(team_key),
+                      cday=pd.to_datetime(lines["commence_time"], utc=True).dt.tz_localize(None).dt.normalize())
+    m = ev.merge(ln, on=["sport", "hk", "ak"], how="inner")
+    m["_gap"] = (m["cday"] - m["day"]).abs()
+    m = m[m["_gap"] <= pad].sort_values(["_row", "_gap"]).drop_duplicates("_row")
+    for c in CLOSE_COLS:
+        vals = out[c].to_numpy(float).copy()
+        vals[m["_row"].to_numpy()] = m[c].to_numpy(float)
+        out[c] = vals
+    return out
+
+def picks_frame(pred: pd.DataFrame) -> pd.DataFrame:
+    """Lado elegido por juego (como predict.py), prob., si ganó y su cuota de cierre (NaN sin cuota)."""
+    home = pred["p_home"].to_numpy(float) >= 0.5
+    prob = np.where(home, pred["p_home"], 1.0 - pred["p_home"].to_numpy(float))
+    won = np.where(home, pred["y"].to_numpy(float) == 1.0, pred["y"].to_numpy(float) == 0.0)
+    close = [pred[c].to_numpy(float) if c in pred.columns else np.full(len(pred), np.nan) for c in CLOSE_COLS[:2]]
+    return pred[["date", "sport"]].assign(prob=prob, won=won.astype(float), dec=np.where(home, *close))
 
-def acc(df): 
-    return float(df["result_home_win"].mean()) if not df.empty else 0.0
+def simulate_roi(picks: pd.DataFrame, proxy: bool = False) -> dict:
+    """
+    ROI por unidad apostada: singles (todos y Top-M diario) y parlays Segurito/Soñadora por día, a la
+    cuota de cierre (sólo picks con cuota). proxy=True cobra todos a MARGIN / prob: proxy de
+    calibración (≈ MARGIN - 1 si el modelo está calibrado), no un ROI de mercado.
+    """
+    if proxy:
+        picks = picks.assign(dec=MARGIN / np.clip(picks["prob"].to_numpy(float), EPS, 1))
+    else:
+        picks = picks[np.isfinite(picks["dec"].to_numpy(float)) & (picks["dec"].to_numpy(float) > 1.0)]
+    roi = lambda d: float(np.mean(d["won"] * d["dec"] - 1.0)) if len(d) else 0.0  # noqa: E731
+    res = {"singles_all": (roi(picks), len(picks))}
+    ordered = picks.sort_values(["date", "prob"], ascending=[True, False], kind="stable")
+    top = ordered.groupby("date", sort=False).head(MAX_PICKS)
+    res["singles_top"] = (roi(top), len(top))
+    for name, max_legs, target in (("parlay_segurito", MAX_LEGS_SEG, TARGET_DEC_ODDS_SEG),
+                                   ("parlay_sonadora", MAX_LEGS_DRM, TARGET_DEC_ODDS_DRM)):
+        pnl = []
+        for _, day in ordered.groupby("date", sort=False):
+            plan = plan_parlays(day["prob"].to_numpy(float), np.arange(len(day)), max_legs, target,
+                                price=None if proxy else day["dec"].to_numpy(float))
+            if not plan or len(plan[0][0]) < 2:
+                continue
+            legs, _, dec = plan[0]
+            pnl.append(dec - 1.0 if day["won"].iloc[legs].all() else -1.0)
+        res[name] = (float(np.mean(pnl)) if pnl else 0.0, len(pnl))
+    return res
+
+def roi_rows(prefix: str, picks: pd.DataFrame) -> list:
+    """Filas metric/value: ROI a cuota de cierre (*_roi) y proxy de calibración (*_calib_proxy_roi)."""
+    rows = []
+    for tag, proxy in (("", False), ("_calib_proxy", True)):
+        for k, (roi, n) in simulate_roi(picks, proxy=proxy).items():
+            rows += [(f"{prefix}_{k}{tag}_roi", roi), (f"{prefix}_{k}{tag}_n", n)]
+    return rows
+
+def published_clv() -> pd.DataFrame:
+    """
+    Un registro por evento publicado (última predicción antes del partido) con cuota al publicar y
+    de cierre del lado elegido: clv = cuota tomada / cierre - 1 (> 0 = se ganó a la línea).
+    """
+    cols = ["date", "sport", "league", "home", "away", "side", "prob", "taken", "close", "clv"]
+    log = load_log()
+    if log.empty or "price_home" not in log.columns:
+        return pd.DataFrame(columns=cols)
+    log = log.assign(date=log["date"].dt.strftime("%Y-%m-%d")).reset_index(drop=True)
+    p = pd.to_numeric(log["p_home"], errors="coerce").to_numpy(float)
+    home = p >= 0.5
+    taken = np.where(home, pd.to_numeric(log["price_home"], errors="coerce"),
+                     pd.to_numeric(log["price_away"], errors="coerce"))
+    log = log.assign(side=np.where(home, "home", "away"), prob=np.where(home, p, 1.0 - p), taken=taken)
+    log = attach_closing(log[np.isfinite(taken) & (taken > 1.0)].reset_index(drop=True))
+    close = np.where(log["side"] == "home", log["close_home"], log["close_away"]).astype(float)
+    out = log.assign(close=close, clv=clv(log["taken"], close))
+    return out[out["clv"].notna()][cols].reset_index(drop=True)
+
+def clv_rows(picks: pd.DataFrame) -> list:
+    """Filas metric/value por deporte y total: n, CLV medio y fracción que ganó al cierre."""
+    rows = []
+    for name, d in [*picks.groupby("sport"), ("all", picks)]:
+        if len(d):
+            rows += [(f"{name}_clv_n", len(d)), (f"{name}_clv_mean", float(d["clv"].mean())),
+                     (f"{name}_clv_beat_rate", float((d["clv"] > 0).mean()))]
+    return rows
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--years", type=int, default=5)
     ap.add_argument("--publish", type=str, default="reports/")
+    ap.add_argument("--sports", type=str, default="all", help="futbol,beisbol,... o all")
     args = ap.parse_args()
 
-    rows=[]
-    for nm,fn in [("americano_NFL","nfl_games.csv"),("tenis","tennis_matches.csv"),("futbol","soccer_matches_incremental.csv"),("NBA","nba_games.csv"),("MLB","mlb_games.csv"),("NHL","nhl_games.csv")]:
-        p=HIST/fn
-        if p.exists():
-            d=pd.read_csv(p)
-            rows.append((f"{nm}_homeWinRate", acc(d)))
-    out = Path(args.publish)/"backtest_summary.csv"
-    pd.DataFrame(rows, columns=["metric","value"]).to_csv(out, index=False)
+    this_year = datetime.utcnow().year
+    seasons = range(this_year - args.years + 1, this_year + 1)
+    sports = SPORTS if args.sports == "all" else [s.strip() for s in args.sports.split(",")]
+
+    preds = []
+    for sport in sports:
+        games = load_games(sport, columns=["home_score", "away_score"], seasons=seasons)
+        if games.empty:
+            continue
+        t0 = datetime.utcnow()
+        pred = replay_sport(sport, games)
+        print(f"[backtest] {sport}: {len(pred)} partidos en {(datetime.utcnow() - t0).total_seconds():.1f}s")
+        preds.append(pred)
+    pub = Path(args.publish); pub.mkdir(parents=True, exist_ok=True)
+    pclv = published_clv()
+    write_table(pclv, pub/"published_clv", csv_export=False)
+    print(f"[backtest] CLV de picks publicados: {len(pclv)} con cuota al publicar y de cierre")
+    if not preds:
+        pd.DataFrame(clv_rows(pclv), columns=["metric", "value"]).to_csv(pub/"backtest_summary.csv", index=False)
+        print("backtest ok – sin históricos")
+        return
+    allp = attach_closing(pd.concat(preds, ignore_index=True))
+    print(f"[backtest] cuota de cierre en {int(allp['close_home'].notna().sum())}/{len(allp)} partidos")
+
+    rows, curves = [], []
+    for sport, d in allp.groupby("sport"):
+        rows += [(f"{sport}_{k}", v) for k, v in sport_metrics(d).items()]
+        curves.append(calibration_curve(d).assign(sport=sport))
+        rows += roi_rows(sport, picks_frame(d))
+    rows += roi_rows("all", picks_frame(allp))  # pizarra multideporte (como serving)
+    rows += clv_rows(pclv)
+
+    out = pub/"backtest_summary.csv"
+    pd.DataFrame(rows, columns=["metric", "value"]).to_csv(out, index=False)
+    pd.concat(curves, ignore_index=True)[["sport", "bin", "p_mean", "y_rate", "n"]].to_csv(
+        pub/"backtest_calibration.csv", index=False)
+    write_table(allp, pub/"backtest_predictions", csv_export=False)
     print("backtest ok – wrote", out)
 
 if __name__=="__main__": main()
@@ -0,0 +1,145 @@
+# models/calibration.py
+"""
+Calibración de P(gana local) por deporte:
+- Isotónica (pool-adjacent-violators) y temperature scaling sobre logit(p)
+- Cada mapa se guarda como breakpoints compactos (x, y) en models/calibration.json
+  y se aplica con np.interp (un paso vectorizado por deporte)
+- Cadencias de reajuste por deporte en config/schedules.yaml (daily, "Mon,Wed,Fri", weekly)
+"""
+
+from __future__ import annotations
+import json
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import numpy as np
+
+try:  # config en YAML (opcional: sin pyyaml todos los deportes se consideran "daily")
+    import yaml  # type: ignore
+except Exception:
+    yaml = None
+
+CALIB_PATH = Path("models/calibration.json")
+SCHEDULES_PATH = Path("config/schedules.yaml")
+MIN_SAMPLES = 200        # partidos liquidados mínimos para ajustar un deporte
+HOLDOUT = 0.2            # fracción final (cronológica) para elegir el método
+EPS = 1e-6
+WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+# ---------- ajuste ----------
+def pav(x: np.ndarray, y: np.ndarray):
+    """Isotónica no decreciente de y sobre x -> breakpoints (media de x por bloque, valor)."""
+    ux, inv = np.unique(np.asarray(x, float), return_inverse=True)  # empates de x: un solo punto
+    cnt = np.bincount(inv).astype(float)
+    ym = np.bincount(inv, weights=np.asarray(y, float)) / cnt
+    vals, wts, sx = [], [], []
+    for xi, yi, wi in zip(ux.tolist(), ym.tolist(), cnt.tolist()):
+        vals.append(yi); wts.append(wi); sx.append(xi * wi)
+        while len(vals) > 1 and vals[-2] >= vals[-1]:
+            w = wts[-2] + wts[-1]
+            v = (vals[-2] * wts[-2] + vals[-1] * wts[-1]) / w
+            s = sx[-2] + sx[-1]
+            vals[-2:], wts[-2:], sx[-2:] = [v], [w], [s]
+    return np.asarray(sx) / np.asarray(wts), np.asarray(vals)
+
+def _logit(p):
+    p = np.clip(p, EPS, 1 - EPS)
+    return np.log(p / (1 - p))
+
+def _nll(p, y):
+    p = np.clip(p, EPS, 1 - EPS)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+def fit_temperature(p: np.ndarray, y: np.ndarray, lo: float = 0.25, hi: float = 4.0) -> float:
+    """T que minimiza el log-loss de sigmoid(logit(p)/T); búsqueda áurea sobre log T."""
+    z = _logit(p)
+    f = lambda lt: _nll(1 / (1 + np.exp(-z / np.exp(lt))), y)  # noqa: E731
+    a, b = np.log(lo), np.log(hi)
+    g = (np.sqrt(5) - 1) / 2
+    c, d = b - g * (b - a), a + g * (b - a)
+    fc, fd = f(c), f(d)
+    for _ in range(40):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - g * (b - a); fc = f(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + g * (b - a); fd = f(d)
+    return float(np.exp((a + b) / 2))
+
+def temperature_breakpoints(t: float, n: int = 99):
+    x = np.linspace(0.01, 0.99, n)
+    return x, 1 / (1 + np.exp(-_logit(x) / t))
+
+def _brier(p, y) -> float:
+    return float(np.mean((p - y) ** 2))
+
+def fit_sport(p: np.ndarray, y: np.ndarray) -> dict:
+    """
+    Ajusta isotónica y temperatura sobre el 80 % inicial (orden cronológico de entrada),
+    elige por Brier en el 20 % final (o identidad si ninguno mejora) y reajusta con todo.
+    """
+    p, y = np.asarray(p, float), np.asarray(y, float)
+    n = len(p)
+    cut = int(n * (1 - HOLDOUT))
+    tr, te = slice(0, cut), slice(cut, n)
+    bx, by = pav(p[tr], y[tr])
+    tx, ty = temperature_breakpoints(fit_temperature(p[tr], y[tr]))
+    scores = {"identity": _brier(p[te], y[te]),
+              "isotonic": _brier(np.interp(p[te], bx, by), y[te]),
+              "temperature": _brier(np.interp(p[te], tx, ty), y[te])}
+    method = min(scores, key=scores.get)
+    entry = {"method": method, "n": int(n), "brier_holdout": {k: round(v, 6) for k, v in scores.items()}}
+    if method == "isotonic":
+        bx, by = pav(p, y)
+        entry.update(x=np.round(bx, 6).tolist(), y=np.round(by, 6).tolist())
+    elif method == "temperature":
+        t = fit_temperature(p, y)
+        tx, ty = temperature_breakpoints(t)
+        entry.update(temperature=round(t, 6), x=np.round(tx, 6).tolist(), y=np.round(ty, 6).tolist())
+    return entry
+
+# ---------- persistencia / aplicación ----------
+def load_calibration(path: Path = CALIB_PATH) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def apply_calibration(p: np.ndarray, sport: np.ndarray, calib: Optional[dict] = None) -> np.ndarray:
+    """np.interp por deporte con los breakpoints guardados; deportes sin mapa quedan igual."""
+    calib = load_calibration() if calib is None else calib
+    p = np.asarray(p, dtype=float).copy()
+    sport = np.asarray(sport)
+    for s, entry in (calib.get("sports") or {}).items():
+        if not entry.get("x"):
+            continue
+        m = sport == s
+        if m.any():
+            p[m] = np.interp(p[m], entry["x"], entry["y"])
+    return p
+
+# ---------- cadencias ----------
+def load_schedules(path: Path = SCHEDULES_PATH) -> Dict[str, dict]:
+    if yaml is None or not Path(path).exists():
+        return {}
+    return yaml.safe_load(Path(path).read_text(encoding="utf-8")) or {}
+
+def _weekdays(rule: dict) -> set:
+    spec = str(rule.get("recalibrate", "daily")).strip().lower()
+    if spec == "daily":
+        return set(range(7))
+    if spec == "weekly":
+        return {WEEKDAYS.get(str(rule.get("day_local", "mon"))[:3].lower(), 0)}
+    return {WEEKDAYS[d.strip()[:3]] for d in spec.split(",") if d.strip()[:3] in WEEKDAYS} or set(range(7))
+
+def is_due(sport: str, last_fit: Optional[str], schedules: Dict[str, dict],
+           today: Optional[date] = None) -> bool:
+    """Toca reajustar si el día programado más reciente (<= hoy) es posterior al último ajuste."""
+    today = today or datetime.now(timezone.utc).date()
+    if not last_fit:
+        return True
+    days = _weekdays(schedules.get(sport) or {})
+    last_due = next(today - timedelta(days=i) for i in range(7) if (today - timedelta(days=i)).weekday() in days)
+    return date.fromisoformat(str(last_fit)[:10]) < last_due
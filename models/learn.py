@@ -0,0 +1,276 @@
+# models/learn.py
+"""
+Camino de entrenamiento aprendido (por deporte):
+- `replay`: un pase cronológico sobre storage.historical.load_games con Elo, forma y descanso
+  punto-en-el-tiempo (lo mismo que usa models/backtest.py)
+- Matriz numérica float32 (FEATURES) cacheada en models_store/features/<sport>-<versión>.npz;
+  la versión es un hash de los archivos de origen y parámetros de features, así que reentrenar
+  con otros hiperparámetros no la reconstruye
+- Regresión logística L2 (Newton, numpy) y, opcional, HistGradientBoosting de scikit-learn;
+  peso del ensamble y calibración opcional elegidos en la 1ª mitad de la ventana final (HOLDOUT)
+  y métricas medidas en la 2ª
+- `LearnedModel.predict(X)` vectorizado; models/predict.py arma X con `assemble`
+"""
+
+from __future__ import annotations
+import os, sys, json, pickle, hashlib
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:  # boosting por histogramas (opcional: sin scikit-learn sólo logística)
+    from sklearn.ensemble import HistGradientBoostingClassifier  # type: ignore
+except Exception:
+    HistGradientBoostingClassifier = None
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage.historical import load_games, team_key, source_files  # type: ignore
+from models.ratings import EloRatings  # type: ignore
+from models.calibration import pav, fit_temperature, temperature_breakpoints, fit_sport as fit_calibration  # type: ignore
+from pipelines.team_form import apply_result, decay_factor, results, FORM_LAST_N, FORM_HALFLIFE  # type: ignore
+
+FEATURES = ["elo_logit", "elo_known", "home_form", "away_form", "home_rest", "away_rest", "odds_logit", "has_odds"]
+FEATURE_VERSION = 2
+CACHE_DIR = Path(os.getenv("FEATURE_CACHE_DIR", "models_store/features"))
+REST_CAP = 14.0          # días de descanso (desconocido = tope)
+HOLDOUT = 0.2            # ventana final (cronológica): 1ª mitad pesos/calibración, 2ª mitad evaluación
+MIN_TRAIN = 300          # partidos mínimos para ajustar un deporte
+HPARAMS = {"l2": 1.0, "hgb_iter": 200, "hgb_lr": 0.05, "hgb_leaves": 15}
+EPS = 1e-6
+
+def _logit(p):
+    p = np.clip(np.asarray(p, float), EPS, 1 - EPS)
+    return np.log(p / (1 - p))
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+# ---------- features punto-en-el-tiempo ----------
+def replay(sport: str, games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Estado previo al día de cada juego (Elo, forma, descanso); se actualiza tras liquidar el día.
+    -> columnas date, league, home, away, p_elo, known, home_form, away_form, home_rest, away_rest, y
+    """
+    games = games.sort_values("date", kind="stable").reset_index(drop=True)
+    n = len(games)
+    res = results(games)  # 1 / 0.5 (empate) / 0
+    day = games["date"].to_numpy().astype("datetime64[D]")
+    dayn = (day - day.min()).astype(np.int64).astype(np.int32) if n else day.astype(np.int32)
+    cuts = np.flatnonzero(day[1:] != day[:-1]) + 1
+
+    elo = EloRatings(sport)
+    hi, ai = elo.ids_for(games["home"], add=True), elo.ids_for(games["away"], add=True)
+    hk, ak = games["home"].map(team_key).tolist(), games["away"].map(team_key).tolist()
+    p_elo, known = np.empty(n), np.zeros(n, dtype=bool)
+    hform, aform = np.full(n, 0.5), np.full(n, 0.5)
+    hrest, arest = np.full(n, np.nan), np.full(n, np.nan)
+    form, last, decay = {}, {}, decay_factor()
+    ok = (hi >= 0) & (ai >= 0) & (hi != ai)
+    for idx in (np.split(np.arange(n), cuts) if n else []):
+        h, a = hi[idx], ai[idx]
+        p_elo[idx] = elo.predict(h, a)
+        known[idx] = elo.known(h) & elo.known(a)
+        for i in idx.tolist():
+            sh, sa = form.get((sport, hk[i])), form.get((sport, ak[i]))
+            if sh and sh[3] > 0:
+                hform[i] = sh[2] / sh[3]
+            if sa and sa[3] > 0:
+                aform[i] = sa[2] / sa[3]
+            if hk[i] in last:
+                hrest[i] = dayn[i] - last[hk[i]]
+            if ak[i] in last:
+                arest[i] = dayn[i] - last[ak[i]]
+        # liquidación del día -> estado para el siguiente
+        m = ok[idx]
+        elo.update(h[m], a[m], res[idx][m], dayn[idx][m])
+        when = str(day[idx[-1]])
+        for i in idx.tolist():
+            apply_result(form, sport, games.at[i, "home"], res[i], when, decay)
+            apply_result(form, sport, games.at[i, "away"], 1.0 - res[i], when, decay)
+            last[hk[i]] = last[ak[i]] = int(dayn[i])
+
+    return pd.DataFrame({
+        "date": day.astype(str), "league": games["league"].to_numpy(),
+        "home": games["home"].to_numpy(), "away": games["away"].to_numpy(),
+        "p_elo": p_elo, "known": known, "home_form": hform, "away_form": aform,
+        "home_rest": hrest, "away_rest": arest, "y": res,
+    })
+
+def assemble(p_elo, known, home_form, away_form, home_rest, away_rest, p_odds=None, has_odds=None) -> np.ndarray:
+    """Matriz (n, len(FEATURES)) float32 en el orden de FEATURES; faltantes con valores neutros."""
+    p_elo = np.asarray(p_elo, float)
+    n = len(p_elo)
+    rest = lambda r: np.clip(np.nan_to_num(np.asarray(r, float), nan=REST_CAP), 0.0, REST_CAP)  # noqa: E731
+    odds = np.full(n, np.nan) if p_odds is None else np.asarray(p_odds, float)
+    has = ~np.isnan(odds) if has_odds is None else np.asarray(has_odds, bool)
+    cols = [
+        _logit(np.nan_to_num(p_elo, nan=0.5)),
+        np.asarray(known, float),
+        np.nan_to_num(np.asarray(home_form, float), nan=0.5),
+        np.nan_to_num(np.asarray(away_form, float), nan=0.5),
+        rest(home_rest), rest(away_rest),
+        np.where(has, _logit(np.nan_to_num(odds, nan=0.5)), 0.0),
+        has.astype(float),
+    ]
+    return np.column_stack(cols).astype(np.float32) if n else np.zeros((0, len(FEATURES)), np.float32)
+
+# ---------- caché de la matriz ----------
+def data_version(sport: str, seasons=None) -> str:
+    """Hash de (archivos de origen: ruta, tamaño, mtime) + parámetros de las features."""
+    elo = EloRatings(sport)
+    spec = [FEATURE_VERSION, FEATURES, REST_CAP, elo.params, FORM_LAST_N, FORM_HALFLIFE,
+            sorted(seasons) if seasons is not None else None]
+    for f in source_files(sport):
+        st = Path(f).stat()
+        spec.append([str(f), st.st_size, st.st_mtime_ns])
+    return hashlib.sha1(json.dumps(spec, default=str).encode()).hexdigest()[:12]
+
+def feature_matrix(sport: str, seasons=None, rebuild: bool = False):
+    """-> (X float32, y float32 [gana local], day datetime64[D]) desde la caché o reconstruida."""
+    path = CACHE_DIR / f"{sport}-{data_version(sport, seasons)}.npz"
+    if path.exists() and not rebuild:
+        with np.load(path, allow_pickle=False) as z:
+            return z["X"], z["y"], z["day"].astype("datetime64[D]")
+    # replay de toda la historia (el mismo Elo que publica train) y recorte a las temporadas después
+    pit = replay(sport, load_games(sport, columns=["home_score", "away_score"]))
+    if seasons is not None:
+        pit = pit[pit["date"].str[:4].astype(int).isin(list(seasons))].reset_index(drop=True)
+    X = assemble(pit["p_elo"], pit["known"], pit["home_form"], pit["away_form"], pit["home_rest"], pit["away_rest"])
+    y = (pit["y"].to_numpy(float) == 1.0).astype(np.float32)
+    day = pit["date"].to_numpy().astype("datetime64[D]")
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    for old in CACHE_DIR.glob(f"{sport}-*.npz"):  # una versión por deporte
+        old.unlink()
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, X=X, y=y, day=day.astype(np.int64))
+    os.replace(tmp, path)
+    return X, y, day
+
+# ---------- modelos ----------
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1.0, iters: int = 30) -> dict:
+    """Newton-Raphson sobre features estandarizadas; L2 sin penalizar el intercepto."""
+    X = np.asarray(X, np.float64)
+    mu, sd = X.mean(axis=0), X.std(axis=0)
+    sd[sd < 1e-6] = 1.0
+    Z = np.column_stack([np.ones(len(X)), (X - mu) / sd])
+    w = np.zeros(Z.shape[1])
+    reg = np.full(Z.shape[1], l2); reg[0] = 0.0
+    for _ in range(iters):
+        p = _sigmoid(Z @ w)
+        g = Z.T @ (p - y) + reg * w
+        H = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(reg + 1e-9)
+        step = np.linalg.solve(H, g)
+        w -= step
+        if np.max(np.abs(step)) < 1e-7:
+            break
+    return {"coef": w, "mean": mu, "std": sd}
+
+def fit_hgb(X: np.ndarray, y: np.ndarray, hp: dict):
+    if HistGradientBoostingClassifier is None:
+        return None
+    clf = HistGradientBoostingClassifier(max_iter=int(hp["hgb_iter"]), learning_rate=float(hp["hgb_lr"]),
+                                         max_leaf_nodes=int(hp["hgb_leaves"]), early_stopping=False,
+                                         random_state=0)
+    return clf.fit(X, y.astype(int))
+
+class LearnedModel:
+    """Logística (+ boosting opcional) con peso de ensamble y mapa de calibración opcional."""
+
+    def __init__(self, coef, mean, std, hgb=None, w_lr: float = 1.0, cal_x=None, cal_y=None):
+        self.coef, self.mean, self.std = coef, mean, std
+        self.hgb, self.w_lr = hgb, float(w_lr) if hgb is not None else 1.0
+        self.cal_x, self.cal_y = cal_x, cal_y
+
+    def predict_lr(self, X) -> np.ndarray:
+        return _sigmoid(((np.asarray(X, np.float64) - self.mean) / self.std) @ self.coef[1:] + self.coef[0])
+
+    def predict(self, X, calibrated: bool = True) -> np.ndarray:
+        p = self.predict_lr(X)
+        if self.hgb is not None and self.w_lr < 1.0 and len(p):
+            p = self.w_lr * p + (1.0 - self.w_lr) * self.hgb.predict_proba(np.asarray(X, np.float32))[:, 1]
+        if calibrated and self.cal_x is not None and len(self.cal_x):
+            p = np.interp(p, self.cal_x, self.cal_y)
+        return p
+
+def _metrics(p, y) -> dict:
+    p = np.clip(p, EPS, 1 - EPS)
+    return {"brier": round(float(np.mean((p - y) ** 2)), 6),
+            "logloss": round(float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p))), 6)}
+
+def beats_elo(report: Optional[dict]) -> bool:
+    """
+    Gate de publicación y de ruteo: log-loss del ensamble (y, si hay mapa, de lo calibrado, que es
+    lo que se sirve) < la del Elo solo en la ventana de evaluación.
+    """
+    try:
+        elo = float(report["elo_only"]["logloss"])
+        return all(float(report[k]["logloss"]) < elo for k in ("ensemble", "calibrated") if k in report)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+def fit_learned(X: np.ndarray, y: np.ndarray, ensemble: bool = False, calibrate: str = "none",
+                hp: Optional[dict] = None):
+    """
+    Ajusta en el 80 % inicial; la ventana final se parte en dos mitades cronológicas: la primera
+    elige el peso logística/boosting y ajusta la calibración, la segunda sólo mide (todas las
+    métricas del reporte son fuera de muestra). Sin calibración los modelos se reajustan con todo;
+    con calibración se publica el modelo del 80 %, el mismo al que se ajustó el mapa. Si en la
+    evaluación no baja la log-loss del Elo solo, no hay modelo (predict.py sigue con el Elo).
+    -> (LearnedModel, reporte con métricas de evaluación) o (None, reporte con "skipped")
+    """
+    hp = {**HPARAMS, **(hp or {})}
+    y = np.asarray(y, np.float64)
+    n = len(y)
+    if n < MIN_TRAIN:
+        return None, {"skipped": f"{n} partidos (< {MIN_TRAIN})"}
+    cut = int(n * (1 - HOLDOUT))
+    mid = cut + (n - cut) // 2
+    tr, fit, ev = slice(0, cut), slice(cut, mid), slice(mid, n)
+    lr = fit_logistic(X[tr], y[tr], hp["l2"])
+    p_lr = LearnedModel(**lr).predict_lr(X[cut:])
+    hgb = fit_hgb(X[tr], y[tr], hp) if ensemble else None
+    w_lr, p_ens = 1.0, p_lr
+    k = mid - cut  # p_* cubren fit + ev: [:k] ajuste, [k:] evaluación
+    if hgb is not None:
+        p_hgb = hgb.predict_proba(X[cut:])[:, 1]
+        grid = np.linspace(0.0, 1.0, 21)
+        losses = [_metrics(w * p_lr[:k] + (1 - w) * p_hgb[:k], y[fit])["logloss"] for w in grid]
+        w_lr = float(grid[int(np.argmin(losses))])
+        p_ens = w_lr * p_lr + (1 - w_lr) * p_hgb
+    cal_x = cal_y = None
+    if calibrate == "isotonic":
+        cal_x, cal_y = pav(p_ens[:k], y[fit])
+    elif calibrate == "temperature":
+        cal_x, cal_y = temperature_breakpoints(fit_temperature(p_ens[:k], y[fit]))
+    elif calibrate == "auto":
+        entry = fit_calibration(p_ens[:k], y[fit])
+        if entry.get("x"):
+            cal_x, cal_y = np.asarray(entry["x"]), np.asarray(entry["y"])
+    report = {"n": int(n), "holdout": int(n - cut), "eval": int(n - mid), "w_lr": w_lr, "hgb": hgb is not None,
+              "calibrate": calibrate, "elo_only": _metrics(_sigmoid(X[ev, 0].astype(float)), y[ev]),
+              "lr": _metrics(p_lr[k:], y[ev]), "ensemble": _metrics(p_ens[k:], y[ev])}
+    if cal_x is not None:
+        report["calibrated"] = _metrics(np.interp(p_ens[k:], cal_x, cal_y), y[ev])
+    if not beats_elo(report):
+        return None, {**report, "skipped": f"log-loss {report['ensemble']['logloss']} >= Elo "
+                                           f"{report['elo_only']['logloss']} en la evaluación"}
+    if cal_x is not None:  # el mapa vale para el modelo al que se ajustó
+        return LearnedModel(**lr, hgb=hgb if w_lr < 1.0 else None, w_lr=w_lr, cal_x=cal_x, cal_y=cal_y), report
+    full = fit_logistic(X, y, hp["l2"])
+    hgb = fit_hgb(X, y, hp) if hgb is not None and w_lr < 1.0 else None
+    return LearnedModel(**full, hgb=hgb, w_lr=w_lr), report
+
+# ---------- serialización (registro) ----------
+def to_arrays(sport: str, m: LearnedModel) -> Dict[str, np.ndarray]:
+    out = {f"lr_{sport}_coef": np.asarray(m.coef, np.float64), f"lr_{sport}_mean": np.asarray(m.mean, np.float64),
+           f"lr_{sport}_std": np.asarray(m.std, np.float64)}
+    if m.cal_x is not None:
+        out.update({f"cal_{sport}_x": np.asarray(m.cal_x, np.float64), f"cal_{sport}_y": np.asarray(m.cal_y, np.float64)})
+    return out
+
+def to_blobs(sport: str, m: LearnedModel) -> Dict[str, bytes]:
+    return {f"hgb_{sport}.pkl": pickle.dumps(m.hgb)} if m.hgb is not None else {}
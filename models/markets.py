@@ -0,0 +1,251 @@
+# models/markets.py
+"""
+Motor de mercados (ML, spread/handicap y totales) sobre una distribución de marcador por deporte:
+- Poisson independiente (margen Skellam) en fútbol y hockey: λ local/visita tales que
+  λh + λa = total esperado y P(gana local) + DRAW_SHARE·P(empate) reproduce la prob. calibrada
+  de models/predict.py; con cuota de empate (p_draw, mercado 1X2) esa prob. es P(local | no
+  empate) y se pasa a puntaje esperado p·(1 - p_draw) + 0.5·p_draw
+- Normal en baloncesto, americano y béisbol: margen ~ N(σ·Φ⁻¹(p), σ), total ~ N(media, sd)
+- Parámetros de marcador (total medio, sd del total, sd del margen) por (deporte, liga) desde
+  models/train.py (score_params), con defaults por deporte
+- Líneas: las del mercado si vienen en features (total_line/market_total, spread_line = handicap
+  del local); sin ellas, líneas estándar en los deportes Poisson (goles 1.5/2.5/3.5, puck line)
+- Todo en lote: una matriz de probabilidades por familia para todos los eventos y líneas
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:  # config en YAML (opcional: sin pyyaml se generan todos los mercados)
+    import yaml  # type: ignore
+except Exception:
+    yaml = None
+
+MARKETS_PATH = Path("config/markets.yaml")
+SCORE_COLS = ["total_mean", "total_sd", "margin_sd"]
+FAMILY = {"futbol": "poisson", "hockey": "poisson", "baloncesto": "normal", "americano": "normal", "beisbol": "normal"}
+DEFAULT_SCORES = {  # total medio, sd del total, sd del margen
+    "futbol":     (2.6, 1.6, 1.7),
+    "hockey":     (6.0, 2.4, 2.5),
+    "baloncesto": (224.0, 19.0, 13.5),
+    "americano":  (44.0, 13.5, 13.5),
+    "beisbol":    (8.8, 4.4, 4.2),
+}
+# P(local) en deportes Poisson = puntaje esperado P(gana) + share·P(empate): fútbol 0.5 (el Elo
+# cuenta el empate como medio punto), hockey 0.5 (OT/SO ~ moneda)
+DRAW_SHARE = {"futbol": 0.5, "hockey": 0.5}
+STANDARD_TOTALS = {"futbol": [1.5, 2.5, 3.5], "hockey": [5.5]}
+STANDARD_SPREADS = {"hockey": 1.5}            # favorito -1.5 / no favorito +1.5
+# nombres de config/markets.yaml -> mercado del motor
+MARKET_ALIASES = {"totales": "TOTAL", "over_under": "TOTAL", "over_under_goles": "TOTAL", "total_goles": "TOTAL",
+                  "total_puntos": "TOTAL", "total_carreras": "TOTAL", "handicap": "SPREAD", "spread": "SPREAD"}
+MAX_GOALS = 12
+MIN_SCORE_GAMES = 50
+
+# ---------- normal (sin scipy) ----------
+def _norm_cdf(x):
+    """Φ(x) con erfc de Abramowitz-Stegun 7.1.26 (error < 1.5e-7), vectorizado."""
+    x = np.asarray(x, float)
+    z = np.abs(x) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erfc = poly * np.exp(-z * z)
+    return np.where(x >= 0, 1.0 - 0.5 * erfc, 0.5 * erfc)
+
+def _norm_ppf(p):
+    """Φ⁻¹(p) (aproximación racional de Acklam, error relativo ~1e-9), vectorizado."""
+    p = np.clip(np.asarray(p, float), 1e-9, 1 - 1e-9)
+    a = [-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00]
+    b = [-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00]
+    d = [7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00]
+    lo = np.minimum(p, 1 - p)
+    q = np.sqrt(-2 * np.log(lo))
+    tail = (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5]) / ((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1)
+    tail = np.where(p < 0.5, tail, -tail)
+    q = p - 0.5
+    r = q * q
+    mid = (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5])*q / (((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1)
+    return np.where(lo < 0.02425, tail, mid)
+
+def _cover(win, lose):
+    """Prob. de ganar la apuesta condicionada a que no haya push."""
+    return win / np.clip(win + lose, 1e-12, None)
+
+def normal_cover(mu, sd, threshold):
+    """P(X > t | no push), X ~ N(mu, sd); líneas enteras con corrección de continuidad."""
+    t = np.asarray(threshold, float)
+    half = np.where(t == np.round(t), 0.5, 0.0)
+    win = 1.0 - _norm_cdf((t + half - mu) / sd)
+    lose = _norm_cdf((t - half - mu) / sd)
+    return _cover(win, lose)
+
+# ---------- Poisson / Skellam ----------
+_K = np.arange(MAX_GOALS + 1)
+_LOGFACT = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, 2 * MAX_GOALS + 1)))])
+_DIFF = np.arange(-MAX_GOALS, MAX_GOALS + 1)
+_DIFF_ONEHOT = (np.subtract.outer(_K, _K).reshape(-1)[:, None] == _DIFF[None, :]).astype(float)
+
+def _pmf(lam, k):
+    lam = np.clip(np.asarray(lam, float), 1e-9, None)[:, None]
+    p = np.exp(k[None, :] * np.log(lam) - lam - _LOGFACT[k][None, :])
+    return p / p.sum(axis=1, keepdims=True)  # cola truncada renormalizada
+
+def margin_pmf(lh, la) -> np.ndarray:
+    """(n, 2G+1) P(local - visita = d), d = -G..G (Skellam truncado)."""
+    joint = _pmf(lh, _K)[:, :, None] * _pmf(la, _K)[:, None, :]
+    return joint.reshape(len(joint), -1) @ _DIFF_ONEHOT
+
+def solve_rates(p_home, total, draw_share, iters: int = 40):
+    """
+    Bisección vectorizada sobre la fracción s del total que anota el local:
+    P(M > 0) + draw_share·P(M = 0) = p_home. -> (λh, λa)
+    """
+    p_home, total, draw_share = (np.asarray(x, float) for x in (p_home, total, draw_share))
+    lo, hi = np.full(len(p_home), 0.02), np.full(len(p_home), 0.98)
+    for _ in range(iters):
+        s = (lo + hi) / 2
+        m = margin_pmf(s * total, (1 - s) * total)
+        f = m[:, _DIFF > 0].sum(axis=1) + draw_share * m[:, MAX_GOALS]
+        up = f < p_home
+        lo, hi = np.where(up, s, lo), np.where(up, hi, s)
+    s = (lo + hi) / 2
+    return s * total, (1 - s) * total
+
+def poisson_cover(pmf: np.ndarray, support: np.ndarray, threshold):
+    """P(X > t | no push) con X discreta de pmf (n, k) sobre `support`."""
+    t = np.asarray(threshold, float)[:, None]
+    return _cover((pmf * (support[None, :] > t)).sum(axis=1), (pmf * (support[None, :] < t)).sum(axis=1))
+
+# ---------- parámetros ----------
+def fit_score_params(df: pd.DataFrame) -> dict:
+    """{liga: {total_mean, total_sd, margin_sd}} + "" (todo el deporte) desde home/away_score."""
+    if df.empty or not {"home_score", "away_score"} <= set(df.columns):
+        return {}
+    hs = pd.to_numeric(df["home_score"], errors="coerce")
+    as_ = pd.to_numeric(df["away_score"], errors="coerce")
+    d = pd.DataFrame({"league": df["league"].fillna(""), "total": hs + as_, "margin": hs - as_}).dropna()
+    if len(d) < MIN_SCORE_GAMES:
+        return {}
+    def stats(g):
+        return {"total_mean": float(g["total"].mean()), "total_sd": float(g["total"].std()),
+                "margin_sd": float(g["margin"].std())}
+    out = {"": stats(d)}
+    for lg, g in d.groupby("league"):
+        if len(g) >= MIN_SCORE_GAMES and lg:
+            out[lg] = stats(g)
+    return out
+
+def compile_scores(model: dict) -> pd.DataFrame:
+    """score_params de active_model.json -> DataFrame indexado por (sport, league)."""
+    rows = [(sp, lg, *[float(v[c]) for c in SCORE_COLS])
+            for sp, node in model.items() if isinstance(node, dict)
+            for lg, v in (node.get("score_params") or {}).items()]
+    df = pd.DataFrame(rows, columns=["sport", "league"] + SCORE_COLS)
+    return df.set_index(["sport", "league"])
+
+def lookup_scores(scores: Optional[pd.DataFrame], sport: np.ndarray, league: np.ndarray) -> np.ndarray:
+    """(n, 3) parámetros por evento: liga -> deporte ("") -> DEFAULT_SCORES."""
+    out = np.array([DEFAULT_SCORES.get(s, (np.nan,) * 3) for s in sport], dtype=float).reshape(len(sport), 3)
+    if scores is not None and not scores.empty:
+        for lg in (np.full(len(sport), ""), league):  # la liga pisa al default del deporte
+            hit = scores.reindex(pd.MultiIndex.from_arrays([sport, lg]))[SCORE_COLS].to_numpy(float)
+            out = np.where(np.isnan(hit), out, hit)
+    return out
+
+def load_markets(path: Path = MARKETS_PATH) -> Dict[str, set]:
+    """{sport: {"TOTAL", "SPREAD"}} según config/markets.yaml; vacío = todos."""
+    if yaml is None or not Path(path).exists():
+        return {}
+    cfg = yaml.safe_load(Path(path).read_text(encoding="utf-8")) or {}
+    return {s: {MARKET_ALIASES[m] for m in (ms or []) if m in MARKET_ALIASES} for s, ms in cfg.items()}
+
+# ---------- motor ----------
+def _num(df, *cols):
+    for c in cols:
+        if c in df.columns:
+            return pd.to_numeric(df[c], errors="coerce").to_numpy(float)
+    return np.full(len(df), np.nan)
+
+def _lines(df, sport, p_home):
+    """-> (evento, mercado, línea) con la línea en términos del local (spread) o del over (total)."""
+    total_line, spread_line = _num(df, "total_line", "market_total"), _num(df, "spread_line")
+    ev, mk, ln = [], [], []
+    idx = np.arange(len(df))
+    has = ~np.isnan(total_line)
+    ev.append(idx[has]); mk.append(np.full(has.sum(), "TOTAL")); ln.append(total_line[has])
+    has = ~np.isnan(spread_line)
+    ev.append(idx[has]); mk.append(np.full(has.sum(), "SPREAD")); ln.append(spread_line[has])
+    for s, lines in STANDARD_TOTALS.items():
+        m = (sport == s) & np.isnan(total_line)
+        for line in lines:
+            ev.append(idx[m]); mk.append(np.full(m.sum(), "TOTAL")); ln.append(np.full(m.sum(), line))
+    for s, line in STANDARD_SPREADS.items():
+        m = (sport == s) & np.isnan(spread_line)
+        ev.append(idx[m]); mk.append(np.full(m.sum(), "SPREAD")); ln.append(np.where(p_home[m] >= 0.5, -line, line))
+    return np.concatenate(ev).astype(int), np.concatenate(mk).astype(object), np.concatenate(ln).astype(float)
+
+def market_probs(df: pd.DataFrame, sport: np.ndarray, p_home: np.ndarray,
+                 scores: Optional[pd.DataFrame] = None, markets: Optional[Dict[str, set]] = None,
+                 p_draw: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """
+    Probabilidades de spread y totales por evento/línea en lote. `p_draw` (NaN = sin dato): prob.
+    de empate del mercado 1X2; en esas filas p_home se toma como P(local | no empate).
+    -> columnas: row (posición en df), market, line, p (local cubre / over), exp_total, exp_margin
+    """
+    cols = ["row", "market", "line", "p", "exp_total", "exp_margin"]
+    sport = np.asarray(sport, dtype=object)
+    p_home = np.clip(np.asarray(p_home, float), 0.01, 0.99)
+    fam = np.array([FAMILY.get(s, "") for s in sport], dtype=object)
+    if not len(df) or not (fam != "").any():
+        return pd.DataFrame(columns=cols)
+    markets = load_markets() if markets is None else markets
+    params = lookup_scores(scores, sport, df["league"].astype(str).to_numpy())
+    total, total_sd, margin_sd = params[:, 0], params[:, 1], params[:, 2]
+
+    exp_margin = np.full(len(df), np.nan)
+    lam_h, lam_a = np.full(len(df), np.nan), np.full(len(df), np.nan)
+    pois, norm = np.flatnonzero(fam == "poisson"), np.flatnonzero(fam == "normal")
+    if len(pois):
+        share = np.array([DRAW_SHARE.get(s, 0.0) for s in sport[pois]])
+        target = p_home[pois]
+        if p_draw is not None:
+            d = np.asarray(p_draw, float)[pois]
+            three = np.isfinite(d) & (d > 0) & (d < 1)
+            target = np.where(three, target * (1 - np.where(three, d, 0)) + share * np.where(three, d, 0), target)
+        lam_h[pois], lam_a[pois] = solve_rates(target, total[pois], share)
+        exp_margin[pois] = lam_h[pois] - lam_a[pois]
+    if len(norm):
+        exp_margin[norm] = margin_sd[norm] * _norm_ppf(p_home[norm])
+
+    ev, mk, ln = _lines(df, sport, p_home)
+    keep = (fam[ev] != "") & np.array([not markets or m in markets.get(s, set()) for s, m in zip(sport[ev], mk)],
+                                      dtype=bool)
+    ev, mk, ln = ev[keep], mk[keep], ln[keep]
+    p = np.full(len(ev), np.nan)
+    for family in ("poisson", "normal"):
+        for market in ("TOTAL", "SPREAD"):
+            m = (fam[ev] == family) & (mk == market)
+            if not m.any():
+                continue
+            e = ev[m]
+            # total: over si T > línea; spread: el local cubre si M + línea > 0 -> M > -línea
+            thr = ln[m] if market == "TOTAL" else -ln[m]
+            if family == "normal":
+                mu, sd = (total[e], total_sd[e]) if market == "TOTAL" else (exp_margin[e], margin_sd[e])
+                p[m] = normal_cover(mu, sd, thr)
+            elif market == "TOTAL":
+                k = np.arange(2 * MAX_GOALS + 1)
+                p[m] = poisson_cover(_pmf(lam_h[e] + lam_a[e], k), k, thr)
+            else:
+                p[m] = poisson_cover(margin_pmf(lam_h[e], lam_a[e]), _DIFF, thr)
+    out = pd.DataFrame({"row": ev, "market": mk, "line": ln, "p": p,
+                        "exp_total": total[ev], "exp_margin": exp_margin[ev]})
+    return out.dropna(subset=["p"])[cols].reset_index(drop=True)
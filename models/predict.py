@@ -1,71 +1,324 @@
 # models/predict.py
 """
-Genera data/processed/predictions.csv a partir de data/processed/features.csv
+Genera data/processed/predictions.{parquet,csv} a partir de data/processed/features (vía storage)
 - Acepta columnas: date, date_time_utc (o start_time_utc), sport, league, home, away, venue,
   y opcionalmente: home_form, away_form, days_to_kickoff.
+- Prioridad de la prob. ML por fila: cuotas (consenso sin vig entre casas fair_home/fair_away o
+  ml_home/ml_away decimales, sin vig y encogidas
+  hacia el baseline histórico de active_model.json) > modelo aprendido del deporte (logística /
+  boosting de models/learn.py sobre Elo, forma, descanso) > Elo (models/ratings.py) > score de forma.
+- Todo en operaciones de columna: las tablas planas, el Elo y los modelos aprendidos salen del
+  artefacto activo del registro (models/registry.py, .npy mapeados en memoria) o, sin registro,
+  de compilar active_model.json y del Elo persistido de models/ratings.py.
+- A/B: con MODEL_AB_SHARE > 0 una fracción estable de eventos usa el puntero "candidate" (sus
+  tablas, su Elo y sus modelos); un rollback del puntero también vuelve al Elo de ese artefacto.
+- P(local) se calibra por deporte (models/calibration.json, ver pipelines/recalibrate.py) y la
+  prob. cruda se registra en data/processed/predictions_log para los siguientes ajustes.
+- Además de ML, mercados SPREAD y TOTAL (models/markets.py) desde una distribución de marcador
+  por deporte ajustada a la P(local) calibrada, en lote para todos los eventos.
 - Produce columnas: date, sport, league, game, market, selection, line, prob,
-  prob_decimal, confidence, rationale.
+  prob_decimal, confidence, rationale, start_time_utc, model (id del artefacto del registro).
 """
 
 from __future__ import annotations
-import os
+import os, sys, json
+from datetime import datetime, timezone
 from pathlib import Path
 import pandas as pd
 import numpy as np
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import read_table, write_table, table_exists, write_partition  # type: ignore
+from storage.historical import canonical_sport  # type: ignore
+from models.ratings import EloRatings  # type: ignore
+from models.calibration import apply_calibration  # type: ignore
+from models.registry import load_artifact  # type: ignore
+from models.learn import assemble, beats_elo  # type: ignore
+from models.markets import market_probs, compile_scores  # type: ignore
+
 IN_FEATS = Path("data/processed/features.csv")
 OUT_PRED = Path("data/processed/predictions.csv")
 OUT_PRED.parent.mkdir(parents=True, exist_ok=True)
+MODEL_PATH = Path("models_store/active_model.json")
+PRED_LOG = Path("data/processed/predictions_log")
+MODEL_AB_SHARE = float(os.getenv("MODEL_AB_SHARE", "0"))  # fracción de eventos al candidato
+
+SHRINK_ALPHA = 0.15                   # peso del baseline histórico sobre la prob. de mercado
+DEVIG_SCALE, DEVIG_FLOOR = 0.97, 0.015  # compresión hacia 0.5 tras quitar el vig
 
-def _bucket_confidence(p: float) -> str:
-    if p >= 0.63:   # ~ -170 american
-        return "Alta"
-    if p >= 0.56:   # ~ -127 american
-        return "Media"
-    return "Baja"
+def _bucket_confidence(p):
+    """Alta >= 0.63 (~ -170 american), Media >= 0.56 (~ -127), Baja el resto; escalar o array."""
+    return np.select([np.asarray(p) >= 0.63, np.asarray(p) >= 0.56], ["Alta", "Media"], "Baja")
 
 def _clip01(x: np.ndarray | float) -> np.ndarray | float:
     return np.clip(x, 0.01, 0.99)
 
-def main():
-    if not IN_FEATS.exists():
-        raise FileNotFoundError(f"No existe {IN_FEATS}")
+# ---------- baselines históricos compilados ----------
+def compile_model(model: dict) -> dict:
+    """
+    active_model.json -> tablas planas de tasa de victoria local:
+    'surface' (sport, surface), 'league' (sport, league) y 'sport' (default por deporte),
+    más 'scores' (parámetros de marcador por (sport, league), ver models/markets.py).
+    Una liga única (NFL, NBA...) también sirve de default de su deporte.
+    """
+    surface, league, sport = {}, {}, {}
+    for sp, node in model.items():
+        if not isinstance(node, dict) or sp in ("meta", "ratings"):
+            continue
+        for surf, v in (node.get("by_surface") or {}).items():
+            surface[(sp, surf)] = v
+        for lg, v in (node.get("by_league") or {}).items():
+            league[(sp, lg)] = v
+        if node.get("global_home_win_rate") is not None:
+            sport[sp] = node["global_home_win_rate"]
+        leagues = {k: v["home_win_rate"] for k, v in node.items()
+                   if isinstance(v, dict) and v.get("home_win_rate") is not None}
+        league.update({(sp, k): v for k, v in leagues.items()})
+        if len(leagues) == 1 and sp not in sport:
+            sport[sp] = next(iter(leagues.values()))
+    def table(d, names):
+        if not d:
+            return pd.Series(dtype=float)
+        idx = pd.MultiIndex.from_tuples(list(d), names=names) if len(names) > 1 else pd.Index(list(d))
+        return pd.Series([float(v) for v in d.values()], index=idx)
+    return {"surface": table(surface, ["sport", "surface"]), "league": table(league, ["sport", "league"]),
+            "sport": table(sport, ["sport"]), "scores": compile_scores(model)}
 
-    df = pd.read_csv(IN_FEATS)
-    # Normalización de columnas esperadas
-    if "start_time_utc" not in df.columns:
-        if "date_time_utc" in df.columns:
-            df["start_time_utc"] = df["date_time_utc"]
-        else:
-            df["start_time_utc"] = ""
+def load_model(path: Path = MODEL_PATH) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def load_tables(ref: str = "active"):
+    """-> (tablas de baseline, id del modelo); sin artefacto en el registro, active_model.json."""
+    art = load_artifact(ref)
+    if art is not None:
+        return art.tables(), art.id
+    return (compile_model(load_model()), "legacy") if ref == "active" else (None, None)
+
+def load_ratings(ref: str = "active") -> dict | None:
+    """{sport: EloRatings} del artefacto (arrays mapeados); None sin registro (-> Elo persistido)."""
+    art = load_artifact(ref)
+    if art is None:
+        return None
+    return {s: art.ratings(s) for s in (art.meta.get("elo") or {})}
+
+def load_learned(ref: str = "active") -> dict:
+    """
+    {sport: LearnedModel} del artefacto que mejoran al Elo en su holdout (learn.beats_elo; cubre
+    artefactos publicados antes del gate); vacío sin registro o sin modelos aprendidos.
+    """
+    art = load_artifact(ref)
+    if art is None:
+        return {}
+    info = art.meta.get("learned") or {}
+    return {s: m for s, m in art.learned().items() if beats_elo(info.get(s))}
+
+def ab_mask(df: pd.DataFrame, share: float) -> np.ndarray:
+    """Asignación estable por evento (hash de fecha + equipos) al brazo candidato."""
+    if share <= 0 or df.empty:
+        return np.zeros(len(df), dtype=bool)
+    h = pd.util.hash_pandas_object(df[["date", "home", "away"]].astype(str), index=False).to_numpy()
+    return (h % np.uint64(10000)) < np.uint64(round(share * 10000))
+
+def base_rates(df: pd.DataFrame, tables: dict, sport: pd.Series) -> np.ndarray:
+    """Baseline por fila: surface -> liga -> deporte (NaN si no hay)."""
+    base = np.full(len(df), np.nan)
+    for name, col in (("surface", "surface"), ("league", "league")):
+        t = tables[name]
+        if t.empty or col not in df.columns:
+            continue
+        keys = pd.MultiIndex.from_arrays([sport, df[col].fillna("Unknown" if col == "surface" else "")])
+        base = np.where(np.isnan(base), t.reindex(keys).to_numpy(dtype=float), base)
+    if not tables["sport"].empty:
+        base = np.where(np.isnan(base), tables["sport"].reindex(np.asarray(sport)).to_numpy(dtype=float), base)
+    return base
 
+def odds_home_prob(df: pd.DataFrame, tables: dict, sport: pd.Series):
+    """
+    -> (P(local) de mercado sin vig + shrink al baseline, máscara de filas con cuotas).
+    Usa el consenso sin vig entre casas (fair_home/fair_away, storage.odds) y, donde falta, la
+    cuota ml_home/ml_away de una sola casa.
+    """
+    num = lambda c: (pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)  # noqa: E731
+                     if c in df.columns else np.full(len(df), np.nan))
+    oh, oa, fh, fa = num("ml_home"), num("ml_away"), num("fair_home"), num("fair_away")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cons = (fh > 0) & (fa > 0)
+        ih, ia = np.where(cons, fh, 1.0 / oh), np.where(cons, fa, 1.0 / oa)
+        has = cons | ((oh > 1.0) & (oa > 1.0))
+        p = (ih / (ih + ia)) * DEVIG_SCALE + DEVIG_FLOOR
+    base = base_rates(df, tables, sport)
+    p = np.where(np.isnan(base), p, SHRINK_ALPHA * base + (1.0 - SHRINK_ALPHA) * p)
+    return np.where(has, p, np.nan), has
+
+def elo_home_prob(df: pd.DataFrame, ratings: dict | None = None):
+    """
+    -> (P(local) Elo, máscara de filas con ambos equipos conocidos); un predict por deporte.
+    `ratings` {sport: EloRatings} en memoria (backtest); por defecto el estado persistido.
+    """
+    p = np.full(len(df), np.nan)
+    known = np.zeros(len(df), dtype=bool)
+    sport = df["sport"].map(canonical_sport).to_numpy()
+    for s in pd.unique(sport):
+        rows = np.flatnonzero(sport == s)
+        elo = ratings.get(s) if ratings is not None else EloRatings.load(s)
+        if elo is None or not len(elo):
+            continue
+        h = elo.ids_for(df["home"].iloc[rows])
+        a = elo.ids_for(df["away"].iloc[rows])
+        p[rows] = elo.predict(h, a)
+        known[rows] = elo.known(h) & elo.known(a)
+    return p, known
+
+def learned_home_prob(df: pd.DataFrame, sport: np.ndarray, learned: dict, p_elo, known, p_odds, has_odds):
+    """-> (P(local) del modelo aprendido, máscara de filas cubiertas); una matriz por deporte."""
+    p = np.full(len(df), np.nan)
+    has = np.zeros(len(df), dtype=bool)
+    if not learned:
+        return p, has
+    col = lambda c: df[c].to_numpy(dtype=float) if c in df.columns else np.full(len(df), np.nan)  # noqa: E731
+    X = assemble(p_elo, known, col("home_form"), col("away_form"), col("home_rest_days"), col("away_rest_days"),
+                 np.where(has_odds, p_odds, np.nan), has_odds)
+    for s, m in learned.items():
+        rows = np.flatnonzero(sport == s)
+        if len(rows):
+            p[rows] = m.predict(X[rows])
+            has[rows] = True
+    return p, has
+
+def log_predictions(df: pd.DataFrame, sport: pd.Series, p_home: np.ndarray, source: np.ndarray,
+                    model: np.ndarray | str = "", score: np.ndarray | None = None):
+    """
+    Prob. cruda (antes de calibrar) por evento; una partición por día de corrida. También la
+    calibrada (p_home, el lado publicado) y la cuota de mercado al publicar por lado (mejor cuota
+    entre casas o, si falta, la de una casa) para el closing-line value de models/backtest.py.
+    """
+    run = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    num = lambda c: (pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)  # noqa: E731
+                     if c in df.columns else np.full(len(df), np.nan))
+    price = {side: np.where(np.isfinite(num(f"best_{side}")), num(f"best_{side}"), num(f"ml_{side}"))
+             for side in ("home", "away")}
+    log = pd.DataFrame({
+        "date": df["date"].astype(str).to_numpy(),
+        "start_time_utc": df["start_time_utc"].astype(str).to_numpy(),
+        "sport": sport.to_numpy(),
+        "league": df["league"].astype(str).to_numpy(),
+        "home": df["home"].astype(str).to_numpy(),
+        "away": df["away"].astype(str).to_numpy(),
+        "p_home_raw": np.round(np.asarray(p_home, float), 6),
+        "p_home": np.round(np.asarray(p_home if score is None else score, float), 6),
+        "price_home": price["home"], "price_away": price["away"],
+        "source": source,
+        "model": model,
+    })
+    write_partition(log, PRED_LOG, {"run": run}, "predictions")
+
+def prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas esperadas con defaults (features opcionales incluidas)."""
+    df = df.copy()
+    if "start_time_utc" not in df.columns:
+        df["start_time_utc"] = df["date_time_utc"] if "date_time_utc" in df.columns else ""
     for col in ["date","sport","league","home","away","venue"]:
         if col not in df.columns:
             df[col] = ""
-
-    # Features opcionales con defaults
     for col, default in [("home_form", 0.0), ("away_form", 0.0), ("days_to_kickoff", 0.0)]:
         if col not in df.columns:
             df[col] = default
+    return df
+
+def home_probability(df: pd.DataFrame, ratings: dict | None = None, tables: dict | None = None,
+                     calib: dict | None = None, elo: tuple | None = None, learned: dict | None = None):
+    """
+    Camino de predicción compartido por main() y models/backtest.py.
+    -> (P(local) cruda, P(local) calibrada, fuente "odds"/"model"/"elo"/"form").
+    ratings/tables/calib/learned: estado explícito (backtest); None = lo persistido en disco.
+    elo: (P(local), conocidos) ya calculados punto-en-el-tiempo; omite elo_home_prob.
+    """
+    # ======= “modelo” base (placeholder) =======
+    # Score simple a partir de diferencias de forma y una leve anticipación al kickoff.
+    home_adv = df["home_form"].astype(float) - df["away_form"].astype(float)
+    # penaliza muy levemente eventos muy lejanos
+    time_term = -0.01 * df["days_to_kickoff"].astype(float)
+    score = (0.5 + 0.15 * home_adv + time_term).to_numpy()
+    p_elo, has_elo = elo_home_prob(df, ratings) if elo is None else (elo[0], np.array(elo[1], dtype=bool))
+    sport = df["sport"].map(canonical_sport)
+    tables = load_tables()[0] if tables is None else tables
+    p_odds, has_odds = odds_home_prob(df, tables, sport)
+    learned = load_learned() if learned is None else learned
+    p_model, has_model = learned_home_prob(df, sport.to_numpy(), learned, p_elo, has_elo, p_odds, has_odds)
+    has_model &= ~has_odds
+    has_elo &= ~(has_odds | has_model)
+    raw = _clip01(np.select([has_odds, has_model, has_elo], [p_odds, p_model, p_elo], score))
+    source = np.select([has_odds, has_model, has_elo], ["odds", "model", "elo"], "form")
+    return raw, _clip01(apply_calibration(raw, sport.to_numpy(), calib)), source
+
+def market_rows(df: pd.DataFrame, p_home: np.ndarray, scores: pd.DataFrame | None = None,
+                model: np.ndarray | None = None) -> pd.DataFrame:
+    """Filas SPREAD/TOTAL: el lado con prob >= 0.5 de cada (evento, línea)."""
+    draw = pd.to_numeric(df["fair_draw"], errors="coerce").to_numpy(float) if "fair_draw" in df.columns else None
+    mk = market_probs(df, df["sport"].map(canonical_sport).to_numpy(), p_home, scores, p_draw=draw)
+    if mk.empty:
+        return pd.DataFrame()
+    r = mk["row"].to_numpy()
+    first = mk["p"].to_numpy() >= 0.5               # local cubre / over
+    line = mk["line"].to_numpy()
+    total = (mk["market"] == "TOTAL").to_numpy()
+    side_line = np.where(total | first, line, -line)
+    team = np.where(first, df["home"].to_numpy()[r], df["away"].to_numpy()[r]).astype(str)
+    fmt = [f"{x:g}" if t else f"{x:+g}" for x, t in zip(side_line, total)]
+    sel = [(("Over " if f else "Under ") + x) if t else f"{tm} {x}" for tm, x, f, t in zip(team, fmt, first, total)]
+    prob = _clip01(np.where(first, mk["p"], 1.0 - mk["p"].to_numpy()))
+    out = pd.DataFrame({
+        "date": df["date"].astype(str).to_numpy()[r],
+        "sport": df["sport"].astype(str).to_numpy()[r],
+        "league": df["league"].astype(str).to_numpy()[r],
+        "game": (df["home"].fillna("").astype(str) + " vs " + df["away"].fillna("").astype(str)).to_numpy()[r],
+        "market": mk["market"].to_numpy(),
+        "selection": sel,
+        "line": fmt,
+        "prob": np.round(prob.astype(float), 4),
+        "start_time_utc": df["start_time_utc"].astype(str).to_numpy()[r],
+        "model": (np.asarray(model, dtype=object)[r] if model is not None else ""),
+    })
+    out["prob_decimal"] = np.round(1.0 / out["prob"].astype(float), 6)
+    out["confidence"] = _bucket_confidence(out["prob"].to_numpy())
+    out["rationale"] = [f"Distribución de marcador: total esperado {t:.1f}, margen local esperado {m:+.1f}."
+                        for t, m in zip(mk["exp_total"], mk["exp_margin"])]
+    return out
+
+def main():
+    if not table_exists(IN_FEATS):
+        raise FileNotFoundError(f"No existe {IN_FEATS}")
+
+    df = prepare(read_table(IN_FEATS))
 
     if df.empty:
-        # escribir CSV vacío con cabecera correcta para no romper downstream
+        # escribir tabla vacía con cabecera correcta para no romper downstream
         empty = pd.DataFrame(columns=[
             "date","sport","league","game","market","selection","line",
-            "prob","prob_decimal","confidence","rationale"
+            "prob","prob_decimal","confidence","rationale","start_time_utc","model"
         ])
-        empty.to_csv(OUT_PRED, index=False)
-        print(f"predictions ok – 0 rows -> {OUT_PRED}")
+        out_path = write_table(empty, OUT_PRED)
+        print(f"predictions ok – 0 rows -> {out_path}")
         return
 
-    # ======= “modelo” base (placeholder) =======
-    # Score simple a partir de diferencias de forma y una leve anticipación al kickoff.
-    # Si más adelante cargas modelos verdaderos, reemplaza esta sección por tu .pkl.
-    home_adv = df["home_form"].astype(float) - df["away_form"].astype(float)
-    # penaliza muy levemente eventos muy lejanos
-    time_term = -0.01 * df["days_to_kickoff"].astype(float)
-    score = 0.5 + 0.15 * home_adv + time_term
-    score = _clip01(score)
+    tables, model_id = load_tables()
+    raw, score, source = home_probability(df, ratings=load_ratings(), tables=tables, learned=load_learned())
+    model = np.full(len(df), model_id, dtype=object)
+    cand = ab_mask(df, MODEL_AB_SHARE)
+    if cand.any():
+        c_tables, c_id = load_tables("candidate")
+        if c_tables is not None and c_id != model_id:
+            sub = df.loc[cand]
+            raw[cand], score[cand], source[cand] = home_probability(sub, ratings=load_ratings("candidate"),
+                                                                    tables=c_tables, learned=load_learned("candidate"))
+            model[cand] = c_id
+            print(f"[predict] A/B: {int(cand.sum())}/{len(df)} eventos -> candidato {c_id}")
+    log_predictions(df, df["sport"].map(canonical_sport), raw, source, model, score=score)
 
     # Decisión
     pick_home_mask = score >= 0.5
@@ -84,22 +337,29 @@ def main():
         "selection": pick_team.astype(str),
         "line": "",                # sin línea para ML
         "prob": np.round(prob.astype(float), 4),
+        "start_time_utc": df["start_time_utc"].astype(str),
+        "model": model,
     })
 
     out["prob_decimal"] = np.round(1.0 / out["prob"].astype(float), 6)
-    out["confidence"] = out["prob"].apply(_bucket_confidence)
-    out["rationale"] = (
-        "Probabilidad del modelo basada en forma relativa y proximidad al evento."
+    out["confidence"] = _bucket_confidence(out["prob"].to_numpy())
+    out["rationale"] = np.select(
+        [source == "odds", source == "model", source == "elo"],
+        ["Probabilidad implícita de cuotas sin vig, ajustada al baseline histórico.",
+         "Modelo aprendido por deporte (Elo, forma y descanso).",
+         "Probabilidad Elo por equipo (rating + ventaja de local)."],
+        "Probabilidad del modelo basada en forma relativa y proximidad al evento.",
     )
+    out = pd.concat([out, market_rows(df, score, tables.get("scores"), model)], ignore_index=True)
 
-    # Orden y salida
+    # Orden y salida (start_time_utc y model alimentan los registros tipados de serving/)
     cols = ["date","sport","league","game","market","selection","line",
-            "prob","prob_decimal","confidence","rationale"]
-    out = out[cols].sort_values(["date","sport","league","game"], ignore_index=True)
+            "prob","prob_decimal","confidence","rationale","start_time_utc","model"]
+    out = out[cols].sort_values(["date","sport","league","game"], kind="stable", ignore_index=True)
 
     OUT_PRED.parent.mkdir(parents=True, exist_ok=True)
-    out.to_csv(OUT_PRED, index=False, encoding="utf-8")
-    print(f"predictions ok – {len(out)} rows -> {OUT_PRED}")
+    out_path = write_table(out, OUT_PRED)
+    print(f"predictions ok – {len(out)} rows -> {out_path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,205 @@
+# models/ratings.py
+"""
+Motor de ratings Elo por deporte (equipos o jugadores en tenis):
+- Reproduce cronológicamente los partidos de storage.historical.load_games
+  (data/historical/*_games.csv, tennis_matches.csv y el store del backfill)
+- Estado compacto en arrays numpy (rating, partidos, último día) + índice equipo -> posición
+- Persistido en models_store/ratings/<sport>.npz; cada corrida sólo aplica partidos
+  posteriores al checkpoint (storage.historical.pending_games: last_date + manifiesto de fuentes
+  + digest de lo aplicado) y reproduce todo el deporte si llegan partidos con fecha <= checkpoint
+- `predict(home_ids, away_ids)` vectorizado para models/predict.py
+"""
+
+from __future__ import annotations
+import os, sys, json, argparse
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage.historical import pending_games, team_key, CSV_SOURCES, STORE_SPORTS  # type: ignore
+
+RATINGS_DIR = Path(os.getenv("RATINGS_DIR", "models_store/ratings"))
+BASE_RATING = 1500.0
+SPORTS = sorted(set(CSV_SOURCES) | set(STORE_SPORTS.values()))
+
+# K, ventaja de local (puntos Elo) y regresión a la media tras un parón largo (entre temporadas)
+PARAMS = {
+    "futbol":     {"k": 20.0, "hfa": 60.0,  "revert": 0.20},
+    "baloncesto": {"k": 20.0, "hfa": 100.0, "revert": 0.25},
+    "beisbol":    {"k": 4.0,  "hfa": 24.0,  "revert": 0.33},
+    "hockey":     {"k": 8.0,  "hfa": 35.0,  "revert": 0.30},
+    "americano":  {"k": 20.0, "hfa": 48.0,  "revert": 0.33},
+    "tenis":      {"k": 32.0, "hfa": 0.0,   "revert": 0.10},
+}
+DEFAULT_PARAMS = {"k": 20.0, "hfa": 50.0, "revert": 0.25}
+OFFSEASON_DAYS = 90      # parón que dispara la regresión a la media
+PROVISIONAL_GAMES = 20   # K doble al inicio, decae linealmente hasta K normal
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+class EloRatings:
+    """Ratings de un deporte. ids = posiciones en los arrays (ver `ids_for`)."""
+
+    def __init__(self, sport: str, params: Optional[dict] = None):
+        self.sport = sport
+        self.params = dict(params or PARAMS.get(sport, DEFAULT_PARAMS))
+        self.index: Dict[str, int] = {}
+        self.names: list = []
+        self.rating = np.zeros(0, dtype=np.float64)
+        self.games = np.zeros(0, dtype=np.int32)
+        self.last_day = np.zeros(0, dtype=np.int32)   # días desde epoch del último partido
+        self.last_date: Optional[str] = None          # último partido aplicado
+        self.checkpoint: Optional[dict] = None        # pending_games: last_date, manifest, seasons
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # --- índice ---
+    def _grow(self, n: int):
+        add = n - len(self.rating)
+        if add > 0:
+            self.rating = np.concatenate([self.rating, np.full(add, BASE_RATING)])
+            self.games = np.concatenate([self.games, np.zeros(add, dtype=np.int32)])
+            self.last_day = np.concatenate([self.last_day, np.zeros(add, dtype=np.int32)])
+
+    def ids_for(self, names: Iterable, add: bool = False) -> np.ndarray:
+        """Posición de cada equipo; -1 si es desconocido (o se registra con add=True)."""
+        out = []
+        for nm in names:
+            k = team_key(nm)
+            i = self.index.get(k)
+            if i is None and add and k:
+                i = self.index[k] = len(self.names)
+                self.names.append(str(nm))
+            out.append(-1 if i is None else i)
+        if add:
+            self._grow(len(self.names))
+        return np.asarray(out, dtype=np.int64)
+
+    # --- actualización ---
+    def update(self, home: np.ndarray, away: np.ndarray, result: np.ndarray, day: np.ndarray):
+        """Aplica partidos en orden (secuencial por naturaleza: bucle sobre listas locales)."""
+        r, g, last = self.rating.tolist(), self.games.tolist(), self.last_day.tolist()
+        k0, hfa, revert = self.params["k"], self.params["hfa"], self.params["revert"]
+        for h, a, s, d in zip(home.tolist(), away.tolist(), result.tolist(), day.tolist()):
+            for t in (h, a):
+                if g[t] and d - last[t] > OFFSEASON_DAYS:
+                    r[t] = BASE_RATING + (r[t] - BASE_RATING) * (1.0 - revert)
+            e = 1.0 / (1.0 + 10.0 ** ((r[a] - r[h] - hfa) / 400.0))
+            kh = k0 * (1.0 + max(0.0, 1.0 - g[h] / PROVISIONAL_GAMES))
+            ka = k0 * (1.0 + max(0.0, 1.0 - g[a] / PROVISIONAL_GAMES))
+            r[h] += kh * (s - e)
+            r[a] -= ka * (s - e)
+            g[h] += 1; g[a] += 1
+            last[h] = d; last[a] = d
+        self.rating = np.asarray(r, dtype=np.float64)
+        self.games = np.asarray(g, dtype=np.int32)
+        self.last_day = np.asarray(last, dtype=np.int32)
+
+    def apply_games(self, games: pd.DataFrame) -> int:
+        """games: date (datetime), home, away, result_home_win (+ home_score/away_score)."""
+        if games.empty:
+            return 0
+        games = games.sort_values("date", kind="stable")
+        home = self.ids_for(games["home"], add=True)
+        away = self.ids_for(games["away"], add=True)
+        res = games["result_home_win"].astype(float).to_numpy()
+        if {"home_score", "away_score"} <= set(games.columns):  # empates (fútbol, hockey reg.)
+            hs = pd.to_numeric(games["home_score"], errors="coerce").to_numpy()
+            as_ = pd.to_numeric(games["away_score"], errors="coerce").to_numpy()
+            known = ~(np.isnan(hs) | np.isnan(as_))
+            res = np.where(known, np.sign(hs - as_) * 0.5 + 0.5, res)
+        day = ((games["date"].to_numpy().astype("datetime64[D]") - _EPOCH)
+               .astype(np.int64).astype(np.int32))
+        ok = (home >= 0) & (away >= 0) & (home != away)
+        self.update(home[ok], away[ok], res[ok], day[ok])
+        self.last_date = games["date"].iloc[-1].strftime("%Y-%m-%dT%H:%M:%S")
+        return int(ok.sum())
+
+    # --- predicción ---
+    def predict(self, home_ids, away_ids, neutral=False) -> np.ndarray:
+        """P(gana local) vectorizado; ids -1 (desconocidos) usan BASE_RATING."""
+        h = np.asarray(home_ids, dtype=np.int64)
+        a = np.asarray(away_ids, dtype=np.int64)
+        rh = np.where(h >= 0, self.rating[np.clip(h, 0, None)] if len(self) else BASE_RATING, BASE_RATING)
+        ra = np.where(a >= 0, self.rating[np.clip(a, 0, None)] if len(self) else BASE_RATING, BASE_RATING)
+        hfa = 0.0 if neutral else self.params["hfa"]
+        return 1.0 / (1.0 + 10.0 ** ((ra - rh - hfa) / 400.0))
+
+    def predict_names(self, home, away, neutral=False) -> np.ndarray:
+        return self.predict(self.ids_for(home), self.ids_for(away), neutral=neutral)
+
+    def known(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        return (ids >= 0) & (self.games[np.clip(ids, 0, None)] > 0 if len(self) else False)
+
+    # --- persistencia ---
+    def path(self) -> Path:
+        return RATINGS_DIR / f"{self.sport}.npz"
+
+    def save(self):
+        RATINGS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = self.path().with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, rating=self.rating, games=self.games, last_day=self.last_day,
+                            names=np.asarray(self.names, dtype=object).astype(str),
+                            meta=np.asarray(json.dumps({"params": self.params, "last_date": self.last_date,
+                                                         "checkpoint": self.checkpoint})))
+        os.replace(tmp, self.path())
+
+    @classmethod
+    def load(cls, sport: str) -> "EloRatings":
+        """Estado persistido; vacío si no existe o si cambiaron los parámetros."""
+        obj = cls(sport)
+        p = obj.path()
+        if not p.exists():
+            return obj
+        with np.load(p, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            if meta.get("params") != obj.params:
+                return obj  # parámetros nuevos -> replay completo
+            obj.names = z["names"].tolist()
+            obj.rating, obj.games, obj.last_day = z["rating"], z["games"], z["last_day"]
+        obj.index = {team_key(n): i for i, n in enumerate(obj.names)}
+        obj.last_date = meta.get("last_date")
+        obj.checkpoint = meta.get("checkpoint")
+        return obj
+
+def update_sport(sport: str, rebuild: bool = False) -> EloRatings:
+    """
+    Avanza el Elo persistido con los partidos pendientes; partidos tardíos (fecha <= checkpoint)
+    o rebuild=True -> replay completo del deporte (el mismo estado que daría desde cero).
+    """
+    elo = EloRatings(sport) if rebuild else EloRatings.load(sport)
+    games, full, ck = pending_games(sport, elo.checkpoint, columns=["home_score", "away_score"])
+    if full:
+        elo = EloRatings(sport)
+    n = elo.apply_games(games)
+    changed = ck != elo.checkpoint
+    elo.checkpoint, elo.last_date = ck, ck.get("last_date")
+    if n or full or changed:
+        elo.save()
+    print(f"[ratings] {sport}: {'replay ' if full else '+'}{n} partidos, {len(elo)} equipos"
+          f" (checkpoint {elo.last_date})")
+    return elo
+
+def update_all(sports: Optional[Iterable[str]] = None, rebuild: bool = False) -> Dict[str, EloRatings]:
+    return {s: update_sport(s, rebuild=rebuild) for s in (list(sports) if sports else SPORTS)}
+
+def load_all(sports: Optional[Iterable[str]] = None) -> Dict[str, EloRatings]:
+    return {s: EloRatings.load(s) for s in (list(sports) if sports else SPORTS)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sport", default="all", help="futbol|beisbol|... o lista; all = todos")
+    ap.add_argument("--rebuild", action="store_true", help="descarta el estado y reproduce todo")
+    args = ap.parse_args()
+    sports = None if args.sport == "all" else [s.strip() for s in args.sport.split(",")]
+    update_all(sports, rebuild=args.rebuild)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# models/registry.py
+"""
+Registro versionado de modelos en models_store/registry:
+- Cada artefacto es inmutable y se identifica por el hash de su contenido (<id>/)
+- meta.json: ventana de entrenamiento, --years/--calibrate/--ensemble, métricas del backtest
+  (reports/backtest_summary.csv) y el JSON del modelo para trazabilidad
+- Parámetros numéricos en .npy (tablas de baseline compiladas, snapshot Elo y modelos
+  aprendidos por deporte): models/predict.py los abre con np.load(mmap_mode="r"), sin parsear
+  el JSON; el boosting opcional (models/learn.py) va como pickle aparte
+- Punteros en pointers.json: "active" (lo que usa predict), "candidate" (A/B, ver
+  MODEL_AB_SHARE en predict.py) e historial para rollback
+"""
+
+from __future__ import annotations
+import os, sys, json, pickle, shutil, hashlib, argparse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage.historical import team_key  # type: ignore
+from models.ratings import EloRatings  # type: ignore
+from models.learn import LearnedModel, to_arrays, to_blobs  # type: ignore
+from models.markets import SCORE_COLS  # type: ignore
+
+REGISTRY_DIR = Path(os.getenv("MODEL_REGISTRY", "models_store/registry"))
+POINTERS = "pointers.json"
+TABLE_LEVELS = {"surface": ["sport", "surface"], "league": ["sport", "league"], "sport": ["sport"],
+                "scores": ["sport", "league"]}  # scores: DataFrame SCORE_COLS (models/markets.py)
+ELO_ARRAYS = ("rating", "games", "last_day", "names")
+
+# ---------- punteros ----------
+def _pointers() -> dict:
+    try:
+        return json.loads((REGISTRY_DIR/POINTERS).read_text(encoding="utf-8"))
+    except Exception:
+        return {"history": []}
+
+def _save_pointers(ptr: dict):
+    tmp = REGISTRY_DIR/(POINTERS + ".tmp")
+    tmp.write_text(json.dumps(ptr, indent=1), encoding="utf-8")
+    os.replace(tmp, REGISTRY_DIR/POINTERS)
+
+def resolve(ref: str) -> Optional[str]:
+    """Nombre de puntero ("active", "candidate") o prefijo de id -> id completo."""
+    ptr = _pointers()
+    if ref in ptr and isinstance(ptr[ref], str):
+        return ptr[ref]
+    hits = [p.name for p in REGISTRY_DIR.glob(f"{ref}*") if (p/"meta.json").exists()] if ref else []
+    return hits[0] if len(hits) == 1 else None
+
+def set_pointer(model_id: str, pointer: str = "active") -> str:
+    mid = resolve(model_id)
+    if mid is None:
+        raise KeyError(f"artefacto desconocido o ambiguo: {model_id}")
+    ptr = _pointers()
+    ptr[pointer] = mid
+    ptr.setdefault("history", []).append(
+        {"pointer": pointer, "id": mid, "at": datetime.now(timezone.utc).isoformat()})
+    _save_pointers(ptr)
+    return mid
+
+def clear_pointer(pointer: str):
+    ptr = _pointers()
+    if ptr.pop(pointer, None) is not None:
+        _save_pointers(ptr)
+
+def rollback(pointer: str = "active") -> Optional[str]:
+    """Vuelve el puntero al artefacto anterior distinto del actual (según el historial)."""
+    ptr = _pointers()
+    cur = ptr.get(pointer)
+    prev = [h["id"] for h in ptr.get("history", []) if h["pointer"] == pointer and h["id"] != cur]
+    return set_pointer(prev[-1], pointer) if prev else None
+
+# ---------- publicación ----------
+def _table_arrays(tables: Dict[str, pd.Series]) -> Dict[str, np.ndarray]:
+    out = {}
+    for name, levels in TABLE_LEVELS.items():
+        t = tables.get(name)
+        if t is None:
+            continue
+        keys = [list(k) if isinstance(k, tuple) else [k] for k in t.index] if len(t) else []
+        out[f"base_{name}_keys"] = np.asarray(keys, dtype=str).reshape(len(keys), len(levels))
+        out[f"base_{name}_vals"] = t.to_numpy(dtype=np.float64)
+    return out
+
+def _elo_arrays(ratings: Dict[str, EloRatings]) -> Dict[str, np.ndarray]:
+    out = {}
+    for s, e in ratings.items():
+        if len(e):
+            out.update({f"elo_{s}_rating": e.rating.astype(np.float64), f"elo_{s}_games": e.games.astype(np.int32),
+                        f"elo_{s}_last_day": e.last_day.astype(np.int32),
+                        f"elo_{s}_names": np.asarray(e.names, dtype=str)})
+    return out
+
+def publish(model: dict, tables: Dict[str, pd.Series], ratings: Optional[Dict[str, EloRatings]] = None,
+            meta: Optional[dict] = None, learned: Optional[Dict[str, tuple]] = None) -> str:
+    """
+    Escribe un artefacto (si no existe ya uno idéntico) y devuelve su id.
+    learned: {sport: (LearnedModel, reporte)} de models.learn.fit_learned.
+    El hash cubre los arrays y el modelo sin marcas de tiempo: reentrenar sin cambios reutiliza el id.
+    """
+    ratings, learned = ratings or {}, learned or {}
+    arrays = {**_table_arrays(tables), **_elo_arrays(ratings)}
+    blobs = {}
+    for s, (m, _) in learned.items():
+        arrays.update(to_arrays(s, m)); blobs.update(to_blobs(s, m))
+    elo_meta = {s: {"params": e.params, "last_date": e.last_date, "teams": len(e)}
+                for s, e in ratings.items() if len(e)}
+    learned_meta = {s: {**rep, "w_lr": m.w_lr, "hgb": m.hgb is not None} for s, (m, rep) in learned.items()}
+    stable = {k: v for k, v in model.items() if k not in ("trained_at", "meta")}
+    h = hashlib.sha256(json.dumps([stable, elo_meta, learned_meta], sort_keys=True, default=str).encode())
+    for name in sorted(arrays):
+        a = np.ascontiguousarray(arrays[name])
+        h.update(name.encode()); h.update(str(a.dtype).encode()); h.update(str(a.shape).encode()); h.update(a.tobytes())
+    for name in sorted(blobs):
+        h.update(name.encode()); h.update(blobs[name])
+    mid = h.hexdigest()[:16]
+    final = REGISTRY_DIR/mid
+    if (final/"meta.json").exists():
+        return mid
+    tmp = REGISTRY_DIR/f".tmp-{mid}-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name, a in arrays.items():
+        np.save(tmp/f"{name}.npy", a, allow_pickle=False)
+    for name, b in blobs.items():
+        (tmp/name).write_bytes(b)
+    doc = {"id": mid, "created_at": datetime.now(timezone.utc).isoformat(), **(meta or {}),
+           "elo": elo_meta, "learned": learned_meta, "arrays": sorted(arrays), "blobs": sorted(blobs),
+           "model": model}
+    (tmp/"meta.json").write_text(json.dumps(doc, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+    try:
+        os.replace(tmp, final)
+    except OSError:  # otro proceso publicó el mismo contenido
+        shutil.rmtree(tmp, ignore_errors=True)
+    return mid
+
+# ---------- carga ----------
+class Artifact:
+    """Artefacto publicado; los arrays se abren mapeados en memoria (sólo lectura) bajo demanda."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.id = self.path.name
+        self.meta = json.loads((self.path/"meta.json").read_text(encoding="utf-8"))
+
+    def array(self, name: str) -> np.ndarray:
+        return np.load(self.path/f"{name}.npy", mmap_mode="r", allow_pickle=False)
+
+    def tables(self) -> Dict[str, pd.Series]:
+        """Mismo formato que models.predict.compile_model."""
+        out = {}
+        for name, levels in TABLE_LEVELS.items():
+            if not (self.path/f"base_{name}_vals.npy").exists():
+                continue
+            keys, vals = self.array(f"base_{name}_keys"), self.array(f"base_{name}_vals")
+            if not len(vals):
+                out[name] = pd.DataFrame(columns=SCORE_COLS) if vals.ndim == 2 else pd.Series(dtype=float)
+                continue
+            idx = (pd.MultiIndex.from_arrays([keys[:, i] for i in range(len(levels))], names=levels)
+                   if len(levels) > 1 else pd.Index(keys[:, 0]))
+            out[name] = (pd.DataFrame(np.asarray(vals), index=idx, columns=SCORE_COLS) if vals.ndim == 2
+                         else pd.Series(np.asarray(vals), index=idx))
+        return out
+
+    def ratings(self, sport: str) -> Optional[EloRatings]:
+        """Snapshot Elo del deporte al momento del entrenamiento (None si no hay)."""
+        info = (self.meta.get("elo") or {}).get(sport)
+        if not info:
+            return None
+        e = EloRatings(sport, params=info["params"])
+        e.rating, e.games, e.last_day = (self.array(f"elo_{sport}_{k}") for k in ELO_ARRAYS[:3])
+        e.names = self.array(f"elo_{sport}_names").tolist()
+        e.index = {team_key(n): i for i, n in enumerate(e.names)}
+        e.last_date = info.get("last_date")
+        return e
+
+    def learned(self) -> Dict[str, LearnedModel]:
+        """Modelos aprendidos por deporte; sin scikit-learn el boosting se omite (sólo logística)."""
+        out = {}
+        for s, info in (self.meta.get("learned") or {}).items():
+            cal = (self.array(f"cal_{s}_x"), self.array(f"cal_{s}_y")) if (self.path/f"cal_{s}_x.npy").exists() else (None, None)
+            hgb = None
+            if info.get("hgb"):
+                try:
+                    hgb = pickle.loads((self.path/f"hgb_{s}.pkl").read_bytes())
+                except Exception as e:
+                    print(f"[registry] {self.id}: boosting de {s} no disponible ({e}); sólo logística")
+            out[s] = LearnedModel(self.array(f"lr_{s}_coef"), self.array(f"lr_{s}_mean"), self.array(f"lr_{s}_std"),
+                                  hgb=hgb, w_lr=info.get("w_lr", 1.0), cal_x=cal[0], cal_y=cal[1])
+        return out
+
+def load_artifact(ref: str = "active") -> Optional[Artifact]:
+    mid = resolve(ref)
+    if mid is None or not (REGISTRY_DIR/mid/"meta.json").exists():
+        return None
+    return Artifact(REGISTRY_DIR/mid)
+
+def list_artifacts() -> pd.DataFrame:
+    ptr = _pointers()
+    rows = []
+    for p in REGISTRY_DIR.glob("*/meta.json"):
+        m = json.loads(p.read_text(encoding="utf-8"))
+        w = m.get("window") or {}
+        rows.append({"id": m["id"], "created_at": m.get("created_at"), "window": f"{w.get('start')}..{w.get('end')}",
+                     "years": m.get("years"), "calibrate": m.get("calibrate"),
+                     "pointers": ",".join(k for k, v in ptr.items() if v == m["id"])})
+    cols = ["id", "created_at", "window", "years", "calibrate", "pointers"]
+    return pd.DataFrame(rows, columns=cols).sort_values("created_at", ignore_index=True)
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    p = sub.add_parser("show"); p.add_argument("ref")
+    p = sub.add_parser("activate"); p.add_argument("ref"); p.add_argument("--pointer", default="active")
+    p = sub.add_parser("rollback"); p.add_argument("--pointer", default="active")
+    p = sub.add_parser("clear"); p.add_argument("pointer")
+    args = ap.parse_args()
+
+    if args.cmd == "list":
+        print(list_artifacts().to_string(index=False))
+    elif args.cmd == "show":
+        art = load_artifact(args.ref)
+        if art is None:
+            raise SystemExit(f"no existe: {args.ref}")
+        print(json.dumps({k: v for k, v in art.meta.items() if k != "model"}, indent=1, ensure_ascii=False))
+    elif args.cmd == "activate":
+        print(f"[registry] {args.pointer} -> {set_pointer(args.ref, args.pointer)}")
+    elif args.cmd == "rollback":
+        mid = rollback(args.pointer)
+        print(f"[registry] {args.pointer} -> {mid}" if mid else f"[registry] sin versión anterior para {args.pointer}")
+    elif args.cmd == "clear":
+        clear_pointer(args.pointer)
+        print(f"[registry] {args.pointer} eliminado")
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,183 @@
 # models/train.py
-import argparse, json
+import os, sys, argparse, json, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage.historical import load_games  # type: ignore
+from models.ratings import update_sport, SPORTS  # type: ignore
+from models.predict import compile_model  # type: ignore
+from models.registry import publish, set_pointer, load_artifact  # type: ignore
+from models.learn import feature_matrix, fit_learned, HPARAMS  # type: ignore
+from models.markets import fit_score_params  # type: ignore
+
 STORE = Path("models_store"); STORE.mkdir(parents=True, exist_ok=True)
-HIST = Path("data/historical")
+BACKTEST_SUMMARY = Path("reports/backtest_summary.csv")
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", "0")) or (os.cpu_count() or 1)
+LEAGUE_BASELINES = {"americano": "NFL", "baloncesto": "NBA", "beisbol": "MLB", "hockey": "NHL"}
+MIN_LEAGUE_GAMES = 50  # fútbol: tasa por liga sólo con volumen
 
-def load_csv(p): 
-    return pd.read_csv(p) if p.exists() else pd.DataFrame()
+def backtest_metrics(path: Path = BACKTEST_SUMMARY) -> dict:
+    """Última corrida de models/backtest.py (metric,value), si existe."""
+    try:
+        df = pd.read_csv(path)
+    except Exception:
+        return {}
+    return {str(k): float(v) for k, v in zip(df["metric"], df["value"])}
 
-def train_baselines():
-    model = {"trained_at": datetime.utcnow().isoformat()+"Z", "version": "v1-baselines"}
-    # NFL
-    nfl = load_csv(HIST/"nfl_games.csv")
-    if not nfl.empty:
-        rate = nfl["result_home_win"].mean()
-        model.setdefault("americano", {})["NFL"] = {"home_win_rate": float(rate)}
-    # TENIS (por surface)
-    ten = load_csv(HIST/"tennis_matches.csv")
-    if not ten.empty:
-        grp = ten.groupby(ten["surface"].fillna("Unknown"))["result_home_win"].mean().to_dict()
-        model["tenis"] = {"by_surface": {k: float(v) for k,v in grp.items()}}
-    # FUTBOL (global y por liga si hay volumen)
-    soc_i = load_csv(HIST/"soccer_matches_incremental.csv")
-    if not soc_i.empty:
-        global_rate = soc_i["result_home_win"].mean()
-        by_league = soc_i.groupby("league")["result_home_win"].mean()
-        model["futbol"] = {
-            "global_home_win_rate": float(global_rate),
-            "by_league": {k: float(v) for k,v in by_league.items() if by_league.count()[k] >= 50}
+# ---------- sub-modelos por deporte ----------
+def baseline_node(sport: str, df: pd.DataFrame) -> dict:
+    """Tasas de victoria local del deporte (mismo formato que active_model.json)."""
+    if df.empty:
+        return {}
+    if sport == "tenis":
+        grp = df.groupby(df["surface"].fillna("Unknown"))["result_home_win"].mean().to_dict()
+        return {"by_surface": {k: float(v) for k,v in grp.items()}}
+    if sport == "futbol":
+        grp = df.groupby("league")["result_home_win"]
+        by_league, n_league = grp.mean(), grp.count()
+        return {
+            "global_home_win_rate": float(df["result_home_win"].mean()),
+            "by_league": {k: float(v) for k,v in by_league.items() if n_league[k] >= MIN_LEAGUE_GAMES}
         }
-    # NBA / MLB / NHL (global home win rates)
-    nba = load_csv(HIST/"nba_games.csv")
-    if not nba.empty:
-        model["baloncesto"] = {"NBA":{"home_win_rate": float(nba["result_home_win"].mean())}}
-    mlb = load_csv(HIST/"mlb_games.csv")
-    if not mlb.empty:
-        model["beisbol"] = {"MLB":{"home_win_rate": float(mlb["result_home_win"].mean())}}
-    nhl = load_csv(HIST/"nhl_games.csv")
-    if not nhl.empty:
-        model["hockey"] = {"NHL":{"home_win_rate": float(nhl["result_home_win"].mean())}}
-    return model
+    league = LEAGUE_BASELINES.get(sport)
+    sub = df[df["league"] == league] if league else df.iloc[:0]
+    return {league: {"home_win_rate": float(sub["result_home_win"].mean())}} if not sub.empty else {}
+
+def fit_sport(sport: str, opts: dict | None = None) -> dict:
+    """
+    Worker: lee sólo el histórico del deporte (scrapes + su partición del store),
+    ajusta el baseline, reproduce su Elo sobre toda la historia (el estado que se publica y que
+    queda como checkpoint de models/ratings.py), ajusta el modelo aprendido sobre la
+    matriz de features cacheada (models/learn.py) y devuelve el sub-modelo serializable.
+    opts: seasons, ensemble, calibrate, hparams, rebuild_features.
+    """
+    opts = opts or {}
+    df = load_games(sport, columns=["surface"] if sport == "tenis" else ["home_score", "away_score"])
+    window = {}
+    if not df.empty:
+        window = {"start": df["date"].min().strftime("%Y-%m-%d"), "end": df["date"].max().strftime("%Y-%m-%d")}
+    elo = update_sport(sport, rebuild=True)
+    X, y, _ = feature_matrix(sport, seasons=opts.get("seasons"), rebuild=opts.get("rebuild_features", False))
+    learned = fit_learned(X, y, ensemble=opts.get("ensemble", False), calibrate=opts.get("calibrate", "none"),
+                          hp=opts.get("hparams"))
+    node = baseline_node(sport, df)
+    scores = fit_score_params(df)  # distribución de marcador para spreads/totales
+    if scores:
+        node["score_params"] = scores
+    return {"node": node, "window": window, "rows": len(df),
+            "ratings": elo if len(elo) else None, "learned": learned}
+
+def train_all(sports=None, workers: int = TRAIN_WORKERS, opts: dict | None = None):
+    """
+    Un proceso por deporte (ProcessPoolExecutor; workers=1 -> en línea). Un deporte que falla
+    no aborta al resto: conserva el nodo del active_model.json previo, su Elo y su modelo aprendido
+    del artefacto "active" del registro (meta["carried_from"]) y queda en meta["failed"].
+    -> (modelo, {sport: EloRatings}, {sport: (LearnedModel, reporte)}, ventana, fallidos); sólo se
+    publican modelos aprendidos que mejoran la log-loss del Elo en el holdout (models/learn.py), el
+    motivo de los demás queda en model["meta"]["learned_skipped"]
+    """
+    sports = list(sports) if sports else SPORTS
+    fit = partial(fit_sport, opts=opts or {})
+    results, failed = {}, {}
+    if workers <= 1:
+        for s in sports:
+            try:
+                results[s] = fit(s)
+            except Exception:
+                failed[s] = traceback.format_exc(limit=3)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sports))) as ex:
+            futs = {ex.submit(fit, s): s for s in sports}
+            for fut in as_completed(futs):
+                s = futs[fut]
+                try:
+                    results[s] = fut.result()
+                except Exception:
+                    failed[s] = traceback.format_exc(limit=3)
+    for s, tb in failed.items():
+        print(f"[train] {s}: FALLÓ\n{tb}")
+
+    try:
+        prev = json.loads((STORE/"active_model.json").read_text(encoding="utf-8"))
+    except Exception:
+        prev = {}
+    prev_art = load_artifact("active") if failed else None
+    prev_learned = prev_art.learned() if prev_art is not None else {}
+    model = {"trained_at": datetime.utcnow().isoformat()+"Z", "version": "v1-baselines"}
+    ratings, learned, window, skipped = {}, {}, {}, {}
+    for s in sports:  # orden fijo: el artefacto no depende del orden de llegada
+        if s in failed:
+            if isinstance(prev.get(s), dict):
+                model[s] = prev[s]
+            if prev_art is not None:  # sin esto el artefacto nuevo perdería el Elo y el modelo del deporte
+                e = prev_art.ratings(s)
+                if e is not None:
+                    ratings[s] = e
+                if s in prev_learned:
+                    learned[s] = (prev_learned[s], prev_art.meta["learned"][s])
+            continue
+        r = results[s]
+        if r["node"]:
+            model[s] = r["node"]
+        if r["ratings"] is not None:
+            ratings[s] = r["ratings"]
+        lm, report = r["learned"]
+        if lm is not None:
+            learned[s] = (lm, report)
+        else:
+            skipped[s] = report.get("skipped")
+        w = r["window"]
+        if w:
+            window["start"] = min(window.get("start", w["start"]), w["start"])
+            window["end"] = max(window.get("end", w["end"]), w["end"])
+        print(f"[train] {s}: {r['rows']} partidos"
+              + (f" | logloss (evaluación) elo {report['elo_only']['logloss']} -> modelo {report['ensemble']['logloss']}"
+                 f" (w_lr={report['w_lr']})" if lm is not None else f" | sin modelo aprendido: {report.get('skipped')}"))
+    model["meta"] = {"learned_skipped": skipped}
+    if prev_art is not None:
+        model["meta"]["carried_from"] = prev_art.id
+    return model, ratings, learned, window, sorted(failed)
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--years", type=int, default=5)
-    ap.add_argument("--calibrate", type=str, default="none")
-    ap.add_argument("--ensemble", action="store_true")
+    ap.add_argument("--calibrate", type=str, default="none", choices=["none", "isotonic", "temperature", "auto"],
+                    help="mapa de calibración del modelo aprendido (1ª mitad del holdout; se mide en la 2ª)")
+    ap.add_argument("--ensemble", action="store_true", help="logística + HistGradientBoosting (scikit-learn)")
+    ap.add_argument("--pointer", type=str, default="active",
+                    help="puntero del registro a mover (active; candidate para A/B)")
+    ap.add_argument("--workers", type=int, default=TRAIN_WORKERS, help="procesos (default: núcleos)")
+    ap.add_argument("--rebuild-features", action="store_true", help="ignora la caché de matrices de features")
+    for k, v in HPARAMS.items():
+        ap.add_argument(f"--{k.replace('_', '-')}", type=type(v), default=v)
     args = ap.parse_args()
 
-    model = train_baselines()
-    model["meta"] = {"years": args.years, "calibration": args.calibrate, "ensemble": bool(args.ensemble)}
+    this_year = datetime.utcnow().year
+    opts = {"seasons": list(range(this_year - args.years + 1, this_year + 1)), "ensemble": args.ensemble,
+            "calibrate": args.calibrate, "hparams": {k: getattr(args, k) for k in HPARAMS},
+            "rebuild_features": args.rebuild_features}
+    model, ratings, learned, window, failed = train_all(workers=args.workers, opts=opts)
+    # Elo por equipo (replay completo de la historia)
+    model["ratings"] = {s: {"teams": len(e), "last_date": e.last_date, "params": e.params}
+                        for s, e in ratings.items()}
+    model["meta"].update({"years": args.years, "calibration": args.calibrate, "ensemble": bool(args.ensemble),
+                          "failed": failed})
     with open(STORE/"active_model.json","w",encoding="utf-8") as f:
         json.dump(model, f, ensure_ascii=False, indent=2)
-    print("train ok – wrote", STORE/"active_model.json")
+
+    mid = publish(model, compile_model(model), ratings, learned=learned, meta={
+        "window": window, "years": args.years, "calibrate": args.calibrate,
+        "ensemble": bool(args.ensemble), "hparams": opts["hparams"], "metrics": backtest_metrics(),
+        "failed": failed, "learned_skipped": model["meta"]["learned_skipped"],
+        "carried_from": model["meta"].get("carried_from"),
+    })
+    set_pointer(mid, args.pointer)
+    print("train ok – wrote", STORE/"active_model.json", f"| registry {args.pointer} -> {mid}")
 
 if __name__=="__main__": main()
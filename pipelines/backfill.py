@@ -1,12 +1,12 @@
 # pipelines/backfill.py
 """
 Backfill histórico ultrarrápido + comprimido:
-- Async + httpx (concurrencia controlada)
-- Rate limiter global (throttle)
+- Async vía integrations.apisports_client (pool keep-alive por host, concurrencia controlada)
+- Rate limiter token-bucket por host (rate + ráfaga, adapta a headers de cupo)
 - Ventanas from/to para soccer (1 request mensual + paginación)
 - Día a día paralelizado para mlb/nfl/nba/nhl
 - Salida comprimida: *.json.gz (menor I/O)
-- Reanudable: no reescribe scopes ya guardados
+- Reanudable: no reescribe scopes ya guardados; caché HTTP para días cerrados
 - Índice por deporte: data/historical/<sport>/index.csv
 """
 
@@ -17,7 +17,12 @@ from datetime import date, datetime, timedelta
 from typing import Dict, Any, List, Tuple
 
 import pandas as pd
-import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from integrations.apisports_client import ApiSportsClient  # type: ignore
+from integrations.ratelimit import RateLimiter, TokenBucket  # type: ignore  (re-export)
 
 APISPORTS_KEY = os.getenv("APISPORTS_KEY", "")
 DATA_DIR = Path("data")
@@ -33,7 +38,9 @@ SPORT_MAP = {
     "nhl":    ("hockey","https://v1.hockey.api-sports.io","/games"),
 }
 
-DEFAULT_THROTTLE_MS   = int(os.getenv("APISPORTS_THROTTLE_MS", "250"))  # ~4 rps
+DEFAULT_THROTTLE_MS   = int(os.getenv("APISPORTS_THROTTLE_MS", "250"))  # ~4 rps (legacy)
+DEFAULT_RATE          = float(os.getenv("APISPORTS_RATE", "0") or 0)   # req/s por host; 0 = 1000/throttle
+DEFAULT_BURST         = int(os.getenv("APISPORTS_BURST", "10"))        # ráfaga máxima por host
 DEFAULT_CONCURRENCY   = int(os.getenv("APISPORTS_CONCURRENCY", "8"))
 DEFAULT_WINDOW_DAYS   = 30  # soccer from/to
 
@@ -63,19 +70,18 @@ def month_windows(start: date, end: date, window_days: int = DEFAULT_WINDOW_DAYS
         cur = to + timedelta(days=1)
     return windows
 
-# ---------- rate limiter ----------
-class RateLimiter:
-    def __init__(self, min_interval_ms: int):
-        self.min_interval = max(0.0, min_interval_ms / 1000.0)
-        self._last = 0.0
-        self._lock = asyncio.Lock()
-    async def wait(self):
-        async with self._lock:
-            now = time.monotonic()
-            delta = now - self._last
-            if delta < self.min_interval:
-                await asyncio.sleep(self.min_interval - delta)
-            self._last = time.monotonic()
+# ---------- rate limiter (token bucket por host; ver integrations/ratelimit.py) ----------
+def parse_host_rates(specs: List[str]) -> Dict[str, Tuple[float, int]]:
+    """'soccer=8:16' o 'https://v1.hockey.api-sports.io=2' -> {base_url: (rate, burst)}"""
+    out: Dict[str, Tuple[float, int]] = {}
+    for spec in specs or []:
+        key, _, val = spec.partition("=")
+        rate_s, _, burst_s = val.partition(":")
+        key = key.strip()
+        base = SPORT_MAP[key][1] if key in SPORT_MAP else key
+        rate = float(rate_s)
+        out[base] = (rate, int(burst_s) if burst_s else max(1, int(math.ceil(rate))))
+    return out
 
 # ---------- almacenamiento (.json.gz) ----------
 def _write_json_gz(path: Path, obj: Dict[str, Any]):
@@ -96,31 +102,23 @@ def scope_exists(out_dir: Path, scope: str) -> bool:
     return any(out_dir.glob(f"{scope}_p*.json.gz"))
 
 # ---------- core HTTP ----------
-async def api_get(client: httpx.AsyncClient, base: str, path: str,
-                  params: Dict[str, Any], limiter: RateLimiter, retries: int = 3) -> Dict[str, Any]:
-    if not APISPORTS_KEY:
+async def api_get(client: ApiSportsClient, base: str, path: str,
+                  params: Dict[str, Any]) -> Dict[str, Any]:
+    """Reintentos/backoff y rate limit viven en el cliente; aquí sólo se normaliza el error."""
+    if not client.api_key:
         raise RuntimeError("APISPORTS_KEY faltante")
-    headers = {"x-apisports-key": APISPORTS_KEY}
-    url = f"{base}{path}"
-    for attempt in range(retries):
-        await limiter.wait()
-        try:
-            r = await client.get(url, headers=headers, params=params, timeout=30.0)
-            r.raise_for_status()
-            return r.json()
-        except Exception as e:
-            if attempt == retries - 1:
-                return {"errors": str(e), "response": []}
-            await asyncio.sleep(0.75 * (2 ** attempt))
+    try:
+        return await client.aget(base, path, params)
+    except Exception as e:
+        return {"errors": str(e), "response": []}
 
 # ---------- window (soccer) ----------
-async def fetch_window(client: httpx.AsyncClient, base: str, path: str,
-                       start_iso: str, end_iso: str, limiter: RateLimiter) -> List[Dict[str, Any]]:
+async def fetch_window(client: ApiSportsClient, base: str, path: str,
+                       start_iso: str, end_iso: str) -> List[Dict[str, Any]]:
     pages, cur = [], 1
     while True:
         obj = await api_get(client, base, path,
-                            {"from": start_iso, "to": end_iso, "page": cur},
-                            limiter)
+                            {"from": start_iso, "to": end_iso, "page": cur})
         pages.append(obj)
         try:
             paging = obj.get("paging") or {}
@@ -134,11 +132,11 @@ async def fetch_window(client: httpx.AsyncClient, base: str, path: str,
     return pages
 
 # ---------- day (mlb/nfl/nba/nhl) ----------
-async def fetch_day(client: httpx.AsyncClient, base: str, path: str,
-                    day_iso: str, limiter: RateLimiter) -> List[Dict[str, Any]]:
+async def fetch_day(client: ApiSportsClient, base: str, path: str,
+                    day_iso: str) -> List[Dict[str, Any]]:
     pages, cur = [], 1
     while True:
-        obj = await api_get(client, base, path, {"date": day_iso, "page": cur}, limiter)
+        obj = await api_get(client, base, path, {"date": day_iso, "page": cur})
         pages.append(obj)
         try:
             paging = obj.get("paging") or {}
@@ -154,9 +152,15 @@ async def fetch_day(client: httpx.AsyncClient, base: str, path: str,
 # ---------- ejecución ----------
 async def run_backfill(sports: List[str], start: date, end: date,
                        window_days: int, concurrency: int, throttle_ms: int,
-                       overwrite: bool):
-    limiter = RateLimiter(throttle_ms)
-    async with httpx.AsyncClient(timeout=30.0) as client:
+                       overwrite: bool, rate: float = 0.0, burst: int = DEFAULT_BURST,
+                       host_rates: Dict[str, Tuple[float, int]] | None = None,
+                       use_cache: bool = True):
+    if rate > 0:
+        limiter = RateLimiter(rate, burst, per_host=host_rates)
+    else:
+        limiter = RateLimiter.from_throttle_ms(throttle_ms, burst, per_host=host_rates)
+    # --overwrite reescribe los .json.gz, pero los días cerrados salen de la caché HTTP
+    async with ApiSportsClient(limiter=limiter, pool_size=concurrency, cache=use_cache) as client:
         sem = asyncio.Semaphore(concurrency)
         tasks, all_rows = [], []
 
@@ -180,12 +184,12 @@ async def run_backfill(sports: List[str], start: date, end: date,
             if s == "soccer":
                 for a, b in month_windows(start, end, window_days):
                     scope = f"{a.isoformat()}_{b.isoformat()}"
-                    coro = fetch_window(client, base, path, a.isoformat(), b.isoformat(), limiter)
+                    coro = fetch_window(client, base, path, a.isoformat(), b.isoformat())
                     tasks.append(_worker(s, base, path, out_dir, scope, coro))
             else:
                 for d in iter_dates(start, end):
                     scope = f"{d.isoformat()}"
-                    coro = fetch_day(client, base, path, d.isoformat(), limiter)
+                    coro = fetch_day(client, base, path, d.isoformat())
                     tasks.append(_worker(s, base, path, out_dir, scope, coro))
 
         await asyncio.gather(*tasks)
@@ -205,8 +209,14 @@ def main():
     ap.add_argument("--end", help="YYYY-MM-DD")
     ap.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS)
     ap.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
-    ap.add_argument("--throttle-ms", type=int, default=DEFAULT_THROTTLE_MS)
+    ap.add_argument("--throttle-ms", type=int, default=DEFAULT_THROTTLE_MS,
+                    help="intervalo legacy; se usa como rate=1000/ms si no se indica --rate")
+    ap.add_argument("--rate", type=float, default=DEFAULT_RATE, help="req/s sostenidas por host")
+    ap.add_argument("--burst", type=int, default=DEFAULT_BURST, help="ráfaga máxima por host")
+    ap.add_argument("--host-rate", action="append", default=[],
+                    help="override por host: soccer=8:16 (rate[:burst]); repetible")
     ap.add_argument("--overwrite", action="store_true")
+    ap.add_argument("--no-cache", action="store_true", help="ignora la caché HTTP en disco")
     args = ap.parse_args()
 
     sports_raw = [s.strip().lower() for s in args.sport.split(",")]
@@ -222,7 +232,8 @@ def main():
         raise SystemExit("Debes indicar --years o --start/--end")
 
     print(f"[backfill] sports={sports} range={start}..{end} "
-          f"win={args.window_days}d conc={args.concurrency} throttle={args.throttle_ms}ms")
+          f"win={args.window_days}d conc={args.concurrency} throttle={args.throttle_ms}ms "
+          f"rate={args.rate or round(1000.0 / max(1, args.throttle_ms), 2)}/s burst={args.burst}")
 
     asyncio.run(run_backfill(
         sports=sports,
@@ -230,7 +241,11 @@ def main():
         window_days=args.window_days,
         concurrency=args.concurrency,
         throttle_ms=args.throttle_ms,
-        overwrite=args.overwrite
+        overwrite=args.overwrite,
+        rate=args.rate,
+        burst=args.burst,
+        host_rates=parse_host_rates(args.host_rate),
+        use_cache=not args.no_cache,
     ))
     print("[backfill] terminado.")
 
@@ -0,0 +1,185 @@
+# pipelines/compact_historical.py
+"""
+Compactación de las páginas del backfill (data/historical/<sport>/<scope>_pN.json.gz):
+- Lee cada página gzip en streaming (ijson si está disponible)
+- Normaliza fixtures/games a un esquema único (date, league, home, away, scores, status)
+- Escribe un dataset particionado: data/historical/store/sport=<s>/season=<yyyy>/part-<yyyy-mm>.parquet
+- Índice persistente data/historical/store/_index.csv con los scopes ya compactados;
+  sólo se reprocesan los meses con scopes nuevos o re-descargados (--overwrite del backfill)
+"""
+
+from __future__ import annotations
+import sys, json, gzip, argparse, re
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Iterator
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import write_partition, list_partitions  # type: ignore
+from storage.historical import HIST_DIR, STORE_DIR, STORE_SPORTS, STORE_COLS  # type: ignore
+
+try:  # parser JSON en streaming (opcional)
+    import ijson  # type: ignore
+except Exception:
+    ijson = None
+
+INDEX_PATH = STORE_DIR / "_index.csv"
+INDEX_COLS = ["sport", "scope", "pages", "rows", "pages_mtime", "compacted_at"]
+PAGE_RE = re.compile(r"^(?P<scope>.+)_p(?P<page>\d+)\.json\.gz$")
+FINISHED = {"FT", "AET", "PEN", "AOT", "AP", "AW"}  # fútbol + games v1 (prórroga/penales)
+
+# ---------- lectura ----------
+def iter_page_items(path: Path) -> Iterator[Dict[str, Any]]:
+    with gzip.open(path, "rb") as fh:
+        if ijson is not None:
+            yield from ijson.items(fh, "response.item")
+            return
+        obj = json.load(fh)
+    resp = obj.get("response", []) if isinstance(obj, dict) else []
+    if isinstance(resp, list):
+        yield from resp
+
+def scope_pages(sport_dir: Path) -> Dict[str, List[Path]]:
+    out: Dict[str, List[Path]] = {}
+    for p in sport_dir.glob("*_p*.json.gz"):
+        m = PAGE_RE.match(p.name)
+        if m:
+            out.setdefault(m.group("scope"), []).append(p)
+    return out
+
+# ---------- normalización ----------
+def _g(d, *path):
+    for k in path:
+        if not isinstance(d, dict):
+            return None
+        d = d.get(k)
+    return d
+
+def _score(v):
+    """scores.home puede ser int (hockey) o dict con total (basket/béisbol/NFL)."""
+    if isinstance(v, dict):
+        v = v.get("total")
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def normalize_item(sport: str, item: Dict[str, Any], scope: str) -> Dict[str, Any]:
+    if sport == "soccer":
+        dt = _g(item, "fixture", "date")
+        raw_id = _g(item, "fixture", "id")
+        status = _g(item, "fixture", "status", "short")
+        hs, as_ = _score(_g(item, "goals", "home")), _score(_g(item, "goals", "away"))
+    else:
+        dt = _g(item, "date") or _g(item, "game", "date", "date")
+        if isinstance(dt, dict):
+            dt = dt.get("date")
+        raw_id = _g(item, "id") or _g(item, "game", "id")
+        status = _g(item, "status", "short") or _g(item, "game", "status", "short")
+        hs, as_ = _score(_g(item, "scores", "home")), _score(_g(item, "scores", "away"))
+    status = str(status or "").upper()
+    finished = status in FINISHED and hs is not None and as_ is not None
+    dt_iso = str(dt or "")
+    return {
+        "date": dt_iso[:10],
+        "date_time_utc": dt_iso,
+        "league": str(_g(item, "league", "name") or ""),
+        "league_season": str(_g(item, "league", "season") or ""),
+        "home": str(_g(item, "teams", "home", "name") or ""),
+        "away": str(_g(item, "teams", "away", "name") or ""),
+        "home_score": hs,
+        "away_score": as_,
+        "status": status,
+        "result_home_win": (float(hs > as_) if finished else None),
+        "raw_id": str(raw_id or ""),
+        "scope": scope,
+    }
+
+def normalize_scope(sport: str, scope: str, pages: List[Path]) -> List[Dict[str, Any]]:
+    rows = []
+    for p in sorted(pages, key=lambda q: int(PAGE_RE.match(q.name).group("page"))):
+        try:
+            for item in iter_page_items(p):
+                try:
+                    rows.append(normalize_item(sport, item, scope))
+                except Exception:
+                    pass
+        except Exception as e:
+            print(f"[compact] {p} ilegible: {e}")
+    return rows
+
+# ---------- índice ----------
+def load_index() -> pd.DataFrame:
+    if not INDEX_PATH.exists():
+        return pd.DataFrame(columns=INDEX_COLS)
+    return pd.read_csv(INDEX_PATH, dtype={"scope": str})
+
+def _month_of(scope: str) -> str:
+    return scope[:7]  # 'YYYY-MM-DD' o 'YYYY-MM-DD_YYYY-MM-DD' -> 'YYYY-MM'
+
+# ---------- compactación ----------
+def compact_sport(sport: str, index: pd.DataFrame, rebuild: bool = False) -> List[Dict[str, Any]]:
+    sport_dir = HIST_DIR / sport
+    pages = scope_pages(sport_dir) if sport_dir.exists() else {}
+    if not pages:
+        return []
+    done = index[index["sport"] == sport].set_index("scope")["pages_mtime"].to_dict()
+    mtimes = {s: max(p.stat().st_mtime for p in ps) for s, ps in pages.items()}
+    pending = {s for s in pages if rebuild or s not in done or mtimes[s] > float(done[s]) + 1e-6}
+    if not pending:
+        print(f"[compact] {sport}: sin scopes nuevos ({len(pages)} ya compactados)")
+        return []
+
+    # se reescribe el mes completo de cada scope pendiente (un part por mes y temporada)
+    months = sorted({_month_of(s) for s in pending})
+    now = datetime.now(timezone.utc).isoformat()
+    entries = []
+    for month in months:
+        scopes = sorted(s for s in pages if _month_of(s) == month)
+        rows = []
+        for s in scopes:
+            srows = normalize_scope(sport, s, pages[s])
+            rows.extend(srows)
+            entries.append({"sport": sport, "scope": s, "pages": len(pages[s]), "rows": len(srows),
+                            "pages_mtime": mtimes[s], "compacted_at": now})
+        df = pd.DataFrame(rows, columns=STORE_COLS)
+        df = df[df["date"].str.len() == 10]
+        df = df.drop_duplicates(subset=["raw_id", "date", "home", "away"], keep="last")
+        name = f"part-{month}"
+        # limpia el part de este mes en todas las temporadas antes de reescribir
+        for d in list_partitions(STORE_DIR, sport=[sport]):
+            for f in d.glob(f"{name}.*"):
+                f.unlink()
+        for season, part in df.groupby(df["date"].str[:4]):
+            write_partition(part.reset_index(drop=True), STORE_DIR, {"sport": sport, "season": season}, name)
+        print(f"[compact] {sport} {month}: {len(scopes)} scopes, {len(df)} partidos")
+    return entries
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sport", default="all", help="soccer|mlb|nfl|nba|nhl|all o lista (mlb,nfl)")
+    ap.add_argument("--rebuild", action="store_true", help="recompacta todos los scopes")
+    args = ap.parse_args()
+
+    sports_raw = [s.strip().lower() for s in args.sport.split(",")]
+    sports = list(STORE_SPORTS) if "all" in sports_raw else [s for s in sports_raw if s in STORE_SPORTS]
+
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    index = load_index()
+    new_entries = []
+    for s in sports:
+        new_entries += compact_sport(s, index, rebuild=args.rebuild)
+
+    if new_entries:
+        new = pd.DataFrame(new_entries, columns=INDEX_COLS)
+        index = pd.concat([index, new], ignore_index=True)
+        index = index.drop_duplicates(subset=["sport", "scope"], keep="last")
+        index.sort_values(["sport", "scope"]).to_csv(INDEX_PATH, index=False)
+    print(f"[compact] terminado – {len(new_entries)} scopes compactados -> {STORE_DIR}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,34 @@
 # pipelines/features.py
-import os, sys, json, hashlib
+import os, sys, json, hashlib, argparse
 from pathlib import Path
 from datetime import datetime, timezone
+import numpy as np
 import pandas as pd
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import read_table, write_table, table_exists  # type: ignore
+from pipelines.team_form import update_form, form_features  # type: ignore
+from storage.historical import canonical_sport, team_key  # type: ignore
+from storage.odds import line_features  # type: ignore
+
+try:  # parser JSON en streaming (opcional)
+    import ijson  # type: ignore
+except Exception:
+    ijson = None
+
 RAW_DIR = Path("data/raw")
 OUT_DIR = Path("data/processed")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Estado incremental: qué archivos raw ya se procesaron y la tabla de eventos acumulada
+MANIFEST_PATH = OUT_DIR / "raw_manifest.json"
+EVENT_STORE = OUT_DIR / "events_store"
+EVENT_COLS = ["ID","date","date_time_utc","sport","league","home","away","venue","status"]
+MANIFEST_VERSION = 2
+ODDS_MATCH_H = 12  # |commence_time - kickoff| máximo para casar un evento con sus cuotas
+
 def safe_get(d, *path, default=None):
     cur = d
     for k in path:
@@ -104,77 +125,253 @@ def parse_item(sport, item):
         "status": str(status or ""),
     }
 
-def collect_events():
-    rows = []
+# ---------- normalización en lote (vectorizada) ----------
+# Mismas rutas candidatas que parse_item, en orden de prioridad. Se compilan una vez por
+# deporte (football usa fixture.*, el resto game.* / top-level) y se extraen por columna.
+FIELD_PATHS = {
+    "date":   [("fixture","date"), ("game","date"), ("date",), ("events","date")],
+    "ts":     [("fixture","timestamp"), ("game","date","timestamp"), ("timestamp",)],
+    "league": [("league","name"), ("league","id"), ("tournament","name")],
+    "home":   [("teams","home","name"), ("home","name"), ("home","team","name"), ("teams","home")],
+    "away":   [("teams","away","name"), ("away","name"), ("away","team","name"), ("teams","away")],
+    "venue":  [("fixture","venue","name"), ("game","venue","name"), ("venue","name")],
+    "raw_id": [("fixture","id"), ("game","id"), ("id",)],
+    "status": [("fixture","status","short"), ("status","short"), ("status","long")],
+}
+_SPORT_ROOT = {"football": "fixture"}
+_PATHS_CACHE = {}
+
+def resolve_paths(sport: str) -> dict:
+    """{campo: rutas} con la raíz del deporte primero (fixture.* o game.*); cacheado."""
+    if sport not in _PATHS_CACHE:
+        root = _SPORT_ROOT.get(sport, "game")
+        _PATHS_CACHE[sport] = {f: sorted(c, key=lambda p: p[0] != root)  # sort estable
+                               for f, c in FIELD_PATHS.items()}
+    return _PATHS_CACHE[sport]
+
+class _Paths:
+    """Extrae rutas por columna; los prefijos comunes (fixture, teams.home...) se recorren una vez."""
+    def __init__(self, items):
+        self.levels = {(): items}
+
+    def get(self, path):
+        if path not in self.levels:
+            parent = self.get(path[:-1])
+            k = path[-1]
+            self.levels[path] = [d.get(k) if isinstance(d, dict) else None for d in parent]
+        return self.levels[path]
+
+    def column(self, paths, skip_dicts=False) -> pd.Series:
+        """
+        Coalesce como first_of: primer valor no vacío (None, "", []) entre `paths`.
+        La primera ruta se extrae para todo el lote; las siguientes sólo en las filas vacías.
+        """
+        def empty(v):
+            return v is None or v == "" or v == [] or (skip_dicts and isinstance(v, dict))
+        items, out, missing = self.levels[()], None, None
+        for path in paths:
+            if out is None:
+                out = [None if empty(v) else v for v in self.get(path)]
+            else:
+                for i in missing:
+                    v = items[i]
+                    for k in path:
+                        v = v.get(k) if isinstance(v, dict) else None
+                    if not empty(v):
+                        out[i] = v
+            missing = [i for i, v in enumerate(out) if v is None]
+            if not missing:
+                break
+        return pd.Series(out, dtype=object).map(str, na_action="ignore").fillna("")
+
+def normalize_batch(sport: str, items) -> pd.DataFrame:
+    """
+    Versión en lote de parse_item para una lista `response` completa: rutas resueltas
+    una vez, fechas con pd.to_datetime vectorizado e ID (mismo make_id) por columna.
+    """
+    items = [it for it in items if isinstance(it, dict)]
+    if not items:
+        return pd.DataFrame(columns=EVENT_COLS)
+    paths, ext = resolve_paths(sport), _Paths(items)
+    # game.date de american_football es un dict {date, time, timestamp}: se usa el timestamp
+    raw_dt = ext.column(paths["date"], skip_dicts=True)
+    ts = pd.to_datetime(raw_dt.str.replace("Z", "+00:00", regex=False), utc=True,
+                        errors="coerce", format="ISO8601")
+    if ts.isna().any():
+        epoch = pd.to_numeric(ext.column(paths["ts"]), errors="coerce")
+        ts = ts.fillna(pd.to_datetime(epoch, unit="s", utc=True))
+    ok = ts.notna().to_numpy()
+    naive = ts.dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+    date_iso = np.where(ok, np.char.add(np.datetime_as_string(naive, unit="s"), "+00:00"),
+                        raw_dt.to_numpy())  # como norm_dt: texto original si no parsea
+    date_only = np.where(ok, np.datetime_as_string(naive, unit="D"), "")
+
+    cols = {f: ext.column(paths[f]) for f in ("league", "home", "away", "venue", "raw_id", "status")}
+    base = (sport + "|" + cols["raw_id"] + "|" + cols["home"] + "|" + cols["away"] + "|"
+            + pd.Series(date_iso, dtype=object))
+    ids = [hashlib.sha1(b.encode("utf-8")).hexdigest() for b in base.tolist()]
+
+    return pd.DataFrame({
+        "ID": ids,
+        "date": date_only,
+        "date_time_utc": date_iso,
+        "sport": sport,
+        "league": cols["league"],
+        "home": cols["home"],
+        "away": cols["away"],
+        "venue": cols["venue"],
+        "status": cols["status"],
+    }, columns=EVENT_COLS)
+
+def _file_sha1(p: Path) -> str:
+    h = hashlib.sha1()
+    with p.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _iter_response(p: Path):
+    """Items de `response` sin materializar el documento completo si hay ijson."""
+    if ijson is not None:
+        with p.open("rb") as fh:
+            yield from ijson.items(fh, "response.item")
+        return
+    obj = json.loads(p.read_text(encoding="utf-8"))
+    resp = obj.get("response", []) if isinstance(obj, dict) else []
+    if isinstance(resp, list):
+        yield from resp
+
+def _parse_file(p: Path) -> pd.DataFrame:
+    # nombre: apisports_{sport}_{YYYY-MM-DD}.json
+    try:
+        sport = p.name.split("_")[1]
+    except Exception:
+        sport = "unknown"
+    try:
+        df = normalize_batch(sport, list(_iter_response(p)))
+    except Exception as e:
+        print(f"[features] {p.name} ilegible: {e}")
+        return pd.DataFrame(columns=EVENT_COLS + ["_src"])
+    return df.assign(_src=p.name)
+
+def _load_manifest():
+    try:
+        m = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    # cambio de normalizador -> reconstrucción completa
+    return m.get("files", {}) if m.get("version") == MANIFEST_VERSION else {}
+
+def _load_store():
+    try:
+        df = read_table(EVENT_STORE, dtype=str, keep_default_na=False)
+        return df if not df.empty else pd.DataFrame(columns=EVENT_COLS + ["_src"])
+    except Exception:
+        return pd.DataFrame(columns=EVENT_COLS + ["_src"])
+
+def collect_events(incremental: bool = True):
+    """
+    Eventos de data/raw/apisports_*.json.
+    En modo incremental sólo se parsean archivos nuevos/cambiados (manifest: size, mtime, sha1)
+    y se fusionan con la tabla persistida por ID (make_id).
+    """
     if not RAW_DIR.exists():
-        return pd.DataFrame(columns=["ID","date","date_time_utc","sport","league","home","away","venue","status"])
-
-    for p in sorted(RAW_DIR.glob("apisports_*.json")):
-        # nombre: apisports_{sport}_{YYYY-MM-DD}.json
-        try:
-            sport = p.name.split("_")[1]
-        except Exception:
-            sport = "unknown"
-        try:
-            obj = json.loads(p.read_text(encoding="utf-8"))
-        except Exception:
-            continue
+        return pd.DataFrame(columns=EVENT_COLS)
+
+    # sin tabla persistida el manifest no sirve: reconstrucción completa
+    manifest = _load_manifest() if incremental and table_exists(EVENT_STORE) else {}
+    store = _load_store() if manifest else pd.DataFrame(columns=EVENT_COLS + ["_src"])
 
-        resp = obj.get("response", [])
-        if not isinstance(resp, list):
+    files = sorted(RAW_DIR.glob("apisports_*.json"))
+    new_manifest, changed, new_frames = {}, set(), []
+    for p in files:
+        st = p.stat()
+        prev = manifest.get(p.name)
+        if prev and prev.get("size") == st.st_size and prev.get("mtime") == st.st_mtime:
+            new_manifest[p.name] = prev
             continue
+        digest = _file_sha1(p)
+        new_manifest[p.name] = {"size": st.st_size, "mtime": st.st_mtime, "sha1": digest}
+        if prev and prev.get("sha1") == digest:
+            continue  # reescrito con el mismo contenido
+        changed.add(p.name)
+        new_frames.append(_parse_file(p))
 
-        for item in resp:
-            try:
-                row = parse_item(sport, item)
-                rows.append(row)
-            except Exception:
-                # no rompemos por un evento mal formado
-                pass
-
-    cols = ["ID","date","date_time_utc","sport","league","home","away","venue","status"]
-    df = pd.DataFrame(rows, columns=cols).drop_duplicates(subset=["ID"], keep="first")
-    return df
-
-def build_features(df_events: pd.DataFrame):
-    """Aquí puedes crear columnas extra que tu modelo use; por ahora básicas."""
-    if df_events.empty:
-        return df_events.assign(
-            home_form=0.0,
-            away_form=0.0,
-            days_to_kickoff=0.0,
-        )
-
-    # Ejemplos de features sencillas
-    now = datetime.utcnow()
-    def days_to(dt_iso):
-        try:
-            d = datetime.fromisoformat(dt_iso.replace("Z","+00:00"))
-            return (d - now).total_seconds()/86400.0
-        except Exception:
-            return 0.0
+    removed = set(manifest) - set(new_manifest)
+    if not store.empty and (changed or removed):
+        store = store[~store["_src"].isin(changed | removed)]
 
+    frames = [f for f in [store] + new_frames if not f.empty]
+    df = (pd.concat(frames, ignore_index=True) if frames
+          else pd.DataFrame(columns=EVENT_COLS + ["_src"]))
+    # orden por archivo (como el glob original) y primera aparición por ID
+    df = df.sort_values("_src", kind="stable").drop_duplicates(subset=["ID"], keep="first")
+
+    write_table(df, EVENT_STORE, csv_export=False)
+    MANIFEST_PATH.write_text(json.dumps({"version": MANIFEST_VERSION, "files": new_manifest}, indent=1),
+                             encoding="utf-8")
+    print(f"collect_events: {len(changed)} archivos nuevos/cambiados, {len(removed)} removidos, "
+          f"{len(files) - len(changed)} sin cambios")
+    return df[EVENT_COLS].reset_index(drop=True)
+
+def build_features(df_events: pd.DataFrame, form: pd.DataFrame | None = None):
+    """Features por evento: días al kickoff + forma/descanso de cada equipo (pipelines.team_form)."""
     feats = df_events.copy()
-    feats["days_to_kickoff"] = feats["date_time_utc"].apply(days_to)
-    # placeholders de forma (luego podremos rellenar con históricos reales)
-    feats["home_form"] = 0.0
-    feats["away_form"] = 0.0
-    return feats
+    kick = pd.to_datetime(feats["date_time_utc"] if "date_time_utc" in feats else pd.Series(dtype=object),
+                          errors="coerce", utc=True)
+    now = pd.Timestamp.now(tz="UTC")
+    feats["days_to_kickoff"] = ((kick - now).dt.total_seconds() / 86400.0).fillna(0.0)
+    if feats.empty:
+        return feats.assign(home_form=0.0, away_form=0.0)
+    feats = pd.concat([feats, form_features(feats, form)], axis=1)
+    return pd.concat([feats, odds_features(feats, kick)], axis=1)
+
+def odds_features(events: pd.DataFrame, kick: pd.Series, lines: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Cuotas de consenso + movimiento de línea (storage.odds.line_features) alineadas con `events`:
+    mismo deporte canónico y equipos (team_key), kickoff a <= ODDS_MATCH_H horas.
+    """
+    lines = line_features() if lines is None else lines
+    cols = [c for c in lines.columns if c.startswith(("ml_", "fair_", "best_", "total_", "spread_"))] + \
+           ["odds_vig", "move_home", "steam", "odds_books", "odds_ts"]
+    if lines.empty or events.empty:
+        return pd.DataFrame(index=events.index, columns=cols, dtype=float).assign(steam=0, odds_books=0)
+    ev = pd.DataFrame({"_row": np.arange(len(events)), "sport": events["sport"].map(canonical_sport).to_numpy(),
+                       "hk": events["home"].map(team_key).to_numpy(), "ak": events["away"].map(team_key).to_numpy(),
+                       "kick": kick.to_numpy()})
+    ln = lines.assign(hk=lines["home"].map(team_key), ak=lines["away"].map(team_key),
+                      commence=pd.to_datetime(lines["commence_time"], errors="coerce", utc=True))
+    m = ev.merge(ln, on=["sport", "hk", "ak"], how="inner")
+    m["_gap"] = (m["commence"] - m["kick"]).abs()
+    m = m[m["_gap"] <= pd.Timedelta(hours=ODDS_MATCH_H)]
+    m = m.sort_values(["_row", "_gap"]).drop_duplicates("_row")
+    out = m.set_index("_row")[cols].reindex(np.arange(len(events)))
+    out.index = events.index
+    out["steam"] = out["steam"].fillna(0).astype(int)
+    out["odds_books"] = out["odds_books"].fillna(0).astype(int)
+    return out
 
 def main():
-    df_events = collect_events()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--full", action="store_true", help="ignora el manifest y reprocesa todo data/raw")
+    ap.add_argument("--no-form-update", action="store_true",
+                    help="usa el store de forma tal cual (sin leer partidos nuevos)")
+    args = ap.parse_args()
+
+    df_events = collect_events(incremental=not args.full)
+    form = None if args.no_form_update else update_form()
 
-    # Siempre escribir ambos CSV (aunque vacíos) para no romper pasos siguientes
+    # Siempre escribir ambas tablas (aunque vacías) para no romper pasos siguientes
     upc_path = OUT_DIR / "upcoming_events.csv"
     feat_path = OUT_DIR / "features.csv"
 
     df_events_out = df_events.copy()
-    df_events_out.to_csv(upc_path, index=False, encoding="utf-8")
-    print(f"upcoming_events ok – {len(df_events_out)} rows -> {upc_path}")
+    upc_out = write_table(df_events_out, upc_path)
+    print(f"upcoming_events ok – {len(df_events_out)} rows -> {upc_out}")
 
-    df_feats = build_features(df_events)
-    df_feats.to_csv(feat_path, index=False, encoding="utf-8")
-    print(f"features ok – {len(df_feats)} rows -> {feat_path}")
+    df_feats = build_features(df_events, form)
+    feat_out = write_table(df_feats, feat_path)
+    print(f"features ok – {len(df_feats)} rows -> {feat_out}")
 
 if __name__ == "__main__":
     main()
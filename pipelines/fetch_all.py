@@ -1,16 +1,17 @@
 # pipelines/fetch_all.py
-import os, sys, json
+import os, sys, json, asyncio
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import argparse
 import pandas as pd
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
 # --- Import robusto del cliente APISports ---
 try:
-    ROOT = Path(__file__).resolve().parents[1]
-    if str(ROOT) not in sys.path:
-        sys.path.insert(0, str(ROOT))
-    from integrations.apisports_client import get as api_get  # type: ignore
+    from integrations.apisports_client import get as api_get, BASES  # type: ignore
 except Exception:
     # Fallback inline si no existe el paquete 'integrations'
     import requests
@@ -33,8 +34,27 @@ except Exception:
         r.raise_for_status()
         return r.json()
 
+# --- Modo async: reutiliza RateLimiter/api_get del backfill sobre el cliente pooled ---
+try:
+    from integrations.apisports_client import ApiSportsClient  # type: ignore
+    from pipelines.backfill import RateLimiter, api_get as api_get_async  # type: ignore
+except Exception:
+    ApiSportsClient = None
+
 OUT = Path("data/raw"); OUT.mkdir(parents=True, exist_ok=True)
 
+DEFAULT_CONCURRENCY = int(os.getenv("APISPORTS_CONCURRENCY", "8"))
+DEFAULT_RATE        = float(os.getenv("APISPORTS_RATE", "4") or 4)   # req/s por host
+DEFAULT_BURST       = int(os.getenv("APISPORTS_BURST", "10"))
+
+MAPPING = [
+    ("football", "/fixtures"),
+    ("basketball", "/games"),
+    ("hockey", "/games"),
+    ("baseball", "/games"),
+    ("american_football", "/games"),
+]
+
 def date_range(mode: str):
     now = datetime.now(timezone.utc)
     if mode == "daily":
@@ -57,30 +77,60 @@ def save_json(obj, fname: str):
     # ✅ usar json.dumps (no pandas.io.json)
     (OUT / fname).write_text(json.dumps(obj, indent=2, ensure_ascii=False))
 
+def _save_block(sport_key: str, ds: str, obj) -> int:
+    save_json(obj, f"apisports_{sport_key}_{ds}.json")
+    n = len(obj.get("response", [])) if isinstance(obj, dict) else 0
+    print(f"saved apisports_{sport_key}_{ds}.json  items={n}")
+    return n
+
+def fetch_all_sync(days) -> int:
+    total = 0
+    for ds in days:
+        for sport_key, path in MAPPING:
+            obj = fetch_apisports_block(sport_key, path, ds)
+            total += _save_block(sport_key, ds, obj)
+    return total
+
+async def fetch_all_async(days, concurrency: int = DEFAULT_CONCURRENCY,
+                          rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                          use_cache: bool = True) -> int:
+    """Todos los bloques (sport, fecha) en paralelo; cada JSON se escribe al llegar."""
+    limiter = RateLimiter(rate, burst)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    async with ApiSportsClient(limiter=limiter, pool_size=concurrency, cache=use_cache) as client:
+        async def _one(sport_key: str, path: str, ds: str) -> int:
+            async with sem:
+                try:
+                    obj = await api_get_async(client, BASES[sport_key], path, {"date": ds})
+                except Exception as e:
+                    obj = {"errors": str(e), "response": []}
+            if obj.get("errors") and not obj.get("response"):
+                print(f"[APISPORTS {sport_key} {ds}] {obj.get('errors')}")
+            return _save_block(sport_key, ds, obj)
+
+        counts = await asyncio.gather(*[_one(sport_key, path, ds)
+                                        for ds in days for sport_key, path in MAPPING])
+    return sum(counts)
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", default="daily", choices=["daily","weekly"])
+    parser.add_argument("--engine", default="async", choices=["async","sync"],
+                        help="async: concurrente (default); sync: secuencial con el pool keep-alive")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="req/s por host")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST)
+    parser.add_argument("--no-cache", action="store_true", help="ignora la caché HTTP en disco")
     args = parser.parse_args()
 
     d0, d1 = date_range(args.mode)
-    days = pd.date_range(d0, d1, freq="D")
-
-    mapping = [
-        ("football", "/fixtures"),
-        ("basketball", "/games"),
-        ("hockey", "/games"),
-        ("baseball", "/games"),
-        ("american_football", "/games"),
-    ]
-    total = 0
-    for d in days:
-        ds = d.date().isoformat()
-        for sport_key, path in mapping:
-            obj = fetch_apisports_block(sport_key, path, ds)
-            save_json(obj, f"apisports_{sport_key}_{ds}.json")
-            n = len(obj.get("response", [])) if isinstance(obj, dict) else 0
-            print(f"saved apisports_{sport_key}_{ds}.json  items={n}")
-            total += n
+    days = [d.date().isoformat() for d in pd.date_range(d0, d1, freq="D")]
+
+    if args.engine == "async" and ApiSportsClient is not None:
+        total = asyncio.run(fetch_all_async(days, args.concurrency, args.rate, args.burst,
+                                            use_cache=not args.no_cache))
+    else:
+        total = fetch_all_sync(days)
 
     print(f"fetch_all: OK  total_items={total}")
 
@@ -0,0 +1,194 @@
+# pipelines/fetch_odds.py
+"""
+Snapshot de cuotas de TheOddsAPI (ODDS_API_KEY) -> store append-only storage.odds (data/odds):
+- Todos los bookmakers de las regiones pedidas, mercados h2h / totals / spreads
+- Una fila por evento × casa × mercado × resultado con el timestamp de la corrida;
+  cada corrida suma un snapshot (no pisa los anteriores) y actualiza latest/index
+- Fan-out async por clave de deporte con concurrencia acotada (ODDS_CONCURRENCY):
+  /v4/sports y /v4/sports/{key}/events no consumen cupo y sirven de skip-list (sólo se pide
+  /odds para claves activas, sin outrights y con eventos en la ventana)
+- Cupo mensual: se leen x-requests-remaining / x-requests-used de cada respuesta y no se lanza
+  un /odds que dejaría el remanente por debajo de ODDS_QUOTA_RESERVE (corte ordenado, el
+  snapshot parcial se guarda igual); el último estado queda en data/odds/quota.json
+- Sin ODDS_API_KEY no hace nada (el resto del pipeline sigue sin cuotas)
+"""
+
+import os, sys, json, asyncio, argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+import httpx
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from integrations.apisports_client import RetryPolicy  # type: ignore
+from integrations.ratelimit import RateLimiter  # type: ignore
+from storage.odds import append_snapshot, SNAP_COLS, ODDS_DIR  # type: ignore
+
+ODDS_KEY = os.getenv("ODDS_API_KEY", "")
+ODDS_BASE = "https://api.the-odds-api.com"
+ODDS_REGIONS = os.getenv("ODDS_REGIONS", "us,eu,uk")
+ODDS_MARKETS = "h2h,totals,spreads"
+ODDS_CONCURRENCY = int(os.getenv("ODDS_CONCURRENCY", "6"))
+ODDS_RATE = float(os.getenv("ODDS_RATE", "5"))            # req/s sostenidas
+ODDS_QUOTA_RESERVE = int(os.getenv("ODDS_QUOTA_RESERVE", "50"))
+QUOTA_PATH = ODDS_DIR / "quota.json"
+# prefijo de la clave de deporte de TheOddsAPI -> deporte canónico
+ODDS_SPORTS = {"soccer_": "futbol", "americanfootball_": "americano", "basketball_": "baloncesto",
+               "baseball_": "beisbol", "icehockey_": "hockey", "tennis_": "tenis"}
+
+def canonical(key: str) -> str:
+    return next((v for k, v in ODDS_SPORTS.items() if key.startswith(k)), "")
+
+def odds_cost(markets: str = ODDS_MARKETS, regions: str = ODDS_REGIONS) -> int:
+    """Costo de un /odds en TheOddsAPI: nº de mercados × nº de regiones."""
+    return max(1, len(markets.split(","))) * max(1, len(regions.split(",")))
+
+# ---------- cupo ----------
+class OddsQuota:
+    """
+    Estado del cupo mensual según los headers x-requests-*; `reserve` no se toca. Las llamadas
+    en vuelo (aún sin headers) se descuentan como `pending` hasta que responden.
+    """
+    def __init__(self, reserve: int = ODDS_QUOTA_RESERVE):
+        self.reserve = int(reserve)
+        self.remaining, self.used, self.last = None, None, None
+        self.pending, self.skipped = 0, 0
+
+    def observe(self, headers) -> None:
+        for attr, name in (("remaining", "x-requests-remaining"), ("used", "x-requests-used"),
+                           ("last", "x-requests-last")):
+            try:
+                v = headers.get(name)
+                if v not in (None, ""):
+                    setattr(self, attr, float(v))
+            except (TypeError, ValueError):
+                pass
+
+    def take(self, cost: int) -> bool:
+        """Remanente - en vuelo - costo >= reserva (sin dato aún se permite: /v4/sports trae los headers)."""
+        if self.remaining is not None and self.remaining - self.pending - cost < self.reserve:
+            self.skipped += 1
+            return False
+        self.pending += cost
+        return True
+
+    def done(self, cost: int) -> None:
+        self.pending -= cost
+
+    def save(self):
+        QUOTA_PATH.parent.mkdir(parents=True, exist_ok=True)
+        QUOTA_PATH.write_text(json.dumps({
+            "at": datetime.now(timezone.utc).isoformat(), "remaining": self.remaining, "used": self.used,
+            "reserve": self.reserve, "skipped": self.skipped}, indent=1), encoding="utf-8")
+
+# ---------- HTTP ----------
+async def _aget(client: httpx.AsyncClient, path: str, params: dict, limiter: RateLimiter,
+                quota: OddsQuota, retry: RetryPolicy = RetryPolicy()):
+    for attempt in range(retry.retries):
+        await limiter.wait(ODDS_BASE)
+        try:
+            r = await client.get(path, params={"apiKey": ODDS_KEY, **params}, timeout=30)
+        except Exception:
+            if not retry.should_retry(attempt):
+                raise
+            await asyncio.sleep(retry.delay(attempt))
+            continue
+        limiter.observe(ODDS_BASE, r.status_code, r.headers)
+        quota.observe(r.headers)
+        if r.status_code >= 400 and retry.should_retry(attempt, r.status_code):
+            await asyncio.sleep(retry.delay(attempt))
+            continue
+        r.raise_for_status()
+        return r.json()
+
+def parse_events(events, sport_key: str, league: str, ts: str) -> pd.DataFrame:
+    """JSON de /v4/sports/{key}/odds -> filas SNAP_COLS (outcome home/away/draw/over/under)."""
+    rows = []
+    sport = canonical(sport_key)
+    for ev in events or []:
+        home, away = ev.get("home_team", ""), ev.get("away_team", "")
+        base = (ts, str(ev.get("id", "")), "theoddsapi", sport, league, ev.get("commence_time", ""), home, away)
+        for bm in ev.get("bookmakers", []) or []:
+            for m in bm.get("markets", []) or []:
+                mk = m.get("key")
+                for o in m.get("outcomes", []) or []:
+                    name = o.get("name")
+                    if mk == "totals":
+                        out = str(name).lower()
+                    else:
+                        out = "home" if name == home else "away" if name == away else "draw" if name == "Draw" else ""
+                    if out and o.get("price") is not None:
+                        rows.append(base + (bm.get("key", ""), mk, out, o.get("point"), o.get("price")))
+    return pd.DataFrame(rows, columns=SNAP_COLS)
+
+async def fetch_snapshot_async(hours_ahead: int = 72, concurrency: int = ODDS_CONCURRENCY,
+                               quota: Optional[OddsQuota] = None):
+    """-> (snapshot SNAP_COLS, OddsQuota, stats {sports, with_events, fetched, failed})."""
+    quota = quota or OddsQuota()
+    ts = datetime.now(timezone.utc).replace(microsecond=0)
+    window = {"commenceTimeFrom": ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+              "commenceTimeTo": (ts + timedelta(hours=hours_ahead)).strftime("%Y-%m-%dT%H:%M:%SZ")}
+    limiter = RateLimiter(ODDS_RATE, max(1, concurrency))
+    sem = asyncio.Semaphore(max(1, concurrency))
+    cost = odds_cost()
+    stats = {"sports": 0, "with_events": 0, "fetched": 0, "failed": 0}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=ODDS_BASE, limits=limits) as client:
+        sports = [s for s in (await _aget(client, "/v4/sports", {}, limiter, quota) or [])
+                  if canonical(s.get("key", "")) and s.get("active", True) and not s.get("has_outrights")]
+        stats["sports"] = len(sports)
+
+        async def _events(s) -> bool:  # /events: gratis, descarta claves sin partidos en la ventana
+            async with sem:
+                try:
+                    return bool(await _aget(client, f"/v4/sports/{s['key']}/events", window, limiter, quota))
+                except Exception as e:
+                    print(f"[odds {s['key']}] events: {e}")
+                    return True  # ante la duda se intenta /odds
+        keep = [s for s, ok in zip(sports, await asyncio.gather(*[_events(s) for s in sports])) if ok]
+        stats["with_events"] = len(keep)
+
+        async def _odds(s) -> pd.DataFrame:
+            async with sem:
+                if not quota.take(cost):
+                    return pd.DataFrame(columns=SNAP_COLS)
+                try:
+                    events = await _aget(client, f"/v4/sports/{s['key']}/odds",
+                                         {"regions": ODDS_REGIONS, "markets": ODDS_MARKETS, "oddsFormat": "decimal",
+                                          "dateFormat": "iso", **window}, limiter, quota)
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"[odds {s['key']}] {e}")
+                    return pd.DataFrame(columns=SNAP_COLS)
+                finally:
+                    quota.done(cost)
+                stats["fetched"] += 1
+                return parse_events(events, s["key"], s.get("title", s["key"]), ts.isoformat())
+        frames = [f for f in await asyncio.gather(*[_odds(s) for s in keep]) if not f.empty]
+    snap = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SNAP_COLS)
+    return snap, quota, stats
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours-ahead", type=int, default=72)
+    ap.add_argument("--concurrency", type=int, default=ODDS_CONCURRENCY)
+    ap.add_argument("--reserve", type=int, default=ODDS_QUOTA_RESERVE,
+                    help="créditos del cupo mensual que la corrida no consume")
+    args = ap.parse_args()
+    if not ODDS_KEY:
+        print("fetch_odds: ODDS_API_KEY faltante, sin snapshot")
+        return
+    snap, quota, stats = asyncio.run(fetch_snapshot_async(args.hours_ahead, args.concurrency,
+                                                          OddsQuota(args.reserve)))
+    quota.save()
+    n = append_snapshot(snap)
+    print(f"fetch_odds: OK  filas={n} eventos={snap['event_id'].nunique() if n else 0} "
+          f"claves={stats['fetched']}/{stats['with_events']} (activas {stats['sports']}, fallidas {stats['failed']}) "
+          f"| cupo restante={quota.remaining} usado={quota.used}"
+          + (f" | {quota.skipped} claves omitidas por reserva de cupo" if quota.skipped else ""))
+
+if __name__ == "__main__":
+    main()
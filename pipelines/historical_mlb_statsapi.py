@@ -1,8 +1,13 @@
 # pipelines/historical_mlb_statsapi.py
-import requests, pandas as pd
+import sys, requests, pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import write_table  # type: ignore
+
 OUT = Path("data/historical"); OUT.mkdir(parents=True, exist_ok=True)
 
 def fetch_range(start_date, end_date):
@@ -34,6 +39,6 @@ def main():
         print("no mlb data"); return
     df=pd.DataFrame(rows)
     df["sport"]="beisbol"; df["league"]="MLB"
-    df.to_csv(OUT/"mlb_games.csv", index=False)
+    write_table(df, OUT/"mlb_games.csv")
     print("historical mlb ok:", len(df))
 if __name__=='__main__': main()
@@ -1,8 +1,13 @@
 # pipelines/historical_nba_balldontlie.py
-import requests, pandas as pd
+import sys, requests, pandas as pd
 from pathlib import Path
 from datetime import datetime
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import write_table  # type: ignore
+
 OUT = Path("data/historical"); OUT.mkdir(parents=True, exist_ok=True)
 API = "https://www.balldontlie.io/api/v1/games"
 
@@ -35,6 +40,6 @@ def main():
         print("no nba data"); return
     df=pd.DataFrame(rows)
     df["sport"]="baloncesto"; df["league"]="NBA"
-    df.to_csv(OUT/"nba_games.csv", index=False)
+    write_table(df, OUT/"nba_games.csv")
     print("historical nba ok:", len(df))
 if __name__=='__main__': main()
@@ -1,8 +1,13 @@
 # pipelines/historical_nfl.py
-import io, requests, pandas as pd
+import io, sys, requests, pandas as pd
 from pathlib import Path
 from datetime import datetime
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import write_table  # type: ignore
+
 OUT = Path("data/historical"); OUT.mkdir(parents=True, exist_ok=True)
 
 CANDIDATES = [
@@ -46,7 +51,7 @@ def main():
     df["result_home_win"] = (df["result"]>0).astype(int)
     df.rename(columns={"home_team":"home","away_team":"away"}, inplace=True)
     out = OUT/"nfl_games.csv"
-    df[["sport","league","date","home","away","result_home_win","season","game_type"]].to_csv(out, index=False)
+    write_table(df[["sport","league","date","home","away","result_home_win","season","game_type"]], out)
     print("historical nfl ok:", len(df))
 
 if __name__=="__main__": main()
@@ -1,9 +1,14 @@
 # pipelines/historical_nhl_statsapi.py
-import requests, pandas as pd
+import sys, requests, pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
 from requests.exceptions import RequestException
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import write_table  # type: ignore
+
 OUT = Path("data/historical"); OUT.mkdir(parents=True, exist_ok=True)
 
 # ---------- Fuente 1: StatsAPI (oficial) ----------
@@ -99,8 +104,7 @@ def main():
         print("no nhl data"); return
     df = pd.DataFrame(rows)
     df["sport"]="hockey"; df["league"]="NHL"
-    (OUT/"nhl_games.csv").write_text("")  # asegúrate de crear el archivo
-    df.to_csv(OUT/"nhl_games.csv", index=False)
+    write_table(df, OUT/"nhl_games.csv")
     print(f"historical nhl ok ({source}):", len(df))
 
 if __name__=='__main__': main()
@@ -1,12 +1,17 @@
 # pipelines/historical_soccer_apifootball.py
-import os, requests, pandas as pd
+import os, sys, pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
 from dateutil import parser
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from integrations.apisports_client import ApiSportsClient  # type: ignore
+from storage import read_table, write_table, table_exists  # type: ignore
+
 OUT = Path("data/historical"); OUT.mkdir(parents=True, exist_ok=True)
-API_BASE = "https://v3.football.api-sports.io"
-HEADERS = {"x-apisports-key": os.environ["APIFOOTBALL_KEY"]}
+CLIENT = ApiSportsClient(api_key=os.environ["APIFOOTBALL_KEY"])
 
 def day_range(days=180):
     end = datetime.utcnow().date()
@@ -20,9 +25,8 @@ def main():
     rows=[]
     for d in day_range(180):
         try:
-            r = requests.get(f"{API_BASE}/fixtures", params={"date": d, "timezone":"UTC"}, headers=HEADERS, timeout=30)
-            if r.status_code!=200: continue
-            for fx in r.json().get("response", []):
+            j = CLIENT.get(sport="football", path="/fixtures", params={"date": d, "timezone":"UTC"})
+            for fx in j.get("response", []):
                 st = (fx["fixture"]["status"]["short"] or "").upper()
                 if st not in ("FT","AET","PEN"):  # solo finalizados
                     continue
@@ -37,9 +41,10 @@ def main():
         print("no soccer data"); return
     df = pd.DataFrame(rows)
     out = OUT/"soccer_matches_incremental.csv"
-    if out.exists():
-        cur = pd.read_csv(out)
+    if table_exists(out):
+        cur = read_table(out)
+        cur["date"] = cur["date"].astype(str)
         df = pd.concat([cur, df], ignore_index=True).drop_duplicates(subset=["date","home","away"])
-    df.to_csv(out, index=False)
+    write_table(df, out)
     print("historical soccer recent ok:", len(df))
 if __name__=="__main__": main()
@@ -1,8 +1,13 @@
 # pipelines/historical_tennis.py
-import io, requests, pandas as pd
+import io, sys, requests, pandas as pd
 from pathlib import Path
 from datetime import datetime
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import write_table  # type: ignore
+
 OUT = Path("data/historical"); OUT.mkdir(parents=True, exist_ok=True)
 
 def fetch_csv(url):
@@ -29,6 +34,6 @@ def main():
     allm.rename(columns={"winner_name":"home","loser_name":"away"}, inplace=True)
     allm["result_home_win"]=1
     allm["sport"]="tenis"; allm["league"]=allm["tourney_name"]
-    allm[["sport","league","date","surface","home","away","result_home_win","best_of"]].to_csv(OUT/"tennis_matches.csv", index=False)
+    write_table(allm[["sport","league","date","surface","home","away","result_home_win","best_of"]], OUT/"tennis_matches.csv")
     print("historical tennis ok:", len(allm))
 if __name__=="__main__": main()
@@ -1,32 +1,95 @@
 # pipelines/recalibrate.py
+"""
+Reajusta models/calibration.json:
+- Une el log de predicciones (data/processed/predictions_log, prob. cruda de models/predict.py)
+  con los resultados liquidados de storage.historical.load_games
+- Por deporte: isotónica (PAV) vs temperature scaling, breakpoints compactos (models.calibration)
+- Sólo reajusta los deportes a los que les toca según config/schedules.yaml (--force: todos)
+"""
+
 from __future__ import annotations
-import json
+import sys, json, argparse
 from datetime import datetime, timezone
 from pathlib import Path
 import pandas as pd
 
-FEATS = Path("data/processed/features.csv")
-CALIB = Path("models/calibration.json")
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import read_partitioned  # type: ignore
+from storage.historical import load_games, team_key  # type: ignore
+from models.calibration import (CALIB_PATH, MIN_SAMPLES, fit_sport, is_due,  # type: ignore
+                                load_calibration, load_schedules)
+
+CALIB = CALIB_PATH
 CALIB.parent.mkdir(parents=True, exist_ok=True)
+PRED_LOG = Path("data/processed/predictions_log")
+DATE_TOLERANCE_DAYS = 1  # fecha UTC del evento vs fecha local del histórico
+
+def load_log() -> pd.DataFrame:
+    """Última predicción (por día de corrida) de cada evento, hecha antes o el día del partido."""
+    log = read_partitioned(PRED_LOG)
+    if log.empty:
+        return log
+    log["date"] = pd.to_datetime(log["date"], errors="coerce")
+    log["run"] = pd.to_datetime(log["run"], errors="coerce")
+    log = log.dropna(subset=["date", "run"])
+    log = log[log["run"] <= log["date"]]
+    log["home_key"] = log["home"].map(team_key)
+    log["away_key"] = log["away"].map(team_key)
+    log = log.sort_values("run", kind="stable")
+    return log.drop_duplicates(subset=["sport", "date", "home_key", "away_key"], keep="last")
+
+def settled(sport: str, preds: pd.DataFrame) -> pd.DataFrame:
+    """Predicciones del deporte con resultado (y = ganó el local), en orden cronológico."""
+    since = preds["date"].min() - pd.Timedelta(days=DATE_TOLERANCE_DAYS + 1)
+    games = load_games(sport, since=since)
+    if games.empty:
+        return pd.DataFrame(columns=["p_home_raw", "y"])
+    games = games.assign(home_key=games["home"].map(team_key), away_key=games["away"].map(team_key),
+                         gdate=games["date"].dt.normalize())
+    m = preds.merge(games[["home_key", "away_key", "gdate", "result_home_win"]],
+                    on=["home_key", "away_key"], how="inner")
+    m = m[(m["gdate"] - m["date"]).abs() <= pd.Timedelta(days=DATE_TOLERANCE_DAYS)]
+    m = m.drop_duplicates(subset=["date", "home_key", "away_key"], keep="first")
+    return m.sort_values("date", kind="stable").rename(columns={"result_home_win": "y"})[["p_home_raw", "y"]]
 
 def main():
-    n_rows = 0
-    if FEATS.exists():
-        try:
-            df = pd.read_csv(FEATS)
-            n_rows = len(df)
-        except Exception:
-            pass
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--force", action="store_true", help="ignora config/schedules.yaml y reajusta todo")
+    args = ap.parse_args()
+
+    now = datetime.now(timezone.utc)
+    calib = load_calibration()
+    sports_cal = dict(calib.get("sports") or {})
+    schedules = load_schedules()
+    log = load_log()
+
+    n_rows, fitted = 0, []
+    for sport, preds in (log.groupby("sport") if not log.empty else []):
+        prev = sports_cal.get(sport, {})
+        if not args.force and not is_due(sport, prev.get("fitted_at"), schedules, now.date()):
+            continue
+        data = settled(sport, preds)
+        n_rows += len(data)
+        if len(data) < MIN_SAMPLES:
+            print(f"[recalibrate] {sport}: {len(data)} liquidados (< {MIN_SAMPLES}), se mantiene el mapa")
+            continue
+        entry = fit_sport(data["p_home_raw"].to_numpy(float), data["y"].to_numpy(float))
+        entry["fitted_at"] = now.date().isoformat()
+        sports_cal[sport] = entry
+        fitted.append(sport)
+        print(f"[recalibrate] {sport}: {entry['method']} (n={entry['n']}, brier {entry['brier_holdout']})")
 
     payload = {
-        "generated_at_utc": datetime.now(timezone.utc).isoformat(),
+        "generated_at_utc": now.isoformat(),
         "source_rows": n_rows,
-        "isotonic": False,
-        "temperature": 1.0,
-        "notes": "Recalibración placeholder: sin outcomes, mantiene defaults.",
+        "isotonic": any(e.get("method") == "isotonic" for e in sports_cal.values()),
+        "sports": sports_cal,
+        "notes": f"reajustados: {', '.join(fitted) or 'ninguno'}",
     }
     CALIB.write_text(json.dumps(payload, indent=2, ensure_ascii=False))
-    print(f"[recalibrate] escrito -> {CALIB} (rows={n_rows})")
+    print(f"[recalibrate] escrito -> {CALIB} (rows={n_rows}, reajustados={len(fitted)})")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,177 @@
+# pipelines/team_form.py
+"""
+Store incremental de forma por equipo, clave (sport, team):
+- Últimos N resultados (W/D/L), win rate con decaimiento exponencial, fecha del último partido
+- Se alimenta de storage.historical.pending_games (scrapes + store del backfill) y sólo procesa
+  partidos posteriores al checkpoint de cada deporte: O(partidos nuevos) por corrida; si llega un
+  partido con fecha <= checkpoint (backfill, re-scrape de fútbol, resultado D-1 sólo con fecha)
+  el deporte se reconstruye solo
+- Persistido en data/processed/team_form (+ team_form_state.json con checkpoints, manifiesto de
+  fuentes y parámetros)
+- Lookup O(1) por evento (dict/índice por clave) para rellenar home_form/away_form en features
+"""
+
+from __future__ import annotations
+import os, sys, json, argparse
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import read_table, write_table, table_exists  # type: ignore
+from storage.historical import pending_games, canonical_sport, team_key, CSV_SOURCES, STORE_SPORTS  # type: ignore
+
+FORM_STORE = Path("data/processed/team_form")
+FORM_STATE = Path("data/processed/team_form_state.json")
+FORM_LAST_N = int(os.getenv("FORM_LAST_N", "10"))
+FORM_HALFLIFE = float(os.getenv("FORM_HALFLIFE_GAMES", "8"))  # partidos para que el peso caiga a la mitad
+FORM_COLS = ["sport", "team", "team_key", "games", "ew_num", "ew_den", "ew_win", "last_n", "last_date"]
+SPORTS = sorted(set(CSV_SOURCES) | set(STORE_SPORTS.values()))
+RESULT_CHAR = {1.0: "W", 0.5: "D", 0.0: "L"}
+CHAR_VALUE = {"W": 1.0, "D": 0.5, "L": 0.0}
+
+def decay_factor() -> float:
+    """Factor por partido del win rate exponencial (mitad del peso cada FORM_HALFLIFE partidos)."""
+    return 0.5 ** (1.0 / max(FORM_HALFLIFE, 1e-6))
+
+# ---------- estado ----------
+def load_state() -> Tuple[Dict[Tuple[str, str], list], dict]:
+    """-> ({(sport, team_key): [team, games, ew_num, ew_den, last_n, last_date]}, meta)"""
+    try:
+        meta = json.loads(FORM_STATE.read_text(encoding="utf-8"))
+    except Exception:
+        meta = {}
+    params = {"last_n": FORM_LAST_N, "halflife": FORM_HALFLIFE}
+    if meta.get("params") != params or not table_exists(FORM_STORE):
+        return {}, {"params": params, "sports": {}}  # parámetros nuevos -> reconstrucción
+    df = read_table(FORM_STORE)
+    state = {}
+    for r in df.itertuples(index=False):
+        state[(r.sport, r.team_key)] = [r.team, int(r.games), float(r.ew_num), float(r.ew_den),
+                                        str(r.last_n) if isinstance(r.last_n, str) else "",
+                                        str(r.last_date)]
+    return state, meta
+
+def state_frame(state: Dict[Tuple[str, str], list]) -> pd.DataFrame:
+    rows = [(s, v[0], k, v[1], v[2], v[3], v[4], v[5]) for (s, k), v in state.items()]
+    df = pd.DataFrame(rows, columns=[c for c in FORM_COLS if c != "ew_win"])
+    df["ew_win"] = (df["ew_num"] / df["ew_den"].where(df["ew_den"] > 0)).fillna(0.5)
+    return df[FORM_COLS].sort_values(["sport", "team_key"], ignore_index=True)
+
+def save_state(state, meta):
+    write_table(state_frame(state), FORM_STORE, csv_export=False)
+    FORM_STATE.parent.mkdir(parents=True, exist_ok=True)
+    FORM_STATE.write_text(json.dumps(meta, indent=1), encoding="utf-8")
+
+# ---------- actualización ----------
+def results(games: pd.DataFrame) -> np.ndarray:
+    """Resultado local 1/0.5/0: por marcador si existe (empates), si no result_home_win."""
+    res = games["result_home_win"].astype(float).to_numpy()
+    if {"home_score", "away_score"} <= set(games.columns):
+        hs = pd.to_numeric(games["home_score"], errors="coerce").to_numpy()
+        as_ = pd.to_numeric(games["away_score"], errors="coerce").to_numpy()
+        known = ~(np.isnan(hs) | np.isnan(as_))
+        res = np.where(known, np.sign(hs - as_) * 0.5 + 0.5, res)
+    return res
+
+def apply_result(state, sport: str, team: str, result: float, when: str, decay: float):
+    """Suma un resultado (1/0.5/0) al estado del equipo; lo usan también learn.replay y el backtest."""
+    k = (sport, team_key(team))
+    st = state.get(k)
+    if st is None:
+        st = state[k] = [str(team), 0, 0.0, 0.0, "", ""]
+    st[1] += 1
+    st[2] = st[2] * decay + result
+    st[3] = st[3] * decay + 1.0
+    st[4] = (st[4] + RESULT_CHAR.get(result, "L"))[-FORM_LAST_N:]
+    st[5] = when
+
+def update_sport(state, meta, sport: str) -> int:
+    """
+    Aplica en orden cronológico los partidos del deporte posteriores a su checkpoint; si las
+    fuentes traen partidos nuevos con fecha <= checkpoint, descarta el deporte y lo recalcula.
+    """
+    prev = meta["sports"].get(sport)
+    games, rebuild, meta["sports"][sport] = pending_games(sport, prev, columns=["home_score", "away_score"])
+    if rebuild:
+        for k in [k for k in state if k[0] == sport]:
+            del state[k]
+    if rebuild and prev:
+        print(f"[team_form] {sport}: partidos con fecha <= checkpoint o fuentes nuevas -> reconstrucción")
+    if games.empty:
+        return 0
+    decay = decay_factor()
+    when = games["date"].dt.strftime("%Y-%m-%dT%H:%M:%S").tolist()
+    for h, a, r, d in zip(games["home"].tolist(), games["away"].tolist(), results(games).tolist(), when):
+        apply_result(state, sport, h, r, d, decay)
+        apply_result(state, sport, a, 1.0 - r, d, decay)
+    return len(games)
+
+def update_form(sports: Optional[Iterable[str]] = None, rebuild: bool = False) -> pd.DataFrame:
+    state, meta = load_state()
+    sports = list(sports) if sports else SPORTS
+    if rebuild:
+        state = {k: v for k, v in state.items() if k[0] not in sports}
+        for s in sports:
+            meta["sports"].pop(s, None)
+    total = 0
+    for s in sports:
+        n = update_sport(state, meta, s)
+        total += n
+        if n:
+            print(f"[team_form] {s}: +{n} partidos (hasta {meta['sports'][s]['last_date']})")
+    meta["updated_at"] = datetime.now(timezone.utc).isoformat()
+    save_state(state, meta)
+    print(f"[team_form] {total} partidos nuevos, {len(state)} equipos -> {FORM_STORE}")
+    return state_frame(state)
+
+def load_form() -> pd.DataFrame:
+    if not table_exists(FORM_STORE):
+        return pd.DataFrame(columns=FORM_COLS)
+    return read_table(FORM_STORE)
+
+# ---------- lookup ----------
+def _last_n_rate(s: pd.Series) -> pd.Series:
+    return s.fillna("").map(lambda x: sum(CHAR_VALUE[c] for c in x) / len(x) if x else np.nan)
+
+def form_features(events: pd.DataFrame, form: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Columnas home_/away_ (form, last_n_rate, rest_days, games) alineadas con `events`.
+    Equipos sin historial: form 0.5, rest_days NaN.
+    """
+    form = load_form() if form is None else form
+    out = pd.DataFrame(index=events.index)
+    if events.empty:
+        return out
+    sport = events["sport"].map(canonical_sport)
+    kick = pd.to_datetime(events.get("date_time_utc", events.get("date")), errors="coerce", utc=True)
+    kick = kick.dt.tz_localize(None)
+    idx = form.set_index(["sport", "team_key"]) if not form.empty else None
+    for side in ("home", "away"):
+        keys = pd.MultiIndex.from_arrays([sport, events[side].map(team_key)])
+        if idx is None:
+            hit = pd.DataFrame(index=range(len(events)), columns=["ew_win", "last_n", "last_date", "games"])
+        else:
+            hit = idx.reindex(keys)[["ew_win", "last_n", "last_date", "games"]].reset_index(drop=True)
+        last = pd.to_datetime(hit["last_date"], errors="coerce")
+        out[f"{side}_form"] = pd.to_numeric(hit["ew_win"], errors="coerce").fillna(0.5).to_numpy()
+        out[f"{side}_last_n_rate"] = _last_n_rate(hit["last_n"]).to_numpy()
+        out[f"{side}_rest_days"] = ((kick.to_numpy() - last.to_numpy()) / np.timedelta64(1, "D"))
+        out[f"{side}_games"] = pd.to_numeric(hit["games"], errors="coerce").fillna(0).astype(int).to_numpy()
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sport", default="all", help="futbol|beisbol|... o lista; all = todos")
+    ap.add_argument("--rebuild", action="store_true", help="ignora checkpoints y recalcula todo")
+    args = ap.parse_args()
+    sports = None if args.sport == "all" else [canonical_sport(s.strip()) for s in args.sport.split(",")]
+    update_form(sports, rebuild=args.rebuild)
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,17 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 import os
+import sys
 from datetime import datetime
 import hashlib
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from serving.parlay_search import search_parlays  # type: ignore
+from serving.parlay_pricing import price_parlays  # type: ignore
+from serving.pick_records import read_records, write_records, PARLAY_COLS  # type: ignore
+
 REPORTS = Path("reports"); REPORTS.mkdir(parents=True, exist_ok=True)
 
 # Config
@@ -14,83 +22,106 @@ MAX_LEGS_DRM = int(os.environ.get("PARLAY_LEGS_DREAM","5"))
 TARGET_DEC_ODDS_SEG = float(os.environ.get("TARGET_DEC_ODDS","2.5"))
 TARGET_DEC_ODDS_DRM = float(os.environ.get("TARGET_DEC_ODDS_DREAM","10.0"))  # soñadora ≥10 por defecto
 MARGIN = float(os.environ.get("MARGIN","0.95"))
+PARLAY_TOP_K = int(os.environ.get("PARLAY_TOP_K","1"))  # parlays por tipo en parlay.csv
+PARLAY_CANDIDATES = int(os.environ.get("PARLAY_CANDIDATES","40"))  # candidatos re-rankeados con correlación
 
 STAKE_SEG = os.environ.get("STAKE_SEGURITO","5%")
 STAKE_DRM = os.environ.get("STAKE_SONADORA","2%")
 
 def load_pool():
-    f = REPORTS/"all_picks.csv"
-    if not f.exists() or f.stat().st_size == 0:
-        return pd.DataFrame()
-    return pd.read_csv(f)
+    """all_picks tipado (sidecar de serving/pick_records; prob. y cuota ya numéricas)."""
+    pool = read_records(REPORTS/"all_picks.csv")
+    return pool[pool["prob"].notna()].reset_index(drop=True)
 
 def parlay_metrics(probs):
     p = float(np.prod(probs))
     dec = (1.0 / max(p, 1e-6)) * MARGIN
     return p, dec
 
-def build_parlay(pool, max_legs, target_dec):
-    legs = []
-    probs = []
-    for _, row in pool.iterrows():
-        if len(legs) >= max_legs: break
-        legs.append(row)
-        # CUOTA (PROB %) viene como "x.xx (yy%)" → extraer prob
-        try:
-            prob_pct = int(str(row["CUOTA (PROB %)"]).split("(")[1].split("%")[0])
-            p = prob_pct/100.0
-        except Exception:
-            p = 0.55
-        probs.append(p)
-        _, dec = parlay_metrics(probs)
-        if dec >= target_dec and len(legs) >= 2:
-            break
-    legs = pd.DataFrame(legs)
-    p, dec = parlay_metrics([int(str(x).split("(")[1].split("%")[0])/100.0 for x in legs["CUOTA (PROB %)"]]) if not legs.empty else (0.0, 0.0)
-    return legs, round(p,4), round(dec,2)
+def plan_parlays(probs, games, max_legs, target_dec, k=1, price=None, keys=None):
+    """
+    -> [(índices de legs, prob, cuota)] de los top-k parlays (serving/parlay_search): máx. prob.
+    (o EV si hay cuotas de mercado) con cuota >= target, <= max_legs y una leg por partido.
+    Con `keys` ({game, league, team} por leg) la búsqueda devuelve PARLAY_CANDIDATES candidatos y
+    se re-rankean por prob. conjunta con correlación (serving/parlay_pricing, un Monte Carlo en lote).
+    Sin combinación factible: las max_legs legs más probables de partidos distintos (como antes).
+    """
+    probs = np.asarray(probs, float)
+    n_cand = max(k, PARLAY_CANDIDATES) if keys is not None else k
+    found = [legs for _, legs in search_parlays(probs, games, max_legs, target_dec, k=n_cand, price=price,
+                                                objective="prob" if price is None else "ev", margin=MARGIN)]
+    if not found:
+        ok = np.flatnonzero(np.isfinite(probs))
+        order = ok[np.argsort(-probs[ok], kind="stable")]
+        first = pd.Series(np.asarray(games, dtype=object)[order]).astype(str).duplicated().to_numpy()
+        legs = order[~first][:max_legs].tolist()
+        found = [legs] if legs else []
+    if not found:
+        return []
+    dec = np.array([parlay_metrics(probs[legs])[1] if price is None else float(np.prod(np.asarray(price)[legs]))
+                    for legs in found])
+    if keys is None:
+        joint = np.array([float(np.prod(probs[legs])) for legs in found])
+    else:  # sólo se simulan las legs que aparecen en algún candidato
+        used = np.unique(np.concatenate([np.asarray(legs, dtype=int) for legs in found]))
+        pos = {int(j): i for i, j in enumerate(used)}
+        sub = {f: np.asarray(v, dtype=object)[used] for f, v in keys.items()}
+        joint = price_parlays(probs[used], sub, [[pos[j] for j in legs] for legs in found])
+    score = joint * dec if price is not None else joint
+    top = np.argsort(-score, kind="stable")[:k]
+    return [(found[i], float(joint[i]), float(dec[i])) for i in top]
+
+def correlation_keys(pool):
+    """Claves de correlación por leg: partido, liga/jornada (DEPORTE+LIGA+FECHA) y equipo elegido (ML)."""
+    league = pool["LIGA"].astype(str)
+    team = pool["PICK"].astype(str).where(pool["MERCADO"].astype(str).eq("ML"), "")
+    return {"game": pool["PARTIDO"].to_numpy(),
+            "league": (pool["DEPORTE"].astype(str) + "|" + league + "|" + pool["FECHA"].astype(str)).to_numpy(),
+            "team": team.to_numpy()}
+
+def build_parlays(pool, max_legs, target_dec, k=1):
+    """-> [(legs DataFrame, prob conjunta, cuota)] desde los registros tipados de all_picks."""
+    if pool.empty:
+        return []
+    probs = pool["prob"].to_numpy(float)
+    price = pd.to_numeric(pool["price"], errors="coerce").to_numpy(float) if "price" in pool.columns else None
+    return [(pool.iloc[legs], round(p, 4), round(dec, 2))
+            for legs, p, dec in plan_parlays(probs, pool["PARTIDO"], max_legs, target_dec, k, price,
+                                             keys=correlation_keys(pool))]
 
 def make_parlay_id(tipo):
     ymd = datetime.now().strftime("%Y%m%d")
     salt = hashlib.sha1(f"{tipo}|{ymd}|{datetime.now().isoformat()}".encode()).hexdigest()[:5].upper()
     return f"PR{ymd}-{salt}"
 
-def format_parlay_rows(legs_df, tipo, parlay_id, stake):
-    # columnas objetivo
+def format_parlay_rows(legs_df, tipo, parlay_id, stake, p=np.nan, dec=np.nan):
+    # registros tipados: una fila por leg + prob./cuota del parlay (CSV: PARLAY_COLS)
     legs_df = legs_df.copy()
     legs_df["ID"] = parlay_id
     legs_df["TIPO"] = "🔒 Segurito" if tipo=="segurito" else "🌙 Soñadora"
-    # Renombrar desde all_picks:
-    # FECHA, DEPORTE, PARTIDO, MERCADO, PICK, CUOTA (PROB %), STAKE
     # Para parlays, STAKE del parlay (igual en todas las legs)
     legs_df["STAKE"] = stake
-    cols = ["ID","TIPO","FECHA","DEPORTE","PARTIDO","MERCADO","PICK","CUOTA (PROB %)","STAKE"]
-    return legs_df[cols]
+    legs_df["leg"] = np.arange(1, len(legs_df) + 1)
+    legs_df["parlay_prob"], legs_df["parlay_dec"] = p, dec
+    return legs_df
 
 def main():
     pool = load_pool()
     if pool.empty:
-        (REPORTS/"parlay.csv").write_text("")
+        write_records(pd.DataFrame(), REPORTS/"parlay.csv", PARLAY_COLS)
         print("parlay ok – 0 (sin picks)")
         return
-    pool = pool.sort_values("CUOTA (PROB %)", ascending=False)  # ya viene ordenado por prob, pero no estorba
-
-    # Segurito
-    seg_legs, seg_p, seg_dec = build_parlay(pool.sort_values("CUOTA (PROB %)", ascending=True).iloc[::-1], MAX_LEGS_SEG, TARGET_DEC_ODDS_SEG)
-    seg_id = make_parlay_id("segurito") if not seg_legs.empty else None
-    seg_rows = format_parlay_rows(seg_legs, "segurito", seg_id, STAKE_SEG) if seg_id else pd.DataFrame()
 
-    # Soñadora (prioriza cuota objetivo ≥ 10)
-    drm_legs, drm_p, drm_dec = build_parlay(pool, MAX_LEGS_DRM, TARGET_DEC_ODDS_DRM)
-    drm_id = make_parlay_id("sonadora") if not drm_legs.empty else None
-    drm_rows = format_parlay_rows(drm_legs, "sonadora", drm_id, STAKE_DRM) if drm_id else pd.DataFrame()
+    rows = []
+    for tipo, max_legs, target, stake in (("segurito", MAX_LEGS_SEG, TARGET_DEC_ODDS_SEG, STAKE_SEG),
+                                          ("sonadora", MAX_LEGS_DRM, TARGET_DEC_ODDS_DRM, STAKE_DRM)):
+        for legs, p, dec in build_parlays(pool, max_legs, target, PARLAY_TOP_K):
+            rows.append(format_parlay_rows(legs, tipo, make_parlay_id(tipo), stake, p, dec))
+            print(f"[parlay] {tipo}: {len(legs)} legs, prob={p} cuota={dec}")
 
-    out = REPORTS/"parlay.csv"
-    if not seg_rows.empty or not drm_rows.empty:
-        pd.concat([seg_rows, drm_rows], ignore_index=True).to_csv(out, index=False)
-        print(f"parlay ok – seg={len(seg_rows)} legs, dream={len(drm_rows)} legs -> {out}")
-    else:
-        (REPORTS/"parlay.csv").write_text("")
-        print("parlay ok – 0")
+    out = write_records(pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(),
+                        REPORTS/"parlay.csv", PARLAY_COLS)
+    print(f"parlay ok – {len(rows)} parlays, {sum(len(r) for r in rows)} legs -> {out}" if rows else "parlay ok – 0")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,93 @@
+# serving/parlay_pricing.py — prob. conjunta de parlays con correlación (Monte Carlo en lote)
+"""
+Prob. conjunta de parlays bajo una cópula gaussiana de factores en lugar del producto de
+probabilidades independientes:
+- cada leg i gana si Z_i < Φ⁻¹(p_i), con Z_i = Σ_f √ρ_f · F_f[clave_f(i)] + √(1 - Σ ρ_f) · ε_i
+- factores compartidos: mismo partido (game), misma liga/jornada (league) y mismo equipo (team);
+  una leg sin clave para un factor no carga en él. ρ por factor en PARLAY_RHO_* (correlación entre
+  dos legs = suma de los ρ de los factores que comparten)
+- una sola simulación por pool (PARLAY_SIMS escenarios, generador NumPy con semilla fija) empaquetada
+  en bits por leg; cada parlay candidato es un AND de filas + popcount, miles de candidatos en lote
+"""
+
+from __future__ import annotations
+import os
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+PARLAY_SIMS = int(os.environ.get("PARLAY_SIMS", "20000"))
+PARLAY_SEED = int(os.environ.get("PARLAY_SEED", "20240917"))
+RHO = {
+    "game": float(os.environ.get("PARLAY_RHO_GAME", "0.30")),
+    "league": float(os.environ.get("PARLAY_RHO_LEAGUE", "0.04")),
+    "team": float(os.environ.get("PARLAY_RHO_TEAM", "0.12")),
+}
+SIM_CHUNK = 4096      # escenarios por bloque (múltiplo de 8: cada bloque se empaqueta por separado)
+CAND_CHUNK = 1024     # parlays por bloque al evaluar
+_POP = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+_PPF = np.vectorize(NormalDist().inv_cdf, otypes=[float])
+
+def _codes(keys: Optional[Sequence]) -> np.ndarray:
+    """Clave por leg -> código entero (-1 = sin clave: la leg no carga en el factor)."""
+    s = pd.Series(keys, dtype=object)
+    codes = pd.factorize(s.where(s.astype(str).str.strip().ne("") & s.notna()))[0]
+    return codes
+
+def simulate_legs(p, keys: Dict[str, Sequence], n_sims: int = PARLAY_SIMS, seed: int = PARLAY_SEED,
+                  rho: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    -> matriz de bits (n_legs + 1, ceil(n_sims/8)) uint8: bit s de la fila i = la leg i gana en el
+    escenario s. La última fila es "siempre gana" (relleno de parlays con menos legs).
+    """
+    rho = RHO if rho is None else rho
+    p = np.clip(np.asarray(p, float), 1e-6, 1 - 1e-6)
+    n = len(p)
+    thr = _PPF(p)
+    factors = [(f, _codes(keys[f]), np.sqrt(max(rho.get(f, 0.0), 0.0))) for f in keys if rho.get(f, 0.0) > 0]
+    load = np.zeros(n)
+    for _, c, a in factors:
+        load += np.where(c >= 0, a * a, 0.0)
+    scale = 1.0 / np.sqrt(np.maximum(load, 1.0))  # si Σρ > 1, se normaliza la carga
+    idio = np.sqrt(np.clip(1.0 - load * scale ** 2, 0.0, None))
+    coef = [(c, np.where(c >= 0, a * scale, 0.0).astype(np.float32)) for _, c, a in factors if c.max() >= 0]
+    idio, thr = idio.astype(np.float32), thr.astype(np.float32)
+    rng = np.random.default_rng(seed)
+    blocks = []
+    for start in range(0, n_sims, SIM_CHUNK):
+        m = min(SIM_CHUNK, n_sims - start)
+        z = rng.standard_normal((m, n), dtype=np.float32)
+        z *= idio
+        for c, w in coef:
+            F = rng.standard_normal((m, int(c.max()) + 1), dtype=np.float32)
+            z += F[:, np.maximum(c, 0)] * w
+        win = np.ones((n + 1, m), dtype=bool)
+        np.less(z.T, thr[:, None], out=win[:n])
+        blocks.append(np.packbits(win, axis=1))
+    return np.hstack(blocks)
+
+def joint_probs(bits: np.ndarray, parlays: Sequence[Sequence[int]], n_sims: int = PARLAY_SIMS) -> np.ndarray:
+    """Prob. conjunta de cada parlay (lista de índices de leg) sobre la simulación de simulate_legs."""
+    if not len(parlays):
+        return np.zeros(0)
+    pad = bits.shape[0] - 1
+    width = max(len(x) for x in parlays)
+    C = np.full((len(parlays), width), pad, dtype=np.int64)
+    for r, legs in enumerate(parlays):
+        C[r, :len(legs)] = legs
+    out = np.empty(len(parlays))
+    for s in range(0, len(C), CAND_CHUNK):
+        c = C[s:s + CAND_CHUNK]
+        acc = bits[c[:, 0]].copy()
+        for j in range(1, width):
+            acc &= bits[c[:, j]]
+        out[s:s + CAND_CHUNK] = _POP[acc].sum(axis=1) / float(n_sims)
+    return out
+
+def price_parlays(p, keys: Dict[str, Sequence], parlays: Sequence[Sequence[int]],
+                  n_sims: int = PARLAY_SIMS, seed: int = PARLAY_SEED,
+                  rho: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """Atajo: simula las legs del pool una vez y evalúa todos los parlays en lote."""
+    return joint_probs(simulate_legs(p, keys, n_sims, seed, rho), parlays, n_sims)
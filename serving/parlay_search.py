@@ -0,0 +1,193 @@
+# serving/parlay_search.py — búsqueda de parlays óptimos (branch-and-bound en espacio log)
+"""
+Dadas N legs candidatas (prob. numérica, partido y opcionalmente cuota ofrecida) devuelve los
+top-K parlays que cumplen:
+- cuota objetivo: prod(cuota) >= target (sin cuota de mercado: MARGIN / prod(p))
+- entre min_legs y max_legs legs, a lo sumo una leg por partido
+Objetivo: "prob" maximiza la prob. conjunta; "ev" maximiza prob × cuota (requiere cuotas).
+Todo en log: valor v_i = log p_i (+ log cuota), peso w_i = log cuota_i; la restricción es
+sum(w) >= log(target).
+- "prob" con cuota justa (valor = -peso): knapsack de elección múltiple (una leg por partido)
+  sobre pesos discretizados en cubetas de DELTA, topadas en el objetivo + max_legs cubetas (la
+  memoria no depende de la leg más improbable); cada celda (nº legs, peso) lleva hasta K
+  representantes con su suma exacta y los top-K son los K de menor suma exacta >= objetivo
+  (error <= max_legs·DELTA en log). Insensible a empates (cuotas a 2 decimales)
+- resto ("ev" o cuotas de mercado): branch-and-bound en profundidad sobre legs ordenadas por
+  valor, con poda por alcanzabilidad (sufijo máximo de w), cota optimista del valor y
+  tolerancia EPS sobre el peor parlay del heap top-K
+Con cientos de legs ambos terminan por debajo del segundo (el knapsack con K=40, en pocos segundos con mil legs).
+"""
+
+from __future__ import annotations
+import heapq
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+EPS = 1e-4            # tolerancia en log (≈0.01% relativo) para cortar ramas casi empatadas
+DELTA = 1e-3          # ancho de cubeta del knapsack en log (≈0.1% de prob. por leg)
+MAX_NODES = 2_000_000  # tope de nodos por búsqueda (devuelve lo mejor hallado)
+
+def _knapsack(idx: np.ndarray, w: np.ndarray, games: pd.Series, max_legs: int, W: float, k: int,
+              min_legs: int) -> List[Tuple[float, List[int]]]:
+    """
+    Máx. prob. con cuota justa = mín. sum(w) >= W. Estados (nº legs, cubeta de peso) por partido,
+    cubetas = suma de pesos redondeados hacia abajo (c legs con cubeta t suman entre t y t + c
+    cubetas), topadas en C = Wb + max_legs: desde Wb todo estado cumple, así que la última cubeta
+    junta a todos los que ya cumplen de sobra. Cada celda guarda hasta k representantes (suma
+    exacta y sus legs) por clave: si cumplen, la menor suma; si no, la mayor (la más cerca de
+    cumplir). Un parlay que se descarta de una celda deja k mejores que se extienden igual, así
+    que hay K resultados siempre que existan K parlays factibles. Se candidatean las celdas desde
+    Wb - max_legs y se filtran por la suma exacta. Con k=1 un estado que ya cumple no se extiende
+    (otra leg sólo baja la prob.); con k > 1 sí (puede entrar en el top-K). Los partidos van de
+    mayor a menor cuota máxima y no se guarda un estado que ni con las legs restantes llega a W.
+    """
+    L = max_legs
+    b = np.floor(w / DELTA).astype(np.int64)
+    Wb = int(np.ceil(W / DELTA))
+    C = max(Wb, 0) + L
+    codes, _ = pd.factorize(games)
+    order = np.argsort(codes, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(codes[order])) + 1)
+    groups.sort(key=lambda g_: -w[g_].max())  # partidos de mayor cuota primero: el resto alcanza cada vez menos
+    rem = [float(w[g_].max()) for g_ in groups[1:]] + [0.0]  # mayor peso que aún puede agregarse
+    best = np.full((L + 1, C + 1, k), np.nan)           # suma exacta por representante (NaN = vacío)
+    kb = np.full((L + 1, C + 1, k), np.inf)             # clave de orden por celda (asc.; inf = vacío)
+    node = np.full((L + 1, C + 1, k), -1, dtype=np.int64)  # nodo del representante (-1 = vacío)
+    best[0, 0, 0], kb[0, 0, 0], node[0, 0, 0] = 0.0, 0.0, 0
+    n_leg, n_par = [np.array([-1])], [np.array([-1])]   # nodos: (leg agregada, nodo padre); 0 = vacío
+    n_nodes = 1
+    big = 1.0 + 2.0 * float(max(W, 0.0) + L * w.max())  # factibles por suma asc., luego no factibles por suma desc.
+
+    def key(x):
+        return np.where(np.isnan(x), np.inf, np.where(x >= W, x, big - x))
+
+    smin, smax = np.full((L + 1, C + 1), np.nan), np.full((L + 1, C + 1), np.nan)  # suma mín./máx. por celda
+    smin[0, 0] = smax[0, 0] = 0.0
+
+    def merge(c, tt, cand, par, i):
+        """Funde los candidatos (n, q) = nodo `par` + leg i con las celdas best[c, tt]; quedan los k mejores."""
+        nonlocal n_nodes
+        allkey = np.concatenate([kb[c, tt], key(cand)], axis=1)
+        pick = np.argsort(allkey, axis=1, kind="stable")[:, :k]
+        r = np.arange(len(tt))[:, None]
+        new = pick >= k
+        ids = np.take_along_axis(node[c, tt], np.minimum(pick, k - 1), axis=1)
+        ids[new] = np.arange(n_nodes, n_nodes + int(new.sum()))
+        n_par.append(par[np.nonzero(new)[0], pick[new] - k]); n_leg.append(np.full(int(new.sum()), i))
+        n_nodes += int(new.sum())
+        sums = np.concatenate([best[c, tt], cand], axis=1)[r, pick]
+        best[c, tt], kb[c, tt], node[c, tt] = sums, allkey[r, pick], ids
+        smin[c, tt], smax[c, tt] = np.fmin.reduce(sums, axis=1), np.fmax.reduce(sums, axis=1)
+
+    # niveles en orden descendente: cada nivel se lee (estado previo al partido, una leg por
+    # partido) antes de que otra leg del mismo partido escriba en él
+    for grp, wr in zip(groups, rem):
+        for c in range(L - 1, -1, -1):
+            src, lo_c, hi_c = best[c], smin[c], smax[c]
+            if k == 1 and c >= min_legs:       # ya cumplen con min_legs: no se extienden
+                src = np.where(src >= W, np.nan, src)
+                lo_c = hi_c = src[:, 0]
+            if np.isnan(hi_c).all():
+                continue
+            for i in grp:
+                bi, wi = int(b[i]), float(w[i])
+                m = max(C - bi, 0)             # src[:m] -> cubeta t + bi; src[m:] -> tope C
+                # cota de la mejor clave candidata por celda; sólo se funden las que pueden entrar
+                lo_, hi_ = lo_c[:m] + wi, hi_c[:m] + wi
+                lb = np.where(lo_ >= W, lo_, np.where(hi_ >= W, W, big - hi_))
+                lb[hi_ + (L - 1 - c) * wr < W] = np.inf  # ni con las legs restantes se llega
+                tt = np.flatnonzero(lb < kb[c + 1, bi:bi + m, -1])
+                if len(tt):
+                    merge(c + 1, tt + bi, src[tt] + wi, node[c, tt], i)
+                tail = src[m:].reshape(-1) + wi  # cola: todos cumplen, gana la menor suma
+                ok = np.flatnonzero(tail < kb[c + 1, C, -1])
+                if len(ok):
+                    ok = ok[np.argsort(tail[ok], kind="stable")[:k]]
+                    merge(c + 1, np.array([C]), tail[ok][None, :], node[c, m:].reshape(-1)[ok][None, :], i)
+    n_leg, n_par = np.concatenate(n_leg), np.concatenate(n_par)
+    lo = max(Wb - L, 0)
+    sub = best[min_legs:, lo:]
+    feas = sub >= W
+    out = []
+    for nd in node[min_legs:, lo:][feas][np.argsort(sub[feas], kind="stable")[:k]].tolist():
+        sel = []
+        while nd > 0:
+            sel.append(int(n_leg[nd])); nd = int(n_par[nd])
+        out.append((-float(w[sel].sum()), [int(idx[i]) for i in sorted(sel, key=lambda i: w[i])]))
+    return sorted(out, key=lambda x: -x[0])
+
+def search_parlays(p, games, max_legs: int, target_dec: float, k: int = 1, price=None,
+                   objective: str = "prob", margin: float = 1.0, min_legs: int = 2) -> List[Tuple[float, List[int]]]:
+    """
+    -> [(valor log, índices de legs)] de mejor a peor, hasta k parlays.
+    p: prob. por leg; games: clave de partido por leg; price: cuota ofrecida por leg (None =
+    cuota justa 1/p, y la del parlay se multiplica por `margin`).
+    """
+    p = np.asarray(p, float)
+    ok = np.isfinite(p) & (p > 0) & (p < 1)
+    if price is not None:
+        price = np.asarray(price, float)
+        ok &= np.isfinite(price) & (price > 1.0)
+    elif objective == "ev":
+        raise ValueError("objective='ev' requiere cuotas de mercado (price)")
+    idx = np.flatnonzero(ok)
+    if len(idx) < min_legs or max_legs < min_legs:
+        return []
+    lp = np.log(p[idx])
+    w = np.log(price[idx]) if price is not None else -lp
+    v = lp + w if objective == "ev" else lp
+    W = np.log(target_dec) - (0.0 if price is not None else np.log(margin))
+    if price is None:
+        return _knapsack(idx, w, pd.Series(np.asarray(games, dtype=object)[idx]).astype(str), max_legs, W, k,
+                         min_legs)
+
+    order = np.argsort(-v, kind="stable")
+    idx, v, w = idx[order], v[order].tolist(), w[order].tolist()
+    g = pd.factorize(pd.Series(np.asarray(games, dtype=object)[idx]).astype(str))[0].tolist()
+    n = len(idx)
+    wmax = np.maximum.accumulate(np.asarray(w)[::-1])[::-1].tolist() + [-np.inf]  # sufijo máximo
+
+    heap: List[Tuple[float, Tuple[int, ...]]] = []  # min-heap (valor, legs)
+    used, path = set(), []
+    nodes = 0
+
+    def worst() -> float:
+        return heap[0][0] if len(heap) >= k else -np.inf
+
+    def push(val: float):
+        item = (val, tuple(path))
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif val > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def dfs(start: int, cv: float, cw: float):
+        nonlocal nodes
+        d = len(path)
+        for j in range(start, n):
+            nodes += 1
+            if nodes > MAX_NODES:
+                return
+            vj = v[j]
+            # cota optimista: legs ordenadas por valor desc., el resto aporta a lo sumo max(0, v_j)
+            bound = cv + vj + max(0.0, vj) * (max_legs - d - 1)
+            if bound <= worst() + EPS:
+                return  # las legs siguientes tienen valor <= v_j
+            if cw + (max_legs - d) * wmax[j] < W:
+                return  # ni con las legs de mayor cuota se llega al objetivo
+            if g[j] in used:
+                continue
+            nv, nw = cv + vj, cw + w[j]
+            path.append(j); used.add(g[j])
+            if nw >= W and d + 1 >= min_legs:
+                push(nv)
+                if objective == "ev" and d + 1 < max_legs:
+                    dfs(j + 1, nv, nw)  # con EV una leg más puede mejorar el valor
+            elif d + 1 < max_legs:
+                dfs(j + 1, nv, nw)
+            path.pop(); used.discard(g[j])
+
+    dfs(0, 0.0, 0.0)
+    return [(val, [int(idx[j]) for j in legs]) for val, legs in sorted(heap, reverse=True)]
@@ -0,0 +1,167 @@
+# serving/pick_ranker.py — Top-K de picks con topes por deporte/liga/partido y prioridades por perfil
+"""
+Selección Top-K sobre los registros tipados de all_picks (serving/pick_records):
+- puntaje = log(prob) + log(peso); el peso sale del perfil del bot (data/users/<id>.json):
+  deportes desactivados quedan fuera (sports_enabled), y las ligas / mercados priorizados
+  (leagues_priority, markets_priority) suman un bono decreciente con la posición en la lista
+- Top-K parcial con heap: heapify O(n) de los candidatos y pops hasta llenar K respetando los
+  topes TOPK_MAX_PER_{SPORT,LEAGUE,GAME}; si los topes no dejan completar K, se rellena con los
+  mejores descartados respetando sólo el tope por partido
+- personalized_topk() codifica el pool y arma la shortlist una vez, y resuelve muchos perfiles
+  en el mismo pase (pesos sobre valores únicos expandidos por código, heap sobre la shortlist)
+"""
+
+from __future__ import annotations
+import os
+import json
+import heapq
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from storage.historical import canonical_sport  # type: ignore
+
+CAPS = {
+    "sport": int(os.environ.get("TOPK_MAX_PER_SPORT", "3")),
+    "league": int(os.environ.get("TOPK_MAX_PER_LEAGUE", "2")),
+    "game": int(os.environ.get("TOPK_MAX_PER_GAME", "1")),
+}  # 0 = sin tope
+LEAGUE_BONUS = float(os.environ.get("TOPK_LEAGUE_BONUS", "0.10"))  # +10% a la 1ª liga priorizada
+MARKET_BONUS = float(os.environ.get("TOPK_MARKET_BONUS", "0.05"))
+USERS_DIR = Path(os.getenv("BOT_DATA_DIR", "data")) / "users"
+# etiquetas de markets_priority del bot -> MERCADO de los picks
+MARKET_LABELS = {"winner": "ML", "moneyline": "ML", "ml": "ML", "handicap": "SPREAD", "spread": "SPREAD",
+                 "totals": "TOTAL", "over/under": "TOTAL", "total": "TOTAL"}
+
+def _norm(label) -> str:
+    """'⚽ Fútbol' -> 'futbol' (sin emoji, acentos ni mayúsculas)."""
+    s = unicodedata.normalize("NFKD", str(label or "")).encode("ascii", "ignore").decode()
+    return " ".join(s.lower().split())
+
+def load_profiles(users_dir: Path = USERS_DIR) -> Dict[str, dict]:
+    """Perfiles guardados por el bot: {user_id: perfil} (archivos ilegibles se omiten)."""
+    out = {}
+    for f in sorted(Path(users_dir).glob("*.json")):
+        try:
+            out[f.stem] = json.loads(f.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+    return out
+
+# ---------- pesos ----------
+def _rank_bonus(values: List[str], priority, bonus: float, match) -> np.ndarray:
+    """Multiplicador por valor único: 1 + bonus·(L-i)/L para la i-ésima prioridad que lo cubre."""
+    prio = [p for p in (priority or []) if str(p).strip()]
+    w = np.ones(len(values))
+    for i, p in enumerate(prio):
+        hit = np.array([match(v, p) for v in values], dtype=bool) & (w == 1.0)
+        w[hit] = 1.0 + bonus * (len(prio) - i) / len(prio)
+    return w
+
+def _encode(recs: pd.DataFrame) -> dict:
+    """Códigos por columna (una vez por pool) para topes y pesos; la normalización va sobre únicos."""
+    enc = {"logp": np.log(np.clip(recs["prob"].to_numpy(float), 1e-9, 1.0))}
+    for f, col, fn in (("sport", "DEPORTE", lambda x: canonical_sport(_norm(x))),
+                       ("league", "LIGA", _norm),
+                       ("game", "PARTIDO", str),
+                       ("market", "MERCADO", lambda x: x.strip().upper())):
+        raw_codes, raw = pd.factorize(recs[col].fillna("").astype(str))
+        codes, uniq = pd.factorize(pd.Series([fn(x) for x in raw.tolist()], dtype=object))
+        enc[f] = (codes[raw_codes] if len(raw) else raw_codes, list(uniq))
+    return enc
+
+def profile_score(enc: dict, profile: Optional[dict]) -> np.ndarray:
+    """log(prob) + log(peso del perfil); -inf para deportes desactivados."""
+    score = enc["logp"].copy()
+    if not profile:
+        return score
+    codes, sports = enc["sport"]
+    enabled = profile.get("sports_enabled") or {}
+    if enabled:
+        on = {canonical_sport(_norm(k)): bool(v) for k, v in enabled.items()}
+        keep = np.array([on.get(s, True) for s in sports] + [True])
+        score[~keep[codes]] = -np.inf
+    codes, leagues = enc["league"]
+    w = _rank_bonus(leagues, profile.get("leagues_priority"), LEAGUE_BONUS,
+                    lambda v, p: bool(v) and _norm(p) in _norm(v))
+    score += np.log(np.append(w, 1.0)[codes])
+    codes, markets = enc["market"]
+    w = _rank_bonus(markets, profile.get("markets_priority"), MARKET_BONUS,
+                    lambda v, p: MARKET_LABELS.get(_norm(p)) == v)
+    score += np.log(np.append(w, 1.0)[codes])
+    return score
+
+# ---------- Top-K ----------
+def topk(score: np.ndarray, keys: Dict[str, np.ndarray], k: int, caps: Optional[Dict[str, int]] = None,
+         cand: Optional[np.ndarray] = None) -> List[int]:
+    """Índices de los K mejores por `score` (desc.) entre `cand` (todos por defecto) con topes por clave."""
+    caps = CAPS if caps is None else caps
+    cand = np.arange(len(score)) if cand is None else np.asarray(cand)
+    cand = cand[np.isfinite(score[cand])]
+    if k <= 0 or not len(cand):
+        return []
+    heap = list(zip((-score[cand]).tolist(), cand.tolist()))  # empates: índice menor (= mayor prob.)
+    heapq.heapify(heap)
+    used = {f: {} for f in caps if caps[f] > 0}
+    out, skipped = [], []
+    while heap and len(out) < k:
+        _, i = heapq.heappop(heap)
+        if all(used[f].get(keys[f][i], 0) < caps[f] for f in used):
+            out.append(i)
+            for f in used:
+                used[f][keys[f][i]] = used[f].get(keys[f][i], 0) + 1
+        else:
+            skipped.append(i)
+    if len(out) < k:  # relleno: los mejores descartados (y el resto), sólo con tope por partido
+        game_cap, games = caps.get("game", 0), used.get("game", {})
+        for i in skipped + [i for _, i in sorted(heap)]:
+            if len(out) >= k:
+                break
+            g = keys["game"][i]
+            if game_cap <= 0 or games.get(g, 0) < game_cap:
+                out.append(i); games[g] = games.get(g, 0) + 1
+    return out
+
+def shortlist(enc: dict, k: int, caps: Optional[Dict[str, int]] = None) -> np.ndarray:
+    """
+    Candidatos que pueden entrar al Top-K de cualquier perfil. El peso del perfil es constante
+    dentro de cada celda (deporte, liga, mercado), así que ahí el orden es siempre el de la prob.:
+    basta con las filas de los primeros 2K partidos de la celda (y hasta el tope por partido de
+    cada uno). Como mucho K partidos quedan usados, el resto de la celda nunca supera a esas filas.
+    """
+    caps = CAPS if caps is None else caps
+    cell = pd.Series(enc["sport"][0]).astype(np.int64)
+    for f in ("league", "market"):
+        cell = cell * (len(enc[f][1]) + 1) + enc[f][0]
+    order = np.lexsort((-enc["logp"], cell.to_numpy()))
+    c, g = cell.to_numpy()[order], enc["game"][0][order]
+    df = pd.DataFrame({"c": c, "g": g})
+    first = ~df.duplicated(["c", "g"])
+    game_rank = first.groupby(df["c"]).cumsum() - 1                # partidos distintos antes (en la celda)
+    row_rank = df.groupby(["c", "g"]).cumcount()                    # filas previas del mismo partido
+    per_game = caps.get("game", 0) if caps.get("game", 0) > 0 else k
+    keep = (game_rank.to_numpy() < 2 * k) & (row_rank.to_numpy() < per_game)
+    return np.sort(order[keep])
+
+def personalized_topk(recs: pd.DataFrame, profiles: Dict[str, Optional[dict]], k: int,
+                      caps: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """
+    -> registros de `recs` con user_id, rank y score: los Top-K de cada perfil
+    ({user_id: perfil}; None = sin preferencias, sólo prob. y topes). El pool se codifica y
+    recorta (shortlist) una sola vez; cada perfil es un heap sobre la shortlist.
+    """
+    if recs.empty or not profiles:
+        return recs.head(0).assign(user_id="", rank=0, score=0.0)
+    recs = recs.reset_index(drop=True)
+    enc = _encode(recs)
+    keys = {f: enc[f][0] for f in ("sport", "league", "game")}
+    cand = shortlist(enc, k, caps)
+    rows, uids, ranks, scores = [], [], [], []
+    for uid, prof in profiles.items():
+        score = profile_score(enc, prof)
+        idx = topk(score, keys, k, caps, cand)
+        rows += idx; uids += [str(uid)] * len(idx); ranks += range(1, len(idx) + 1); scores += score[idx].tolist()
+    return recs.iloc[rows].assign(user_id=uids, rank=ranks, score=scores).reset_index(drop=True)
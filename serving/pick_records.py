@@ -0,0 +1,94 @@
+# serving/pick_records.py — registros tipados de picks/parlays (sidecar binario junto al CSV)
+"""
+Los CSV de reports/ (all_picks, picks, parlay) son para humanos y Sheets; cada uno lleva al lado
+un sidecar tipado vía storage (reports/<nombre>_typed.parquet) con prob. y cuota numéricas,
+versión de modelo y hora de inicio. Los consumidores (parlay_builder, sheets_append, bot) leen el
+sidecar con read_records(); "CUOTA (PROB %)" sólo se genera al escribir, nunca se vuelve a parsear
+(salvo CSV antiguos sin sidecar, en un solo pase vectorizado).
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from storage import read_table, write_table, table_exists  # type: ignore
+
+CUOTA = "CUOTA (PROB %)"
+PICK_COLS = ["ID", "FECHA", "DEPORTE", "PARTIDO", "MERCADO", "PICK", CUOTA, "STAKE"]
+PARLAY_COLS = ["ID", "TIPO"] + PICK_COLS[1:]
+# esquema tipado: texto + numéricos; parlays agregan TIPO, leg, parlay_prob, parlay_dec
+STR_COLS = ["ID", "TIPO", "FECHA", "DEPORTE", "LIGA", "PARTIDO", "MERCADO", "PICK", "LINEA", "STAKE", "model"]
+FLOAT_COLS = ["prob", "dec_odds", "parlay_prob", "parlay_dec"]
+TYPED_COLS = ["ID", "FECHA", "DEPORTE", "LIGA", "PARTIDO", "MERCADO", "PICK", "LINEA", "STAKE",
+              "prob", "dec_odds", "model", "start_time_utc"]
+
+def sidecar(csv_path) -> Path:
+    p = Path(csv_path)
+    return p.with_name(p.stem + "_typed")
+
+def cuota_label(prob, dec=None) -> List[str]:
+    """Etiqueta humana 'x.xx (yy%)' desde columnas numéricas (dec por defecto 1/prob)."""
+    prob = np.asarray(prob, float)
+    dec = np.round(1.0 / np.clip(prob, 1e-6, 1 - 1e-6), 2) if dec is None else np.round(np.asarray(dec, float), 2)
+    pct = np.round(prob * 100).astype(int)
+    return [f"{d:.2f} ({pp}%)" for d, pp in zip(dec, pct)]
+
+def parse_cuota(col: pd.Series):
+    """CSV antiguo sin sidecar: 'x.xx (yy%)' -> (prob, cuota) en un pase (1/cuota; si falta, el %)."""
+    s = col.astype(str)
+    dec = pd.to_numeric(s.str.extract(r"^\s*([0-9]+(?:\.[0-9]+)?)")[0], errors="coerce").to_numpy(float)
+    pct = pd.to_numeric(s.str.extract(r"\(\s*([0-9]+(?:\.[0-9]+)?)\s*%")[0], errors="coerce").to_numpy(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(dec > 1.0, 1.0 / dec, pct / 100.0)
+    p = np.where((p > 0) & (p < 1), p, np.nan)
+    return p, np.where(dec > 1.0, dec, 1.0 / p)
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Normaliza dtypes del esquema tipado (columnas ausentes: vacías/NaN)."""
+    out = df.copy()
+    for c in TYPED_COLS:
+        if c not in out.columns:
+            out[c] = np.nan if c in FLOAT_COLS else ""
+    for c in STR_COLS:
+        if c in out.columns:
+            out[c] = out[c].fillna("").astype(str)
+    for c in FLOAT_COLS:
+        if c in out.columns:
+            out[c] = pd.to_numeric(out[c], errors="coerce").astype(float)
+    out["start_time_utc"] = pd.to_datetime(out["start_time_utc"], errors="coerce", utc=True)
+    if "leg" in out.columns:
+        out["leg"] = pd.to_numeric(out["leg"], errors="coerce").fillna(0).astype(int)
+    return out
+
+def display(df: pd.DataFrame, cols: Sequence[str] = PICK_COLS) -> pd.DataFrame:
+    """Vista humana (texto) de registros tipados con las columnas `cols`."""
+    out = df.copy()
+    out[CUOTA] = cuota_label(out["prob"], out["dec_odds"]) if len(out) else []
+    return out[list(cols)]
+
+def write_records(df: pd.DataFrame, csv_path, cols: Sequence[str] = PICK_COLS) -> Path:
+    """CSV humano (vacío si no hay filas, como siempre) + sidecar tipado."""
+    csv_path = Path(csv_path)
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    df = typed(df)
+    if df.empty:
+        csv_path.write_text("")
+    else:
+        display(df, cols).to_csv(csv_path, index=False)
+    write_table(df, sidecar(csv_path), csv_export=False)
+    return csv_path
+
+def read_records(csv_path) -> pd.DataFrame:
+    """Registros tipados: el sidecar si existe; si no, el CSV humano parseado una vez."""
+    csv_path = Path(csv_path)
+    if table_exists(sidecar(csv_path)):
+        return typed(read_table(sidecar(csv_path)))
+    if not csv_path.exists() or csv_path.stat().st_size == 0:
+        return typed(pd.DataFrame())
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    if CUOTA in df.columns:
+        df["prob"], df["dec_odds"] = parse_cuota(df[CUOTA])
+    return typed(df)
@@ -1,17 +1,35 @@
 # serving/select_picks.py — genera all_picks + picks (Top-M) con campos normalizados
+"""
+predictions -> all_picks (todos los candidatos) + picks (Top-M), CSV humano + registros tipados.
+El Top-M sale de serving/pick_ranker (topes por deporte/liga/partido); con perfiles del bot en
+data/users también se escribe reports/user_picks (Top-M por usuario).
+- El esquema de columnas (fuente de prob., nombres de local/visitante) se resuelve una vez por
+  archivo en detect_schema(); el resto opera por columnas completas: recorte a (0,1), inferencia
+  de la selección, fecha local e ID estable (sha1 de la clave, igual que antes)
+- Fuentes de prob. en orden: columna única conocida, par local/visitante, mejor columna float
+  en (0,1), `score` normalizado
+"""
 from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime, timezone
 import os
-import re
+import sys
 import hashlib
 
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from storage import read_table, write_table, table_exists  # type: ignore
+from serving.pick_records import write_records, typed, cuota_label, PICK_COLS  # type: ignore
+from serving.pick_ranker import personalized_topk, load_profiles  # type: ignore
+
 DATA = Path("data/processed")
 REPORTS = Path("reports"); REPORTS.mkdir(parents=True, exist_ok=True)
 
 MAX_PICKS = int(os.environ.get("MAX_PICKS", "5"))  # Top-M configurable
 DEFAULT_STAKE = os.environ.get("STAKE_DEFAULT", "5%")  # para picks
+LOCAL_TZ = "America/Mexico_City"
 
 PROB_SINGLE = ["prob_model","model_prob","pred_prob","win_prob","prob","p","prediction","yhat_proba","proba"]
 HOME_PROB  = ["p_home","prob_home","home_prob","home_win_prob","ph","win_home","proba_home"]
@@ -22,240 +40,204 @@ AWAY_NAMES = ["away","away_team","team_away","visitante","visitor"]
 
 def _read_preds():
     f = DATA / "predictions.csv"
-    if not f.exists() or f.stat().st_size == 0:
-        print("select_picks: predictions.csv no existe o vacío")
+    if not table_exists(f):
+        print("select_picks: predictions no existe o vacío")
         return pd.DataFrame()
-    df = pd.read_csv(f).replace([np.inf,-np.inf], np.nan)
+    df = read_table(f).replace([np.inf,-np.inf], np.nan)
     print(f"select_picks: cols => {list(df.columns)}")
     return df
 
-def _clamp01(x):
-    try: x = float(x)
-    except Exception: return np.nan
-    return x if 0 < x < 1 else np.nan
-
-def _detect_single_prob(df):
-    for c in PROB_SINGLE:
-        if c in df.columns:
-            p = df[c].apply(_clamp01)
-            if p.notna().sum() >= 1:
-                print(f"select_picks: usando prob única = '{c}' (válidas={int(p.notna().sum())})")
-                return c
-    return None
-
-def _detect_dual_prob(df):
-    h = next((c for c in HOME_PROB if c in df.columns), None)
-    a = next((c for c in AWAY_PROB if c in df.columns), None)
-    if h and a:
-        hp = df[h].apply(_clamp01); ap = df[a].apply(_clamp01)
-        if max(hp.notna().sum(), ap.notna().sum()) >= 1:
-            print(f"select_picks: usando prob dual = ('{h}','{a}')")
-            return h, a
-    return None, None
-
-def _best_numeric_prob(df):
-    best, best_cnt = None, 0
-    for c in df.columns:
-        if df[c].dtype.kind in "fc":
-            p = df[c].apply(_clamp01)
-            cnt = p.notna().sum()
-            if cnt > best_cnt:
-                best, best_cnt = c, cnt
-    if best:
-        print(f"select_picks: mejor numérica en (0,1) => '{best}' (válidas={best_cnt})")
-    return best
-
-def _normalize_from_score(df):
-    if "score" in df.columns and df["score"].notna().sum() >= 1:
-        s = df["score"].astype(float)
-        mn, mx = s.min(), s.max()
-        if mx > mn:
-            p = 0.05 + 0.9 * (s - mn) / (mx - mn)
-            print("select_picks: usando 'score' normalizado como prob (fallback)")
-            return p
-    return pd.Series(dtype=float)
+def _clamp01(s):
+    """Columna -> float con NaN fuera de (0,1) (no numéricos incluidos)."""
+    x = pd.to_numeric(s, errors="coerce").astype(float)
+    return x.where((x > 0) & (x < 1))
 
 def _get_col(df, cands): return next((c for c in cands if c in df.columns), None)
 
-def _mk_game(home, away):
-    home = home if isinstance(home,str) and home else "Home"
-    away = away if isinstance(away,str) and away else "Away"
-    return f"{away} @ {home}"
-
-def _split_from_game(game):
-    if not isinstance(game,str): return None, None
-    g = game.strip()
-    if "@" in g:
-        parts = [p.strip() for p in g.split("@", 1)]
-        if len(parts)==2: return parts[0], parts[1]
-    if " vs " in g.lower():
-        m = re.split(r"\s+vs\s+", g, flags=re.IGNORECASE)
-        if len(m)==2: return m[0].strip(), m[1].strip()
-    return None, None
-
-def _ensure_cols(df, cols):
-    for c in cols:
-        if c not in df.columns: df[c] = ""
-    return df
-
-def _build_long_from_dual(raw, hcol, acol):
-    hname = _get_col(raw, HOME_NAMES)
-    aname = _get_col(raw, AWAY_NAMES)
-    base = [c for c in raw.columns if c not in [hcol, acol]]
-
-    home_rows = raw[base].copy(); away_rows = raw[base].copy()
-    if hname and aname:
-        home_rows["selection"] = raw[hname]
-        away_rows["selection"] = raw[aname]
-        game_series = [ _mk_game(h,a) for h,a in zip(raw[hname], raw[aname]) ]
+def _text(df, col):
+    """Columna de texto sin nulos ('' si no existe)."""
+    return df[col].fillna("").astype(str) if col in df.columns else pd.Series("", index=df.index)
+
+# ---------- esquema ----------
+def detect_schema(df):
+    """
+    Contrato de columnas de predictions, resuelto una sola vez por archivo:
+    {"kind": "single"|"dual"|"best"|"score"|None, "prob": columnas de prob., "home"/"away": nombres}.
+    """
+    sch = {"kind": None, "prob": (), "home": _get_col(df, HOME_NAMES), "away": _get_col(df, AWAY_NAMES)}
+    single = next((c for c in PROB_SINGLE if c in df.columns and _clamp01(df[c]).notna().any()), None)
+    if single:
+        print(f"select_picks: usando prob única = '{single}' (válidas={int(_clamp01(df[single]).notna().sum())})")
+        return {**sch, "kind": "single", "prob": (single,)}
+    h, a = _get_col(df, HOME_PROB), _get_col(df, AWAY_PROB)
+    if h and a and (_clamp01(df[h]).notna().any() or _clamp01(df[a]).notna().any()):
+        print(f"select_picks: usando prob dual = ('{h}','{a}')")
+        return {**sch, "kind": "dual", "prob": (h, a)}
+    num = df.select_dtypes(include="floating")
+    if num.shape[1]:
+        cnt = ((num > 0) & (num < 1)).sum()  # todas las float en un pase; idxmax = primera con más válidas
+        if cnt.max() > 0:
+            best = cnt.idxmax()
+            print(f"select_picks: mejor numérica en (0,1) => '{best}' (válidas={int(cnt.max())})")
+            return {**sch, "kind": "best", "prob": (best,)}
+    if "score" in df.columns and df["score"].notna().any():
+        return {**sch, "kind": "score", "prob": ("score",)}
+    return sch
+
+def _prob_from_score(s):
+    s = pd.to_numeric(s, errors="coerce").astype(float)
+    mn, mx = s.min(), s.max()
+    if not mx > mn:
+        return None
+    print("select_picks: usando 'score' normalizado como prob (fallback)")
+    return 0.05 + 0.9 * (s - mn) / (mx - mn)
+
+# ---------- selección / partido ----------
+def _long_from_dual(raw, sch):
+    """Una fila por lado (local/visitante) con su prob."""
+    h, a = sch["prob"]
+    base = raw.drop(columns=[h, a])
+    home_rows, away_rows = base.copy(), base.copy()
+    if sch["home"] and sch["away"]:
+        home_rows["selection"], away_rows["selection"] = raw[sch["home"]], raw[sch["away"]]
+        game = _mk_game(raw[sch["home"]], raw[sch["away"]])
     else:
-        home_rows["selection"] = "Home"; away_rows["selection"] = "Away"
-        game_series = raw.get("game", pd.Series([""]*len(raw))).tolist()
-
-    home_rows["p"] = raw[hcol].apply(_clamp01)
-    away_rows["p"] = raw[acol].apply(_clamp01)
-
+        home_rows["selection"], away_rows["selection"] = "Home", "Away"
+        game = _text(raw, "game")
+    home_rows["p"], away_rows["p"] = _clamp01(raw[h]), _clamp01(raw[a])
     long_df = pd.concat([home_rows, away_rows], ignore_index=True)
     if "game" not in long_df.columns or long_df["game"].replace("", np.nan).isna().any():
-        long_df["game"] = game_series + game_series
+        long_df["game"] = pd.concat([game, game], ignore_index=True).to_numpy()
     return long_df
 
-def _infer_selection_single(df):
-    if "selection" in df.columns and df["selection"].replace("",np.nan).notna().any():
-        return df
-    hname = _get_col(df, HOME_NAMES); aname = _get_col(df, AWAY_NAMES)
-    if hname and aname:
-        choice_is_home = df["p"] >= 0.5
-        df.loc[choice_is_home, "selection"] = df.loc[choice_is_home, hname]
-        df.loc[~choice_is_home, "selection"] = df.loc[~choice_is_home, aname]
+def _mk_game(home, away):
+    """'Visitante @ Local' por columnas (nombres vacíos -> Home/Away)."""
+    h = home.fillna("").astype(str).replace("", "Home")
+    a = away.fillna("").astype(str).replace("", "Away")
+    return a + " @ " + h
+
+def _split_game(game):
+    """'A @ H' o 'A vs H' -> (A, H) por columnas (NaN si no se reconoce)."""
+    g = game.fillna("").astype(str).str.strip()
+    at = g.str.extract(r"^(.*?)\s*@\s*(.*)$")
+    vs = g.str.extract(r"(?i)^(.*?)\s+vs\s+(.*)$")
+    first = at[0].fillna(vs[0]).str.strip()
+    second = at[1].fillna(vs[1]).str.strip()
+    return first, second
+
+def _infer_selection(df, sch):
+    """Sin `selection` útil: el lado con p >= 0.5 (columnas local/visitante, o el texto del partido)."""
+    if "selection" in df.columns and df["selection"].replace("", np.nan).notna().any():
         return df
-    if "game" in df.columns:
-        away_list, home_list = [], []
-        for g in df["game"].fillna(""):
-            a, h = _split_from_game(g); away_list.append(a); home_list.append(h)
-        away_s = pd.Series(away_list); home_s = pd.Series(home_list)
-        mask = away_s.notna() & home_s.notna()
-        if mask.any():
-            choice_is_home = df["p"] >= 0.5
-            sel = np.where(choice_is_home, home_s, away_s)
-            df.loc[mask, "selection"] = sel[mask]
-    if "selection" not in df.columns or df["selection"].replace("",np.nan).isna().any():
-        df["selection"] = df.get("selection","")
-        df.loc[df["selection"].replace("",np.nan).isna(), "selection"] = np.where(df["p"]>=0.5, "Home", "Away")
+    home_side = (df["p"] >= 0.5).to_numpy()
+    sel = pd.Series(np.nan, index=df.index, dtype=object)
+    if sch["home"] and sch["away"]:
+        sel[:] = np.where(home_side, df[sch["home"]], df[sch["away"]])
+    elif "game" in df.columns:
+        away, home = _split_game(df["game"])
+        ok = (away.notna() & home.notna()).to_numpy()
+        sel[ok] = np.where(home_side, home, away)[ok]
+    df["selection"] = sel.where(sel.replace("", np.nan).notna(), np.where(home_side, "Home", "Away"))
     return df
 
-def _date_local_from(df):
-    # preferente start_time_utc → FECHA local (sin hora)
-    if "start_time_utc" in df.columns:
-        try:
-            dt = pd.to_datetime(df["start_time_utc"], utc=True, errors="coerce")
-            return dt.dt.tz_convert("America/Mexico_City").dt.strftime("%d/%m/%Y")
-        except Exception:
-            pass
-    return datetime.now(timezone.utc).astimezone().strftime("%d/%m/%Y")
-
-def _sport_from(df):
-    return df.get("sport","").fillna("")
-
-def _league_from(df):
-    return df.get("league","").fillna("")
+# ---------- fecha / ID ----------
+def _date_local(df):
+    """FECHA local (dd/mm/YYYY) desde start_time_utc; sin hora válida, la fecha de hoy."""
+    today = datetime.now(timezone.utc).astimezone().strftime("%d/%m/%Y")
+    if "start_time_utc" not in df.columns:
+        return pd.Series(today, index=df.index)
+    dt = pd.to_datetime(df["start_time_utc"], utc=True, errors="coerce")
+    day = dt.dt.tz_convert(LOCAL_TZ).dt.tz_localize(None).dt.normalize()
+    codes, uniq = pd.factorize(day)  # strftime sólo sobre los días distintos (NaT -> -1 -> hoy)
+    labels = np.append(pd.DatetimeIndex(uniq).strftime("%d/%m/%Y").to_numpy(dtype=object), today)
+    return pd.Series(labels[codes], index=df.index)
+
+def _mk_ids(df):
+    """ID estable: P + yyyymmdd de FECHA + sha1[:6] de FECHA|DEPORTE|PARTIDO|MERCADO|PICK."""
+    key = df["FECHA"] + "|" + df["DEPORTE"] + "|" + df["PARTIDO"] + "|" + df["MERCADO"] + "|" + df["PICK"]
+    codes, uniq = pd.factorize(key)
+    h = np.array([hashlib.sha1(k.encode("utf-8")).hexdigest()[:6].upper() for k in uniq.tolist()], dtype=object)
+    f = df["FECHA"]
+    ymd = f.str[6:10] + f.str[3:5] + f.str[0:2]
+    ymd = ymd.where(f.str.fullmatch(r"\d{2}/\d{2}/\d{4}"), datetime.now().strftime("%Y%m%d"))
+    return "P" + ymd + "-" + pd.Series(h[codes] if len(uniq) else [], index=df.index, dtype=object)
 
 def build_all_picks():
+    """-> (all_picks con PICK_COLS ordenado por prob., filas completas); vacíos si no hay candidatos."""
     raw = _read_preds()
-    if raw.empty: return pd.DataFrame()
-
-    single = _detect_single_prob(raw)
-    if single:
-        df = raw.copy(); df["p"] = df[single].apply(_clamp01)
-        df = df.dropna(subset=["p"])
-        df = _infer_selection_single(df)
+    empty = (pd.DataFrame(columns=PICK_COLS), pd.DataFrame())
+    if raw.empty:
+        return empty
+
+    sch = detect_schema(raw)
+    if sch["kind"] == "dual":
+        df = _long_from_dual(raw, sch)
+    elif sch["kind"] in ("single", "best"):
+        df = raw.copy(); df["p"] = _clamp01(raw[sch["prob"][0]])
+    elif sch["kind"] == "score" and _prob_from_score(raw["score"]) is not None:
+        df = raw.copy(); df["p"] = _prob_from_score(raw["score"])
     else:
-        hcol, acol = _detect_dual_prob(raw)
-        if hcol and acol:
-            df = _build_long_from_dual(raw, hcol, acol)
-        else:
-            best = _best_numeric_prob(raw)
-            if best:
-                df = raw.copy(); df["p"] = df[best].apply(_clamp01)
-                df = df.dropna(subset=["p"])
-                df = _infer_selection_single(df)
-            else:
-                pscore = _normalize_from_score(raw)
-                if pscore.empty or pscore.notna().sum() < 1:
-                    print("select_picks: no hay prob/score util → 0")
-                    return pd.DataFrame()
-                df = raw.copy(); df["p"] = pscore
-                df = _infer_selection_single(df)
-
-    df = df.dropna(subset=["p"])
-    df = df[(df["p"] > 0) & (df["p"] < 1)].copy()
+        print("select_picks: no hay prob/score util → 0")
+        return empty
+    df = df[df["p"].notna() & (df["p"] > 0) & (df["p"] < 1)].copy()
+    if df.empty:
+        return empty
+    if sch["kind"] != "dual":
+        df = _infer_selection(df, sch)
 
     # columnas base
     for c in ["sport","league","game","market","selection"]:
         if c not in df.columns: df[c] = ""
 
-    # FECHA (solo fecha local)
-    date_local = _date_local_from(df)
-    df["FECHA"] = date_local if isinstance(date_local,str) else date_local
-
-    # DEPORTE
-    df["DEPORTE"] = _sport_from(df)
-    # PARTIDO
-    if df["game"].replace("", np.nan).isna().any():
-        hname = _get_col(df, HOME_NAMES); aname = _get_col(df, AWAY_NAMES)
-        if hname and aname:
-            df["game"] = [ _mk_game(h,a) for h,a in zip(df[hname], df[aname]) ]
-    df["PARTIDO"] = df["game"]
-    # MERCADO
-    df["MERCADO"] = df["market"].replace({"Moneyline":"ML","moneyline":"ML"}).fillna("ML")
-    # PICK
-    df["PICK"] = df["selection"].fillna("")
-
+    df["FECHA"] = _date_local(df)
+    df["DEPORTE"] = _text(df, "sport")
+    if df["game"].replace("", np.nan).isna().any() and sch["home"] and sch["away"]:
+        df["game"] = _mk_game(df[sch["home"]], df[sch["away"]])
+    df["PARTIDO"] = _text(df, "game")
+    df["MERCADO"] = df["market"].replace({"Moneyline":"ML","moneyline":"ML"}).fillna("ML").astype(str)
+    df["PICK"] = _text(df, "selection")
     # CUOTA (PROB %) — cuota derivada del modelo: 1/p
-    dec = (1.0 / df["p"].clip(1e-6, 1-1e-6)).round(2)
-    perc = (df["p"]*100).round(0).astype(int)
-    df["CUOTA (PROB %)"] = [f"{d:.2f} ({pp}%)" for d,pp in zip(dec, perc)]
-
-    # STAKE (por defecto)
+    df["CUOTA (PROB %)"] = cuota_label(df["p"])
     df["STAKE"] = DEFAULT_STAKE
-
-    # ID estable (día + hash corto del partido/mercado/pick)
-    def _mk_id(row):
-        base = f"{row.get('FECHA','')}|{row.get('DEPORTE','')}|{row.get('PARTIDO','')}|{row.get('MERCADO','')}|{row.get('PICK','')}"
-        h = hashlib.sha1(base.encode("utf-8")).hexdigest()[:6].upper()
-        # prefijo P + yyyymmdd
-        try:
-            ymd = datetime.strptime(row.get("FECHA",""), "%d/%m/%Y").strftime("%Y%m%d")
-        except Exception:
-            ymd = datetime.now().strftime("%Y%m%d")
-        return f"P{ymd}-{h}"
-    df["ID"] = df.apply(_mk_id, axis=1)
+    df["ID"] = _mk_ids(df)
 
     # ordenar por prob desc y deduplicar
-    df = df.sort_values("p", ascending=False).drop_duplicates(subset=["ID"], keep="first")
-
-    # columnas finales (para Sheets)
-    final_cols = ["ID","FECHA","DEPORTE","PARTIDO","MERCADO","PICK","CUOTA (PROB %)","STAKE"]
-    return df[final_cols], df
+    df = df.sort_values("p", ascending=False, kind="stable").drop_duplicates(subset=["ID"], keep="first")
+    return df[PICK_COLS], df
+
+def typed_picks(df):
+    """Filas de build_all_picks -> registros tipados (prob./cuota numéricas, liga, línea, modelo, inicio)."""
+    out = df[["ID","FECHA","DEPORTE","PARTIDO","MERCADO","PICK","STAKE"]].copy()
+    out["LIGA"] = df["league"]
+    out["LINEA"] = df["line"] if "line" in df.columns else ""
+    out["prob"] = df["p"].astype(float)
+    out["dec_odds"] = 1.0 / out["prob"].clip(1e-6, 1-1e-6)
+    for c in ("model", "start_time_utc"):
+        out[c] = df[c] if c in df.columns else ""
+    return out.reset_index(drop=True)
 
 def main():
     all_df, _raw = build_all_picks()
     if all_df.empty:
-        (REPORTS/"all_picks.csv").write_text("")
-        (REPORTS/"picks.csv").write_text("")
+        write_records(pd.DataFrame(), REPORTS/"all_picks.csv")
+        write_records(pd.DataFrame(), REPORTS/"picks.csv")
         print("picks ok – 0 (no hay candidatos)")
         return
 
-    # escribe TODOS
-    all_out = REPORTS/"all_picks.csv"
-    all_df.to_csv(all_out, index=False)
-    print(f"all_picks ok – {len(all_df)} -> {all_out}")
+    # escribe TODOS (CSV humano + sidecar tipado)
+    recs = typed_picks(_raw)
+    all_out = write_records(recs, REPORTS/"all_picks.csv")
+    print(f"all_picks ok – {len(recs)} -> {all_out}")
 
-    # TOP-M
-    top = all_df.head(MAX_PICKS).copy()
-    top_out = REPORTS/"picks.csv"
-    top.to_csv(top_out, index=False)
+    # TOP-M general (heap con topes por deporte/liga/partido) + Top-M por perfil del bot en un pase
+    profiles = load_profiles()
+    ranked = personalized_topk(recs, {"": None, **profiles}, MAX_PICKS)
+    top = ranked[ranked["user_id"] == ""].drop(columns=["user_id", "rank", "score"])
+    top_out = write_records(top, REPORTS/"picks.csv")
     print(f"picks ok – {len(top)} -> {top_out}")
+    if profiles:
+        user_out = write_table(typed(ranked[ranked["user_id"] != ""]), REPORTS/"user_picks", csv_export=False)
+        print(f"user_picks ok – {len(profiles)} perfiles -> {user_out}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -19,7 +19,12 @@ import csv
 import json
 import argparse
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import List, Sequence, Set, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+from serving.pick_records import read_records, display, PICK_COLS, PARLAY_COLS, CUOTA  # type: ignore
 
 # ---------- Config por defecto ----------
 DEFAULT_TABS = {
@@ -91,6 +96,14 @@ def _read_csv_rows(csv_path: Path, has_header: bool = True) -> Tuple[List[str],
     data = rows[1:] if has_header else rows
     return (headers or []), data
 
+def _read_record_rows(csv_path: Path, cols: Sequence[str]) -> Tuple[List[str], List[List[str]]]:
+    """Registros tipados (sidecar de pick_records) -> filas de texto con las columnas del CSV humano."""
+    recs = read_records(csv_path)
+    if recs.empty or not set(cols) - {CUOTA} <= set(recs.columns):
+        return _read_csv_rows(csv_path)  # sin registros o CSV con otro esquema: tal cual
+    view = display(recs, cols).astype(str)
+    return list(view.columns), view.values.tolist()
+
 def _append_dedup(ws, headers: List[str], rows: List[List[str]], overwrite: bool = False) -> int:
     if overwrite:
         # borra todas las filas excepto encabezados
@@ -132,7 +145,7 @@ def main():
 
     # ---------- PICKS ----------
     ws_picks = _get_or_create_ws(sh, DEFAULT_TABS["picks"])
-    headers, data = _read_csv_rows(CSV_MAP["picks"])
+    headers, data = _read_record_rows(CSV_MAP["picks"], PICK_COLS)
     # Si el CSV no trae encabezados, usamos los esperados
     headers = headers or PICKS_HEADERS
     _ensure_headers(ws_picks, headers)
@@ -141,7 +154,7 @@ def main():
 
     # ---------- PARLAYS ----------
     ws_parlays = _get_or_create_ws(sh, DEFAULT_TABS["parlays"])
-    headers_p, data_p = _read_csv_rows(CSV_MAP["parlays"])
+    headers_p, data_p = _read_record_rows(CSV_MAP["parlays"], PARLAY_COLS)
     headers_p = headers_p or PARLAYS_HEADERS
     _ensure_headers(ws_parlays, headers_p)
     added_p = _append_dedup(ws_parlays, headers_p, data_p, overwrite=overwrite)
@@ -14,5 +14,7 @@ for f in ['reports/picks.csv','reports/parlay.csv']:
 Path('serving/space/requirements.txt').write_text('pandas\ngradio\n')
 up('serving/space/app.py','app.py'); up('serving/space/requirements.txt','requirements.txt')
 up('reports/picks.csv','picks.csv'); up('reports/parlay.csv','parlay.csv')
+for f in Path('reports').glob('*_typed.*'):  # registros tipados (serving/pick_records)
+    if f.stem in ('picks_typed','parlay_typed'): up(str(f), f.name)
 if Path('serving/prefs.json').exists(): up('serving/prefs.json','prefs.json')
 print('Space synced')
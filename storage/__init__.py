@@ -0,0 +1,5 @@
+# capa de almacenamiento tabular (Parquet/Arrow con CSV opcional)
+from storage.tables import (  # noqa: F401
+    write_table, read_table, table_exists, table_path,
+    write_partition, read_partitioned, list_partitions,
+)
@@ -0,0 +1,221 @@
+# storage/historical.py
+"""
+Acceso unificado a partidos históricos para train/backtest:
+- Scrapes CSV/Parquet de data/historical/*_games (NFL, NBA, MLB, NHL, tenis, fútbol incremental)
+- Store compactado de las páginas del backfill: data/historical/store/sport=<s>/season=<yyyy>/
+Ambos se devuelven con el mismo esquema y el nombre de deporte canónico (futbol, beisbol...).
+Los nombres abreviados de un scrape (nflverse: "KC") se pasan al nombre completo del store
+(TEAM_NAMES) y el mismo partido de dos fuentes se deduplica por (día, team_key local, team_key
+visita), con precedencia del scrape CSV sobre el store.
+- pending_games: lo que falta aplicar a un estado incremental (forma, Elo) según un checkpoint
+  con manifiesto de fuentes (ruta, tamaño, mtime) y digest por año de los partidos aplicados;
+  un partido nuevo con fecha <= checkpoint (backfill, re-scrape, resultado tardío) pide reconstruir
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from storage.tables import read_table, read_partitioned, table_path
+
+HIST_DIR = Path("data/historical")
+STORE_DIR = HIST_DIR / "store"
+
+# clave del backfill (partición sport=) -> deporte canónico
+STORE_SPORTS = {"soccer": "futbol", "mlb": "beisbol", "nfl": "americano", "nba": "baloncesto", "nhl": "hockey"}
+# clave de API-Sports (data/raw/apisports_<sport>_*.json, columna sport de eventos) -> canónico
+APISPORTS_SPORTS = {"football": "futbol", "baseball": "beisbol", "american_football": "americano",
+                    "basketball": "baloncesto", "hockey": "hockey"}
+CSV_SOURCES = {
+    "americano": ["nfl_games.csv"],
+    "tenis": ["tennis_matches.csv"],
+    "futbol": ["soccer_matches_incremental.csv"],
+    "baloncesto": ["nba_games.csv"],
+    "beisbol": ["mlb_games.csv"],
+    "hockey": ["nhl_games.csv"],
+}
+
+# esquema del store compactado
+STORE_COLS = ["date", "date_time_utc", "league", "league_season", "home", "away",
+              "home_score", "away_score", "status", "result_home_win", "raw_id", "scope"]
+GAME_COLS = ["sport", "league", "date", "home", "away", "result_home_win"]
+# abreviaturas de los scrapes -> nombre de API-Sports/backfill (franquicias mudadas: nombre actual)
+TEAM_NAMES = {
+    "americano": {
+        "ARI": "Arizona Cardinals", "ATL": "Atlanta Falcons", "BAL": "Baltimore Ravens", "BUF": "Buffalo Bills",
+        "CAR": "Carolina Panthers", "CHI": "Chicago Bears", "CIN": "Cincinnati Bengals", "CLE": "Cleveland Browns",
+        "DAL": "Dallas Cowboys", "DEN": "Denver Broncos", "DET": "Detroit Lions", "GB": "Green Bay Packers",
+        "HOU": "Houston Texans", "IND": "Indianapolis Colts", "JAX": "Jacksonville Jaguars",
+        "KC": "Kansas City Chiefs", "LA": "Los Angeles Rams", "LAR": "Los Angeles Rams", "STL": "Los Angeles Rams",
+        "LAC": "Los Angeles Chargers", "SD": "Los Angeles Chargers", "LV": "Las Vegas Raiders",
+        "OAK": "Las Vegas Raiders", "MIA": "Miami Dolphins", "MIN": "Minnesota Vikings",
+        "NE": "New England Patriots", "NO": "New Orleans Saints", "NYG": "New York Giants", "NYJ": "New York Jets",
+        "PHI": "Philadelphia Eagles", "PIT": "Pittsburgh Steelers", "SEA": "Seattle Seahawks",
+        "SF": "San Francisco 49ers", "TB": "Tampa Bay Buccaneers", "TEN": "Tennessee Titans",
+        "WAS": "Washington Commanders",
+    },
+}
+
+def team_key(name) -> str:
+    """Clave de equipo/jugador estable entre fuentes: minúsculas y espacios colapsados."""
+    return " ".join(str(name or "").lower().split())
+
+def canonical_sport(sport: str) -> str:
+    """futbol/beisbol... a partir de cualquier clave conocida (API-Sports, backfill o canónica)."""
+    s = str(sport or "").lower()
+    return APISPORTS_SPORTS.get(s) or STORE_SPORTS.get(s) or s
+
+def read_store(store_sport: str, seasons: Optional[Iterable[int]] = None,
+               columns: Optional[List[str]] = None, finished_only: bool = True,
+               filters=None) -> pd.DataFrame:
+    """Partidos compactados de una clave de backfill (soccer/mlb/nfl/nba/nhl)."""
+    cols = None
+    if columns:
+        cols = list(dict.fromkeys(list(columns) + (["result_home_win"] if finished_only else [])))
+    sel = {"sport": [store_sport]}
+    if seasons is not None:
+        sel["season"] = list(seasons)
+    df = read_partitioned(STORE_DIR, columns=cols, filters=filters, **sel)
+    if finished_only and not df.empty:
+        df = df[df["result_home_win"].notna()]
+    return df
+
+def load_games(sport: str, columns: Optional[List[str]] = None,
+               seasons: Optional[Iterable[int]] = None, since=None) -> pd.DataFrame:
+    """
+    Partidos terminados del deporte canónico `sport` (scrapes + store), ordenados por fecha.
+    `columns` proyecta sobre GAME_COLS (+ extras como surface, home_score...).
+    `since` (fecha/Timestamp) devuelve sólo partidos estrictamente posteriores; el filtro se
+    empuja al lector y las temporadas anteriores del store ni se abren.
+    """
+    want = list(dict.fromkeys(GAME_COLS + list(columns or [])))
+    flt, store_seasons = None, seasons
+    if since is not None:
+        since = pd.Timestamp(since)
+        flt = [("date", ">=", since.strftime("%Y-%m-%d"))]  # superconjunto; el corte exacto va abajo
+        if store_seasons is None:
+            store_seasons = range(since.year, pd.Timestamp.now().year + 2)
+    frames = []
+    for fn in CSV_SOURCES.get(sport, []):
+        df = read_table(HIST_DIR / fn, columns=want, filters=flt)
+        if not df.empty:
+            frames.append(df.assign(_src=len(frames)))
+    for key, canon in STORE_SPORTS.items():
+        if canon != sport:
+            continue
+        df = read_store(key, seasons=store_seasons, columns=[c for c in want if c != "sport"],
+                        filters=flt)
+        if not df.empty:
+            frames.append(df.assign(sport=sport, _src=len(frames)))
+    if not frames:
+        return pd.DataFrame(columns=want)
+    out = pd.concat(frames, ignore_index=True)
+    out["date"] = pd.to_datetime(out["date"], errors="coerce", utc=True).dt.tz_localize(None)
+    out = out.dropna(subset=["date", "home", "away", "result_home_win"])
+    if seasons is not None:
+        out = out[out["date"].dt.year.isin(list(seasons))]
+    if since is not None:
+        cut = since.tz_convert(None) if since.tzinfo else since
+        out = out[out["date"] > cut]
+    out["result_home_win"] = out["result_home_win"].astype(int)
+    if sport in TEAM_NAMES:
+        for side in ("home", "away"):
+            out[side] = out[side].astype(str).str.strip().str.upper().map(TEAM_NAMES[sport]).fillna(out[side])
+    # mismo partido en dos fuentes (hora vs. sólo fecha, mayúsculas): gana el primero (CSV);
+    # el nº de orden dentro de cada fuente conserva los dobles (doubleheaders) de una misma fuente
+    key = pd.DataFrame({"d": out["date"].dt.normalize(), "h": out["home"].map(team_key),
+                        "a": out["away"].map(team_key), "src": out["_src"]})
+    key["n"] = key.groupby(["src", "d", "h", "a"]).cumcount()
+    out = out[~key.duplicated(subset=["d", "h", "a", "n"], keep="first").to_numpy()]
+    return out[[c for c in want if c in out.columns]].sort_values("date", kind="stable", ignore_index=True)
+
+# ---------- checkpoints de estados incrementales ----------
+def source_files(sport: str) -> List[Path]:
+    """Archivos de origen del deporte: scrapes CSV/Parquet + particiones del store."""
+    files = [table_path(HIST_DIR / fn) for fn in CSV_SOURCES.get(sport, [])]
+    for key, canon in STORE_SPORTS.items():
+        if canon == sport:
+            files += sorted((STORE_DIR / f"sport={key}").rglob("*.*"))
+    return [f for f in files if f is not None and Path(f).is_file()]
+
+def source_manifest(sport: str) -> Dict[str, list]:
+    """{ruta: [tamaño, mtime_ns]} de source_files."""
+    out = {}
+    for f in source_files(sport):
+        st = Path(f).stat()
+        out[str(f)] = [st.st_size, st.st_mtime_ns]
+    return out
+
+def game_digest(games: pd.DataFrame) -> Dict[str, list]:
+    """
+    {año: [n, digest]} de un lote de partidos; el digest es la suma (mod 2^64) de un hash por
+    partido, así que es independiente del orden y se acumula sumando lotes.
+    """
+    if games.empty:
+        return {}
+    cols = {"d": games["date"].dt.strftime("%Y-%m-%d"), "h": games["home"].map(team_key),
+            "a": games["away"].map(team_key), "r": games["result_home_win"].astype(int)}
+    for c in ("home_score", "away_score"):
+        if c in games.columns:
+            cols[c] = pd.to_numeric(games[c], errors="coerce")
+    h = pd.util.hash_pandas_object(pd.DataFrame(cols), index=False).to_numpy(np.uint64)
+    year = games["date"].dt.year.to_numpy()
+    out = {}
+    for y in np.unique(year):
+        m = year == y
+        out[str(int(y))] = [int(m.sum()), int(h[m].sum(dtype=np.uint64))]
+    return out
+
+def _add_digest(a: Dict[str, list], b: Dict[str, list]) -> Dict[str, list]:
+    out = {k: list(v) for k, v in a.items()}
+    for y, (n, d) in b.items():
+        n0, d0 = out.get(y, [0, 0])
+        out[y] = [n0 + n, (d0 + d) % 2 ** 64]
+    return out
+
+def pending_games(sport: str, checkpoint: Optional[dict], columns: Optional[List[str]] = None
+                  ) -> Tuple[pd.DataFrame, bool, dict]:
+    """
+    Partidos por aplicar a un estado incremental con `checkpoint`
+    ({last_date, games, manifest, seasons} o None = estado vacío).
+    -> (partidos en orden cronológico, rebuild, checkpoint nuevo). Con rebuild=True los partidos
+    son toda la historia y el estado del deporte se descarta antes de aplicarlos.
+    - Fuentes sin cambios (manifiesto igual): no se lee nada
+    - Se releen los años de las particiones cambiadas (un scrape cambiado = toda la historia) y,
+      si los partidos con fecha <= last_date no coinciden con el digest aplicado, se reconstruye
+    """
+    man = source_manifest(sport)
+    ck = checkpoint or {}
+    if ck.get("manifest") == man:
+        return pd.DataFrame(columns=GAME_COLS), False, ck
+    last = pd.Timestamp(ck["last_date"]) if ck.get("last_date") else None
+    old = ck.get("manifest") or {}
+    changed = [f for f in man if old.get(f) != man[f]]
+    rebuild = last is None or any(f not in man for f in old)
+    since = None
+    if not rebuild:
+        years = [Path(f).parent.name.split("=", 1)[1] for f in changed if Path(f).parent.name.startswith("season=")]
+        if changed and len(years) == len(changed) and all(y.isdigit() for y in years):
+            since = pd.Timestamp(int(min(years)) - 1, 12, 31)
+    games = load_games(sport, columns=columns, since=since)
+    if not rebuild:
+        seen = games[games["date"] <= last]
+        if since is not None:
+            seen = seen[seen["date"].dt.year > since.year]
+        now = game_digest(seen)
+        done = {y: v for y, v in (ck.get("seasons") or {}).items() if since is None or int(y) > since.year}
+        rebuild = any(now.get(y, [0, 0]) != done.get(y, [0, 0]) for y in set(now) | set(done))
+    if rebuild:
+        if since is not None:
+            games = load_games(sport, columns=columns)
+        new = games
+        ck = {"games": 0, "seasons": {}}
+    else:
+        new = games[games["date"] > last].reset_index(drop=True)
+    out = {"last_date": new["date"].max().strftime("%Y-%m-%dT%H:%M:%S") if len(new) else ck.get("last_date"),
+           "games": int(ck.get("games", 0)) + len(new), "manifest": man,
+           "seasons": _add_digest(ck.get("seasons") or {}, game_digest(new))}
+    return new, rebuild, out
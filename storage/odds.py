@@ -0,0 +1,306 @@
+# storage/odds.py
+"""
+Store append-only de snapshots de cuotas (data/odds):
+- snapshots/date=<yyyy-mm-dd>/snap-<hhmmss>.parquet: una fila por
+  evento × casa × mercado × resultado × timestamp (nunca se reescribe)
+- latest: última cotización por (event_id, bookmaker, market, outcome) con apertura, anterior
+  y nº de snapshots; se actualiza al anexar (O(eventos vivos), no O(historia))
+- index: por event_id, primer/último timestamp y particiones date= donde aparece, para leer la
+  historia de un evento sin escanear todo el store
+- consensus: por evento × mercado × línea × resultado, prob. sin vig de consenso entre casas
+  y mejor cuota disponible (con su casa); se recalcula desde latest en cada anexo
+- Vistas derivadas: movimiento apertura -> actual, steam moves, cierre por evento (desde latest
+  o desde los snapshots vía el índice: closing_history/closing_lines) y closing-line value
+"""
+
+from __future__ import annotations
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from storage.tables import read_table, write_table, write_partition, read_partitioned
+
+ODDS_DIR = Path(os.getenv("ODDS_DIR", "data/odds"))
+SNAP_DIR = ODDS_DIR / "snapshots"
+LATEST = ODDS_DIR / "latest"
+INDEX = ODDS_DIR / "index"
+CONSENSUS = ODDS_DIR / "consensus"
+
+EVENT_COLS = ["event_id", "provider", "sport", "league", "commence_time", "home", "away"]
+QUOTE_COLS = ["bookmaker", "market", "outcome", "point", "price"]
+SNAP_COLS = ["ts"] + EVENT_COLS + QUOTE_COLS
+KEY = ["event_id", "bookmaker", "market", "outcome"]
+LATEST_KEEP_DAYS = 7                 # eventos ya empezados que se conservan en `latest`
+STEAM_WINDOW_H = float(os.getenv("ODDS_STEAM_WINDOW_H", "6"))
+STEAM_MOVE = 0.02                    # cambio mínimo de prob. implícita por casa
+STEAM_SHARE, STEAM_MIN_BOOKS = 0.6, 3
+
+def _ts(s) -> pd.Series:
+    return pd.to_datetime(s, errors="coerce", utc=True)
+
+# ---------- escritura ----------
+def append_snapshot(snap: pd.DataFrame) -> int:
+    """Anexa un snapshot (columnas SNAP_COLS, un mismo ts) y actualiza latest + index."""
+    if snap.empty:
+        return 0
+    snap = snap[SNAP_COLS].copy()
+    snap["ts"] = _ts(snap["ts"])
+    snap["commence_time"] = _ts(snap["commence_time"])
+    snap["point"] = pd.to_numeric(snap["point"], errors="coerce")
+    snap["price"] = pd.to_numeric(snap["price"], errors="coerce")
+    snap = snap.dropna(subset=["ts", "price"]).drop_duplicates(subset=KEY, keep="last")
+    ts = snap["ts"].max()
+    write_partition(snap, SNAP_DIR, {"date": ts.strftime("%Y-%m-%d")}, f"snap-{ts.strftime('%H%M%S%f')}")
+    _update_latest(snap)
+    _update_index(snap, ts.strftime("%Y-%m-%d"))
+    write_table(consensus(latest()), CONSENSUS, csv_export=False)
+    return len(snap)
+
+def _update_latest(snap: pd.DataFrame):
+    old = read_table(LATEST)
+    new = snap.copy()
+    if old.empty:
+        new["open_price"], new["open_point"], new["open_ts"] = new["price"], new["point"], new["ts"]
+        new["prev_price"], new["prev_point"] = np.nan, np.nan
+        new["prev_ts"] = pd.Series(pd.NaT, index=new.index, dtype="datetime64[ns, UTC]")
+        new["n_snap"] = 1
+    else:
+        for c in ("ts", "open_ts", "prev_ts", "commence_time"):
+            old[c] = _ts(old[c])
+        prev = old.set_index(KEY)[["price", "point", "ts", "open_price", "open_point", "open_ts", "n_snap"]]
+        j = prev.reindex(pd.MultiIndex.from_frame(new[KEY])).reset_index(drop=True)
+        seen = j["ts"].notna().to_numpy()
+        new["open_price"] = np.where(seen, j["open_price"], new["price"])
+        new["open_point"] = np.where(seen, j["open_point"], new["point"])
+        new["open_ts"] = j["open_ts"].where(seen, new["ts"].to_numpy()).to_numpy()
+        new["prev_price"], new["prev_point"], new["prev_ts"] = j["price"].to_numpy(), j["point"].to_numpy(), j["ts"].to_numpy()
+        new["n_snap"] = np.where(seen, j["n_snap"].fillna(0) + 1, 1).astype(int)
+        keep = old.set_index(KEY).index.difference(pd.MultiIndex.from_frame(new[KEY]))
+        new = pd.concat([old.set_index(KEY).loc[keep].reset_index(), new], ignore_index=True)
+    cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=LATEST_KEEP_DAYS)
+    new = new[_ts(new["commence_time"]).fillna(cutoff) >= cutoff]
+    write_table(new.sort_values(KEY, ignore_index=True), LATEST, csv_export=False)
+
+def _update_index(snap: pd.DataFrame, date: str):
+    ts = snap["ts"].max()
+    ev = snap.groupby("event_id", sort=False)[EVENT_COLS[1:]].first().reset_index()
+    ev["first_ts"], ev["last_ts"], ev["dates"] = ts, ts, date
+    old = read_table(INDEX)
+    if not old.empty:
+        hit = old.set_index("event_id").reindex(ev["event_id"])
+        seen = hit["dates"].notna().to_numpy()
+        ev["first_ts"] = _ts(hit["first_ts"]).where(seen, ts).to_numpy()
+        ev["dates"] = [o if date in o.split(";") else f"{o};{date}" if s else date
+                       for o, s in zip(hit["dates"].fillna("").astype(str), seen)]
+        old["first_ts"], old["last_ts"] = _ts(old["first_ts"]), _ts(old["last_ts"])
+        ev = pd.concat([old[~old["event_id"].isin(ev["event_id"])], ev], ignore_index=True)
+    write_table(ev, INDEX, csv_export=False)
+
+# ---------- consultas ----------
+def latest(event_ids: Optional[Iterable[str]] = None, sport: Optional[str] = None) -> pd.DataFrame:
+    """Última cotización por casa/mercado/resultado (con apertura y anterior)."""
+    flt = []
+    if event_ids is not None:
+        flt.append(("event_id", "in", [str(e) for e in event_ids]))
+    if sport:
+        flt.append(("sport", "==", sport))
+    df = read_table(LATEST, filters=flt or None)
+    for c in ("ts", "open_ts", "prev_ts", "commence_time"):
+        if c in df.columns:
+            df[c] = _ts(df[c])
+    return df
+
+def history(event_ids, markets: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Todos los snapshots de uno o varios eventos; sólo abre las particiones date= del índice."""
+    ids = [str(event_ids)] if isinstance(event_ids, str) else [str(e) for e in event_ids]
+    idx = read_table(INDEX, filters=[("event_id", "in", ids)]) if ids else pd.DataFrame()
+    if idx.empty:
+        return pd.DataFrame(columns=SNAP_COLS)
+    dates = sorted({d for ds in idx["dates"] for d in str(ds).split(";") if d})
+    flt = [("event_id", "in", ids)] + ([("market", "in", list(markets))] if markets else [])
+    df = read_partitioned(SNAP_DIR, filters=flt, date=dates)
+    if df.empty:
+        return pd.DataFrame(columns=SNAP_COLS)
+    df["ts"], df["commence_time"] = _ts(df["ts"]), _ts(df["commence_time"])
+    return df[SNAP_COLS].sort_values(["ts"] + KEY, ignore_index=True)
+
+# ---------- vistas derivadas ----------
+def implied(price) -> np.ndarray:
+    p = np.asarray(price, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p > 1.0, 1.0 / p, np.nan)
+
+def clv(taken_price, closing_price) -> np.ndarray:
+    """Closing-line value de una apuesta: cuota tomada / cuota de cierre - 1 (>0 = se ganó a la línea)."""
+    t = np.asarray(taken_price, float)
+    c = np.asarray(closing_price, float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(c > 1.0, t / c - 1.0, np.nan)
+
+def closing(lat: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Cotización de cierre (última antes del inicio) de los eventos ya empezados."""
+    lat = latest() if lat is None else lat
+    if lat.empty:
+        return lat
+    return lat[(lat["commence_time"] <= pd.Timestamp.now(tz="UTC")) & (lat["ts"] <= lat["commence_time"])]
+
+def closing_history(start, end, sport: Optional[str] = None, markets: Iterable[str] = ("h2h",)) -> pd.DataFrame:
+    """
+    Cotización de cierre desde el store de snapshots (cualquier antigüedad, no sólo `latest`):
+    eventos con inicio en [start, end] según el índice, último snapshot de cada casa antes del inicio.
+    """
+    idx = read_table(INDEX)
+    if idx.empty:
+        return pd.DataFrame(columns=SNAP_COLS)
+    ct = _ts(idx["commence_time"])
+    lo, hi = (pd.Timestamp(t) for t in (start, end))
+    lo, hi = (t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC") for t in (lo, hi))
+    m = (ct >= lo) & (ct < hi + pd.Timedelta(days=1))
+    if sport:
+        m &= idx["sport"].astype(str) == sport
+    snap = history(idx.loc[m.to_numpy(), "event_id"], markets=list(markets))
+    snap = snap[snap["ts"] <= snap["commence_time"]]
+    return snap.drop_duplicates(subset=KEY, keep="last").reset_index(drop=True)
+
+def closing_lines(close: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Una fila por evento desde cotizaciones de cierre h2h (closing() o closing_history()):
+    close_{home,away,draw} = mediana entre casas y fair_close_* = consenso sin vig.
+    """
+    close = closing() if close is None else close
+    cols = EVENT_COLS + [f"{k}_{o}" for k in ("close", "fair_close") for o in ("home", "away", "draw")]
+    h2h = close[close["market"] == "h2h"] if not close.empty else close
+    if h2h.empty:
+        return pd.DataFrame(columns=cols)
+    out = h2h.groupby("event_id", sort=False)[EVENT_COLS[1:]].first()
+    px = h2h.pivot_table(index="event_id", columns="outcome", values="price", aggfunc="median")
+    cons = consensus(h2h)
+    fair = cons.pivot_table(index="event_id", columns="outcome", values="fair_p", aggfunc="first")
+    for o in ("home", "away", "draw"):
+        out[f"close_{o}"] = px[o] if o in px.columns else np.nan
+        out[f"fair_close_{o}"] = fair[o] if o in fair.columns else np.nan
+    return out.reset_index()[cols]
+
+# ---------- consenso entre casas ----------
+CONS_COLS = ["event_id", "market", "line", "outcome", "fair_p", "fair_price", "best_price", "best_book",
+             "n_books", "overround"]
+
+def consensus(lat: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    De-vig por casa (normalización proporcional de 1/cuota dentro de cada casa y línea) y consenso
+    = media de las prob. justas de las casas con el mercado completo, renormalizada. `line` es el
+    total o el handicap local (spreads: la visita cotiza -line); NaN en h2h. Todo en groupby.
+    """
+    lat = latest() if lat is None else lat
+    if lat.empty:
+        return pd.DataFrame(columns=CONS_COLS)
+    q = lat[["event_id", "bookmaker", "market", "outcome", "point", "price"]].copy()
+    q["line"] = np.where((q["market"] == "spreads") & (q["outcome"] == "away"), -q["point"], q["point"])
+    q.loc[q["market"] == "h2h", "line"] = np.nan
+    q["imp"] = implied(q["price"])
+    q = q[q["imp"].notna()]
+    mkt = ["event_id", "market", "line"]
+    g = q.groupby(mkt + ["bookmaker"], dropna=False)
+    q["book_sum"], q["book_n"] = g["imp"].transform("sum"), g["imp"].transform("size")
+    # casa completa = cotiza todos los resultados que aparecen para ese mercado/línea
+    q["full"] = q["book_n"] == q.groupby(mkt, dropna=False)["outcome"].transform("nunique")
+    q["fair"] = np.where(q["full"], q["imp"] / q["book_sum"], np.nan)
+    key = mkt + ["outcome"]
+    g = q.groupby(key, dropna=False)
+    out = g.agg(fair_p=("fair", "mean"), best_price=("price", "max"), n_books=("fair", "count"))
+    out["best_book"] = q.loc[g["price"].idxmax(), "bookmaker"].to_numpy()
+    out = out.reset_index()
+    out["fair_p"] = out["fair_p"] / out.groupby(mkt, dropna=False)["fair_p"].transform("sum")
+    out["fair_price"] = 1.0 / out["fair_p"]
+    vig = q[q["full"]].groupby(mkt, dropna=False)["book_sum"].median().rename("overround")
+    out = out.join(vig - 1.0, on=mkt)
+    return out[CONS_COLS].sort_values(key, ignore_index=True)
+
+def read_consensus(event_ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Tabla persistida por append_snapshot (sin recalcular desde latest)."""
+    flt = [("event_id", "in", [str(e) for e in event_ids])] if event_ids is not None else None
+    return read_table(CONSENSUS, filters=flt)
+
+def _main_point(q: pd.DataFrame) -> pd.Series:
+    """Línea principal por evento: la más cotizada entre casas (empate -> la más cercana a la mediana)."""
+    cnt = q.groupby(["event_id", "point"]).size().rename("n").reset_index()
+    med = q.groupby("event_id")["point"].median().rename("med")
+    cnt = cnt.join(med, on="event_id")
+    cnt["d"] = (cnt["point"] - cnt["med"]).abs()
+    best = cnt.sort_values(["event_id", "n", "d"], ascending=[True, False, True]).drop_duplicates("event_id")
+    return best.set_index("event_id")["point"]
+
+def line_features(lat: Optional[pd.DataFrame] = None, cons: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Una fila por evento: consenso (mediana entre casas) actual y de apertura de ML, prob. sin vig de
+    consenso y mejor cuota por resultado (consensus()), línea principal de totales/spread,
+    movimiento de la prob. local (apertura -> actual) y steam
+    (+1 hacia el local / -1 hacia la visita: la mayoría de casas movió >= STEAM_MOVE en la ventana).
+    """
+    lat = latest() if lat is None else lat
+    cols = ["event_id"] + EVENT_COLS[1:] + ["ml_home", "ml_away", "ml_draw", "ml_home_open", "ml_away_open",
+            "fair_home", "fair_away", "fair_draw", "best_home", "best_away", "best_draw", "odds_vig",
+            "move_home", "steam", "total_line", "total_over", "total_under", "total_line_open", "total_over_fair",
+            "spread_line", "spread_home", "spread_away", "spread_home_fair", "odds_books", "odds_ts"]
+    if lat.empty:
+        return pd.DataFrame(columns=cols)
+    ev = lat.groupby("event_id", sort=False).first()[EVENT_COLS[1:]]
+    out = ev.copy()
+
+    h2h = lat[lat["market"] == "h2h"]
+    cur = h2h.pivot_table(index="event_id", columns="outcome", values="price", aggfunc="median")
+    opn = h2h.pivot_table(index="event_id", columns="outcome", values="open_price", aggfunc="median")
+    for side in ("home", "away", "draw"):
+        out[f"ml_{side}"] = cur[side] if side in cur.columns else np.nan
+    for side in ("home", "away"):
+        out[f"ml_{side}_open"] = opn[side] if side in opn.columns else np.nan
+    cons = consensus(lat) if cons is None else cons
+    c = cons[cons["market"] == "h2h"]
+    fair = c.pivot_table(index="event_id", columns="outcome", values="fair_p", aggfunc="first")
+    best = c.pivot_table(index="event_id", columns="outcome", values="best_price", aggfunc="first")
+    for side in ("home", "away", "draw"):
+        out[f"fair_{side}"] = fair[side] if side in fair.columns else np.nan
+        out[f"best_{side}"] = best[side] if side in best.columns else np.nan
+    out["odds_vig"] = c.groupby("event_id")["overround"].first()
+    def p_home(h, a):
+        ih, ia = implied(h.to_numpy(float)), implied(a.to_numpy(float))
+        return ih / (ih + ia)
+    out["move_home"] = p_home(out["ml_home"], out["ml_away"]) - p_home(out["ml_home_open"], out["ml_away_open"])
+
+    hh = h2h[h2h["outcome"] == "home"]
+    recent = (hh["ts"] - hh["prev_ts"]) <= pd.Timedelta(hours=STEAM_WINDOW_H)
+    d = pd.Series(implied(hh["price"].to_numpy(float)) - implied(hh["prev_price"].to_numpy(float)), index=hh.index)
+    mv = pd.DataFrame({"event_id": hh["event_id"], "up": (d >= STEAM_MOVE) & recent,
+                       "down": (d <= -STEAM_MOVE) & recent}).groupby("event_id")
+    books = mv.size()
+    up, down = mv["up"].sum() / books, mv["down"].sum() / books
+    steam = np.where(books >= STEAM_MIN_BOOKS, np.select([up >= STEAM_SHARE, down >= STEAM_SHARE], [1, -1], 0), 0)
+    out["steam"] = pd.Series(steam, index=books.index).reindex(out.index).fillna(0).astype(int)
+
+    for market, (a, b), line_col in (("totals", ("over", "under"), "total"), ("spreads", ("home", "away"), "spread")):
+        q = lat[(lat["market"] == market) & lat["point"].notna()]
+        if q.empty:
+            out[f"{line_col}_line"] = np.nan; out[f"{line_col}_{a}"] = np.nan; out[f"{line_col}_{b}"] = np.nan
+            out[f"{line_col}_{a}_fair"] = np.nan
+            if market == "totals":
+                out["total_line_open"] = np.nan
+            continue
+        ref = q[q["outcome"] == ("over" if market == "totals" else "home")]
+        main = _main_point(ref)
+        out[f"{line_col}_line"] = main
+        at = q.join(main.rename("main"), on="event_id")
+        at = at[(at["point"] == at["main"]) if market == "totals"
+                else (at["point"] == np.where(at["outcome"] == "home", at["main"], -at["main"]))]
+        px = at.pivot_table(index="event_id", columns="outcome", values="price", aggfunc="median")
+        out[f"{line_col}_{a}"] = px[a] if a in px.columns else np.nan
+        out[f"{line_col}_{b}"] = px[b] if b in px.columns else np.nan
+        cm = cons[(cons["market"] == market) & (cons["outcome"] == a)].join(main.rename("main"), on="event_id")
+        out[f"{line_col}_{a}_fair"] = cm[cm["line"] == cm["main"]].set_index("event_id")["fair_p"]
+        if market == "totals":
+            out["total_line_open"] = ref.groupby("event_id")["open_point"].median()
+    out["odds_books"] = h2h.groupby("event_id")["bookmaker"].nunique().reindex(out.index).fillna(0).astype(int)
+    out["odds_ts"] = lat.groupby("event_id")["ts"].max()
+    return out.reset_index()[cols]
@@ -0,0 +1,194 @@
+# storage/tables.py
+"""
+Almacenamiento tabular compartido por pipelines/, models/ y serving/.
+- Parquet (pyarrow, zstd) como formato principal: tipado, comprimido y columnar
+- CSV como export opcional (STORAGE_CSV_EXPORT=1) o como fallback si no hay pyarrow
+- Proyección de columnas y filtros (predicate pushdown) p.ej. [("sport","==","futbol"),("date",">=","2023-01-01")]
+- Las rutas aceptan el nombre histórico `.csv`: `read_table("data/processed/features.csv")`
+  lee el .parquet si existe; el .csv sólo gana si es claramente más nuevo (lo escribió otro
+  proceso, p.ej. un scraper legado), nunca por ser el export que acompaña al .parquet
+"""
+
+from __future__ import annotations
+import os
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:  # pyarrow es opcional: se degrada a CSV
+    pa = pq = None
+
+HAS_ARROW = pq is not None
+FORMAT = os.getenv("STORAGE_FORMAT", "parquet" if HAS_ARROW else "csv").lower()
+CSV_EXPORT = os.getenv("STORAGE_CSV_EXPORT", "0") not in ("", "0", "false", "False")
+COMPRESSION = os.getenv("STORAGE_COMPRESSION", "zstd")
+
+Filter = Tuple[str, str, Any]
+SUFFIXES = (".csv", ".parquet")
+EXPORT_SLACK_S = 5.0  # un .csv hasta esto más nuevo que su .parquet es el export, no una versión nueva
+
+def _stem(path) -> Path:
+    p = Path(path)
+    return p.with_suffix("") if p.suffix in SUFFIXES else p
+
+def _candidates(path) -> List[Path]:
+    stem = _stem(path)
+    return [q for q in (stem.with_suffix(".parquet"), stem.with_suffix(".csv"))
+            if q.exists() and q.stat().st_size > 0]
+
+def table_path(path) -> Optional[Path]:
+    """
+    Archivo físico que se leería para `path`: el .parquet si existe, salvo que el .csv sea más
+    nuevo por más de EXPORT_SLACK_S (escrito aparte); si no hay .parquet, el .csv.
+    """
+    cands = _candidates(path)
+    if not cands:
+        return None
+    if len(cands) == 1:
+        return cands[0]
+    pq_path, csv_path = cands
+    if not HAS_ARROW:
+        return csv_path
+    newer = csv_path.stat().st_mtime - pq_path.stat().st_mtime > EXPORT_SLACK_S
+    return csv_path if newer else pq_path
+
+def table_exists(path) -> bool:
+    return table_path(path) is not None
+
+# ---------- escritura ----------
+def write_table(df: pd.DataFrame, path, csv_export: Optional[bool] = None,
+                fmt: Optional[str] = None) -> Path:
+    """Escribe `df` en el formato configurado; devuelve la ruta principal escrita."""
+    stem = _stem(path)
+    stem.parent.mkdir(parents=True, exist_ok=True)
+    fmt = (fmt or FORMAT).lower()
+    if fmt == "parquet" and HAS_ARROW:
+        out = stem.with_suffix(".parquet")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if csv_export if csv_export is not None else CSV_EXPORT:  # antes: el .parquet queda más nuevo
+            df.to_csv(stem.with_suffix(".csv"), index=False, encoding="utf-8")
+        tmp = out.with_suffix(".parquet.tmp")
+        pq.write_table(table, tmp, compression=COMPRESSION)
+        os.replace(tmp, out)
+        return out
+    out = stem.with_suffix(".csv")
+    df.to_csv(out, index=False, encoding="utf-8")
+    return out
+
+# ---------- lectura ----------
+_OPS = {
+    "==": lambda s, v: s == v, "=": lambda s, v: s == v, "!=": lambda s, v: s != v,
+    "<": lambda s, v: s < v, "<=": lambda s, v: s <= v,
+    ">": lambda s, v: s > v, ">=": lambda s, v: s >= v,
+    "in": lambda s, v: s.isin(list(v)), "not in": lambda s, v: ~s.isin(list(v)),
+}
+
+def apply_filters(df: pd.DataFrame, filters: Optional[Sequence[Filter]]) -> pd.DataFrame:
+    """Filtros estilo pyarrow sobre un DataFrame ya cargado (fallback CSV)."""
+    if not filters or df.empty:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, op, val in filters:
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if s.dtype == object and not isinstance(val, (list, tuple, set)):
+            val = str(val)
+        mask &= _OPS[op](s, val)
+    return df[mask]
+
+def _typed_filter(schema, f: Filter) -> Filter:
+    """'2023-01-01' contra una columna timestamp/date -> Timestamp (pyarrow no castea strings)."""
+    col, op, val = f
+    t = schema.field(col).type
+    if isinstance(val, str) and (pa.types.is_timestamp(t) or pa.types.is_date(t)):
+        ts = pd.Timestamp(val)
+        if pa.types.is_date(t):
+            val = ts.date()
+        else:
+            val = ts.tz_localize(t.tz) if t.tz and ts.tzinfo is None else ts
+    return col, op, val
+
+def read_table(path, columns: Optional[Iterable[str]] = None,
+               filters: Optional[Sequence[Filter]] = None, **csv_kw) -> pd.DataFrame:
+    """
+    Lee la tabla lógica `path`. Vacía (sin error) si no existe.
+    `columns` proyecta columnas (las ausentes se ignoran); `filters` se empuja al lector Parquet.
+    """
+    src = table_path(path)
+    if src is None:
+        return pd.DataFrame(columns=list(columns) if columns else None)
+    columns = list(columns) if columns else None
+    if src.suffix == ".parquet" and HAS_ARROW:
+        schema = pq.read_schema(src)
+        schema_names = set(schema.names)
+        cols = [c for c in columns if c in schema_names] if columns else None
+        flt = [_typed_filter(schema, f) for f in filters if f[0] in schema_names] if filters else None
+        return pq.read_table(src, columns=cols, filters=flt or None).to_pandas()
+    usecols = None
+    if columns:
+        want = set(columns) | {f[0] for f in (filters or [])}
+        usecols = lambda c: c in want  # noqa: E731
+    try:
+        df = pd.read_csv(src, usecols=usecols, **csv_kw)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=columns)
+    df = apply_filters(df, filters)
+    return df[[c for c in columns if c in df.columns]] if columns else df
+
+# ---------- datasets particionados (layout hive: root/k=v/.../part.parquet) ----------
+def partition_dir(root, parts: dict) -> Path:
+    d = Path(root)
+    for k, v in parts.items():
+        d = d / f"{k}={v}"
+    return d
+
+def write_partition(df: pd.DataFrame, root, parts: dict, name: str, **kw) -> Path:
+    """Escribe (reemplaza) un archivo `name` dentro de la partición `parts`."""
+    return write_table(df, partition_dir(root, parts) / name, csv_export=False, **kw)
+
+def list_partitions(root, **selected) -> List[Path]:
+    """
+    Directorios hoja bajo `root` cuyo valor de partición está en `selected[k]` (si se indica).
+    list_partitions(root, sport=["nba"], season=[2023, 2024])
+    """
+    root = Path(root)
+    if not root.exists():
+        return []
+    dirs = [root]
+    while True:
+        children = [c for d in dirs for c in sorted(d.iterdir()) if c.is_dir() and "=" in c.name]
+        if not children:
+            break
+        keep = []
+        for c in children:
+            k, _, v = c.name.partition("=")
+            want = selected.get(k)
+            if want is None or v in {str(x) for x in want}:
+                keep.append(c)
+        dirs = keep
+    return [d for d in dirs if d != root]
+
+def read_partitioned(root, columns: Optional[Iterable[str]] = None,
+                     filters: Optional[Sequence[Filter]] = None, **selected) -> pd.DataFrame:
+    """Lee sólo las particiones seleccionadas; añade las claves de partición como columnas."""
+    columns = list(columns) if columns else None
+    frames = []
+    for d in list_partitions(root, **selected):
+        keys = dict(part.split("=", 1) for part in d.relative_to(root).parts)
+        stems = {f.with_suffix("") for f in d.iterdir() if f.suffix in SUFFIXES}
+        for stem in sorted(stems):
+            df = read_table(stem, columns=columns, filters=filters)
+            if df.empty:
+                continue
+            for k, v in keys.items():
+                if columns is None or k in columns:
+                    df[k] = v
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
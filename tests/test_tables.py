@@ -0,0 +1,49 @@
+# tests/test_tables.py
+"""Round-trip de storage.tables con el export CSV activo (STORAGE_CSV_EXPORT=1)."""
+
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from storage import tables  # type: ignore
+
+pytestmark = pytest.mark.skipif(not tables.HAS_ARROW, reason="requiere pyarrow")
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "event_id": ["001", "002", "010"],
+        "date": pd.to_datetime(["2024-01-05", "2024-02-10", "2024-03-15"]),
+        "sport": ["futbol", "futbol", "nba"],
+        "p_home": [0.55, 0.48, 0.61],
+    })
+
+def test_roundtrip_con_export(tmp_path, monkeypatch):
+    monkeypatch.setattr(tables, "CSV_EXPORT", True)
+    df = _frame()
+    path = tmp_path / "features.csv"
+    tables.write_table(df, path)
+
+    assert (tmp_path / "features.csv").exists()
+    assert tables.table_path(path).suffix == ".parquet"
+    out = tables.read_table(path)
+    assert out["event_id"].tolist() == ["001", "002", "010"]
+    assert pd.api.types.is_datetime64_any_dtype(out["date"])
+    pd.testing.assert_frame_equal(out, df, check_dtype=False)
+
+    flt = tables.read_table(path, columns=["event_id"], filters=[("date", ">=", "2024-02-01")])
+    assert flt["event_id"].tolist() == ["002", "010"]
+
+def test_csv_externo_mas_nuevo_gana(tmp_path):
+    path = tmp_path / "features.csv"
+    tables.write_table(_frame(), path, csv_export=True)
+    pq_path = tmp_path / "features.parquet"
+    t = pq_path.stat().st_mtime
+    os.utime(path, (t + 10 * tables.EXPORT_SLACK_S, t + 10 * tables.EXPORT_SLACK_S))
+    assert tables.table_path(path) == path